@@ -0,0 +1,214 @@
+"""
+Micro-benchmarks for the game state operations.
+
+Times StonehengeState.make_move, get_possible_moves, rough_outcome and
+__str__ for every side length from 1 to 5, and
+SubtractSquareState.get_possible_moves for totals up to 10^6. Each result
+records the time per call and the allocations per call (measured with
+tracemalloc), and can be saved as a JSON baseline or compared against one.
+
+Usage:
+    python benchmark.py --save baseline.json
+    python benchmark.py --compare baseline.json --threshold 0.10
+
+NOTE: You do not have to run python-ta on this file.
+"""
+import argparse
+import json
+import platform
+import sys
+import timeit
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+from stonehenge_state import StonehengeState
+from subtract_square_state import SubtractSquareState
+
+SIDE_LENGTHS = [1, 2, 3, 4, 5]
+SUBTRACT_SQUARE_TOTALS = [10, 100, 1000, 10 ** 4, 10 ** 5, 10 ** 6]
+DEFAULT_THRESHOLD = 0.10
+
+
+def get_benchmarks() -> List[Tuple[str, Callable[[], Any]]]:
+    """
+    Return a list of (name, operation) pairs, where operation takes no
+    arguments and performs exactly one call of the operation being timed.
+    """
+    benchmarks = []
+    for side_length in SIDE_LENGTHS:
+        state = StonehengeState(True, side_length)
+        # A position a few moves into the game, so that some ley-lines are
+        # already claimed.
+        for move in state.get_possible_moves()[:side_length - 1]:
+            state = state.make_move(move)
+        move = state.get_possible_moves()[0]
+        benchmarks.extend([
+            ('stonehenge.make_move[{}]'.format(side_length),
+             _bind(state.make_move, move)),
+            ('stonehenge.get_possible_moves[{}]'.format(side_length),
+             state.get_possible_moves),
+            ('stonehenge.rough_outcome[{}]'.format(side_length),
+             state.rough_outcome),
+            ('stonehenge.__str__[{}]'.format(side_length),
+             _bind(str, state))])
+    for total in SUBTRACT_SQUARE_TOTALS:
+        state = SubtractSquareState(True, total)
+        benchmarks.append(
+            ('subtract_square.get_possible_moves[{}]'.format(total),
+             state.get_possible_moves))
+    return benchmarks
+
+
+def _bind(function: Callable, argument: Any) -> Callable[[], Any]:
+    """
+    Return a function of no arguments that calls function on argument.
+    """
+    return lambda: function(argument)
+
+
+def time_per_call(operation: Callable[[], Any], repeat: int = 5) -> float:
+    """
+    Return the best time in seconds of a single call of operation over
+    repeat rounds of timing.
+    """
+    timer = timeit.Timer(operation)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def allocations_per_call(operation: Callable[[], Any],
+                         calls: int = 10) -> Tuple[float, float]:
+    """
+    Return (peak bytes, allocated blocks) per call of operation.
+
+    Peak bytes is the highest amount of traced memory above the starting
+    point during one call. Allocated blocks counts the memory blocks still
+    held by the results, so it is the number of objects a call leaves behind
+    for its caller.
+    """
+    operation()  # Warm up any caches before measuring.
+    tracemalloc.start()
+    try:
+        start, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        operation()
+        _, peak = tracemalloc.get_traced_memory()
+        before = tracemalloc.take_snapshot()
+        results = [operation() for _ in range(calls)]
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in
+                 after.compare_to(before, 'filename'))
+    del results
+    return max(peak - start, 0), max(blocks - 1, 0) / calls
+
+
+def run_benchmarks(name_filter: str = '') -> Dict[str, Dict[str, float]]:
+    """
+    Run every benchmark whose name contains name_filter, and return a
+    dictionary mapping benchmark names to their measurements.
+    """
+    results = {}
+    for name, operation in get_benchmarks():
+        if name_filter not in name:
+            continue
+        peak_bytes, blocks = allocations_per_call(operation)
+        results[name] = {'seconds_per_call': time_per_call(operation),
+                         'peak_bytes_per_call': peak_bytes,
+                         'blocks_per_call': blocks}
+    return results
+
+
+def make_baseline(results: Dict[str, Dict[str, float]]) -> Dict[str, Any]:
+    """
+    Return a JSON-serializable baseline of results tagged with information
+    about the machine they were measured on.
+    """
+    return {'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'results': results}
+
+
+def compare(baseline: Dict[str, Any], results: Dict[str, Dict[str, float]],
+            threshold: float = DEFAULT_THRESHOLD) -> List[str]:
+    """
+    Return a description of every measurement in results that is more than
+    threshold (a fraction, e.g. 0.10 for 10%) worse than in baseline.
+
+    >>> old = {'results': {'op': {'seconds_per_call': 1.0}}}
+    >>> compare(old, {'op': {'seconds_per_call': 1.05}}, 0.10)
+    []
+    >>> compare(old, {'op': {'seconds_per_call': 1.5}}, 0.10)
+    ['op: seconds_per_call 1 -> 1.5 (+50.0%)']
+    """
+    regressions = []
+    old_results = baseline['results']
+    for name in sorted(results):
+        if name not in old_results:
+            continue
+        for metric, value in sorted(results[name].items()):
+            old_value = old_results[name].get(metric)
+            if old_value is None:
+                continue
+            if old_value == 0:
+                worse = value > 0
+                change = float('inf') if worse else 0.0
+            else:
+                change = (value - old_value) / old_value
+                worse = change > threshold
+            if worse:
+                regressions.append('{}: {} {:.4g} -> {:.4g} ({:+.1%})'.format(
+                    name, metric, old_value, value, change))
+    return regressions
+
+
+def print_results(results: Dict[str, Dict[str, float]]) -> None:
+    """
+    Print results as a table.
+    """
+    print('{:<45} {:>14} {:>12} {:>10}'.format(
+        'benchmark', 'us/call', 'peak B/call', 'blocks'))
+    for name, measurement in results.items():
+        print('{:<45} {:>14.2f} {:>12.0f} {:>10.1f}'.format(
+            name, measurement['seconds_per_call'] * 1e6,
+            measurement['peak_bytes_per_call'],
+            measurement['blocks_per_call']))
+
+
+def main(argv: List[str] = None) -> int:
+    """
+    Run the benchmarks from the command line, and return the exit status:
+    1 if a comparison found regressions, 0 otherwise.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--save', metavar='FILE',
+                        help='write the results to FILE as a JSON baseline')
+    parser.add_argument('--compare', metavar='FILE',
+                        help='compare the results against the JSON baseline '
+                             'in FILE')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='fraction by which a measurement may get worse '
+                             'before it counts as a regression '
+                             '(default: %(default)s)')
+    parser.add_argument('--filter', default='',
+                        help='only run benchmarks whose name contains this')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.filter)
+    print_results(results)
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(make_baseline(results), file, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = compare(baseline, results, args.threshold)
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
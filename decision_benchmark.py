@@ -0,0 +1,271 @@
+"""
+End-to-end decision latency benchmark.
+
+Runs every strategy in game_interface.usable_strategies (except the
+interactive one) on a fixed corpus of Stonehenge and SubtractSquare positions
+at different stages of the game. For each strategy it reports the p50/p95/p99
+decision latency, the nodes searched, the peak RSS, and how often the chosen
+move is as good as the best move found by an exact solver. Each decision runs
+in its own process and is stopped after a per-position timeout; a process
+that dies without deciding is reported as an error with its exit code.
+
+Usage:
+    python decision_benchmark.py --timeout 30 --json results.json
+
+NOTE: You do not have to run python-ta on this file.
+"""
+import argparse
+import json
+import multiprocessing
+import resource
+import sys
+import time
+from queue import Empty
+from typing import Any, Dict, List, Tuple
+from game_interface import playable_games, usable_strategies
+from search import exact_move_values
+from search_stats import choose_move
+
+# Each position is (name, game key in playable_games, side length or starting
+# total, whether p1 starts, moves made so far).
+CORPUS = [
+    ('stonehenge-2-opening', 'h', 2, True, []),
+    ('stonehenge-2-middle', 'h', 2, True, ['A', 'F']),
+    ('stonehenge-2-late', 'h', 2, True, ['A', 'F', 'D']),
+    ('stonehenge-3-opening', 'h', 3, True, []),
+    ('stonehenge-3-middle', 'h', 3, False, ['K', 'A', 'C', 'B']),
+    ('stonehenge-3-late', 'h', 3, False,
+     ['K', 'A', 'C', 'B', 'F', 'E', 'G', 'D', 'I']),
+    ('stonehenge-4-middle', 'h', 4, True,
+     ['H', 'K', 'D', 'O', 'I', 'L', 'C', 'B']),
+    ('stonehenge-4-late', 'h', 4, True,
+     ['H', 'K', 'D', 'O', 'I', 'L', 'C', 'B', 'E', 'A', 'Q', 'N']),
+    ('subtract-square-18', 's', 18, True, []),
+    ('subtract-square-50', 's', 50, True, []),
+    ('subtract-square-130', 's', 130, True, []),
+]
+DEFAULT_TIMEOUT = 30.0
+# Seconds between checks that a deciding process is still alive.
+POLL_SECONDS = 0.1
+PERCENTILES = [50, 95, 99]
+
+
+def make_game(game_key: str, parameter: int, p1_starts: bool,
+              moves: List[Any]) -> Any:
+    """
+    Return a game of type playable_games[game_key], created with parameter
+    (a side length or starting total), after moves have been made.
+    """
+    game = playable_games[game_key](p1_starts, parameter)
+    for move in moves:
+        game.current_state = game.current_state.make_move(
+            game.str_to_move(move))
+    return game
+
+
+def get_strategies() -> Dict[str, Any]:
+    """
+    Return the strategies of usable_strategies that do not need a human.
+    """
+    return {key: strategy for key, strategy in usable_strategies.items()
+            if strategy is not None and
+            strategy.__name__ != 'interactive_strategy'}
+
+
+def _decide(strategy_key: str, position: Tuple, queue: Any) -> None:
+    """
+    Run the strategy usable_strategies[strategy_key] on position, and put
+    (move, seconds, nodes, peak RSS in KiB) on queue.
+    """
+    _, game_key, parameter, p1_starts, moves = position
+    game = make_game(game_key, parameter, p1_starts, moves)
+    start = time.perf_counter()
+    move, stats = choose_move(usable_strategies[strategy_key], game)
+    seconds = time.perf_counter() - start
+    queue.put((move, seconds, stats.nodes,
+               resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+
+
+def run_decision(strategy_key: str, position: Tuple,
+                 timeout: float) -> Dict[str, Any]:
+    """
+    Return the result of running strategy_key on position in a separate
+    process, which is killed if it does not decide within timeout seconds.
+    If the process dies without deciding, the result has its exit code as
+    'error'.
+    """
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_decide,
+                                      args=(strategy_key, position, queue))
+    process.start()
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            move, seconds, nodes, peak_rss = queue.get(timeout=POLL_SECONDS)
+            break
+        except Empty:
+            pass
+        # A process that decided has written its result before exiting.
+        if not process.is_alive() and queue.empty():
+            process.join()
+            return {'position': position[0], 'strategy': strategy_key,
+                    'timed_out': False, 'error': process.exitcode}
+        if time.monotonic() >= deadline:
+            process.terminate()
+            process.join()
+            return {'position': position[0], 'strategy': strategy_key,
+                    'timed_out': True}
+    process.join()
+    return {'position': position[0], 'strategy': strategy_key,
+            'timed_out': False, 'move': move, 'seconds': seconds,
+            'nodes': nodes, 'peak_rss_kib': peak_rss}
+
+
+def decided(result: Dict[str, Any]) -> bool:
+    """
+    Return whether the strategy of result chose a move, rather than timing
+    out or dying.
+
+    >>> decided({'timed_out': False, 'error': 1})
+    False
+    """
+    return not result['timed_out'] and 'error' not in result
+
+
+def check_agreement(results: List[Dict[str, Any]]) -> None:
+    """
+    Add to every result that decided whether its move is as good as the best
+    move according to the exact solver.
+    """
+    positions = {position[0]: position for position in CORPUS}
+    caches = {}
+    move_values = {}
+    for result in results:
+        if not decided(result):
+            continue
+        name = result['position']
+        if name not in move_values:
+            _, game_key, parameter, p1_starts, moves = positions[name]
+            state = make_game(game_key, parameter, p1_starts,
+                              moves).current_state
+            move_values[name] = exact_move_values(
+                state, caches.setdefault(game_key, {}))
+        values = move_values[name]
+        result['agrees'] = (result['move'] in values and
+                            values[result['move']] == max(values.values()))
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """
+    Return the percent-th percentile of values by the nearest-rank method.
+
+    >>> percentile([4, 1, 3, 2], 50)
+    2
+    >>> percentile([4, 1, 3, 2], 99)
+    4
+    """
+    ordered = sorted(values)
+    rank = max(int(-(-percent * len(ordered) // 100)), 1)
+    return ordered[rank - 1]
+
+
+def summarize(results: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Return a summary of results for every strategy.
+    """
+    summary = {}
+    for key in dict.fromkeys(result['strategy'] for result in results):
+        finished = [result for result in results
+                    if result['strategy'] == key and decided(result)]
+        row = {'positions': len([result for result in results
+                                 if result['strategy'] == key]),
+               'timeouts': len([result for result in results
+                                if result['strategy'] == key and
+                                result['timed_out']]),
+               'errors': len([result for result in results
+                              if result['strategy'] == key and
+                              'error' in result])}
+        if finished:
+            seconds = [result['seconds'] for result in finished]
+            for percent in PERCENTILES:
+                row['p{}_seconds'.format(percent)] = percentile(seconds,
+                                                                percent)
+            row['mean_nodes'] = (sum(result['nodes'] for result in finished)
+                                 / len(finished))
+            row['peak_rss_kib'] = max(result['peak_rss_kib']
+                                      for result in finished)
+            row['agreement'] = (len([result for result in finished
+                                     if result['agrees']]) / len(finished))
+        summary[key] = row
+    return summary
+
+
+def print_report(results: List[Dict[str, Any]],
+                 summary: Dict[str, Dict[str, Any]]) -> None:
+    """
+    Print the per-position results and the per-strategy summary.
+    """
+    print('{:<24} {:>4} {:>6} {:>10} {:>10} {:>7}'.format(
+        'position', 'ai', 'move', 'ms', 'nodes', 'exact'))
+    for result in results:
+        if result['timed_out']:
+            print('{:<24} {:>4} {:>6}'.format(result['position'],
+                                              result['strategy'], 'TIMEOUT'))
+        elif 'error' in result:
+            print('{:<24} {:>4} {:>6} exit code {}'.format(
+                result['position'], result['strategy'], 'ERROR',
+                result['error']))
+        else:
+            print('{:<24} {:>4} {:>6} {:>10.2f} {:>10} {:>7}'.format(
+                result['position'], result['strategy'], str(result['move']),
+                result['seconds'] * 1000, result['nodes'],
+                'yes' if result['agrees'] else 'NO'))
+    print()
+    print('{:<4} {:>10} {:>10} {:>10} {:>12} {:>10} {:>7} {:>8} '
+          '{:>6}'.format('ai', 'p50 ms', 'p95 ms', 'p99 ms', 'mean nodes',
+                         'RSS MiB', 'exact', 'timeouts', 'errors'))
+    for key, row in summary.items():
+        if 'agreement' not in row:
+            print('{:<4} {:>72} {:>6}'.format(key, row['timeouts'],
+                                              row['errors']))
+            continue
+        print('{:<4} {:>10.2f} {:>10.2f} {:>10.2f} {:>12.0f} {:>10.1f} '
+              '{:>7.0%} {:>8} {:>6}'.format(
+                  key, row['p50_seconds'] * 1000, row['p95_seconds'] * 1000,
+                  row['p99_seconds'] * 1000, row['mean_nodes'],
+                  row['peak_rss_kib'] / 1024, row['agreement'],
+                  row['timeouts'], row['errors']))
+
+
+def main(argv: List[str] = None) -> int:
+    """
+    Run the benchmark from the command line.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT,
+                        help='seconds a strategy may take per position '
+                             '(default: %(default)s)')
+    parser.add_argument('--strategies', nargs='+',
+                        help='keys of the strategies to run (default: all)')
+    parser.add_argument('--positions', default='',
+                        help='only use positions whose name contains this')
+    parser.add_argument('--json', metavar='FILE',
+                        help='also write the results to FILE as JSON')
+    args = parser.parse_args(argv)
+
+    strategy_keys = args.strategies or list(get_strategies())
+    results = [run_decision(key, position, args.timeout)
+               for position in CORPUS if args.positions in position[0]
+               for key in strategy_keys]
+    check_agreement(results)
+    summary = summarize(results)
+    print_report(results, summary)
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump({'results': results, 'summary': summary}, file,
+                      indent=2, default=str)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
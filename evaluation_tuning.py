@@ -0,0 +1,166 @@
+"""
+Tuning harness for the static evaluation of Stonehenge states.
+
+Samples undecided positions of small boards from random games, solves them
+with exact_value, and measures how often an evaluation agrees with the exact
+result: a positive estimate for a won position, and a negative or zero one
+for a lost position. Run with --tune, it also searches a grid of weights for
+potential_outcome() for the ones that agree most often.
+
+Since a static evaluation is mostly used to choose between moves, it also
+measures how often the move to the state the evaluation likes least for the
+opponent keeps a won position won.
+
+Usage:
+    python evaluation_tuning.py --side-length 3 --positions 300 --tune
+
+NOTE: You do not have to run python-ta on this file.
+"""
+import argparse
+import itertools
+import random
+import sys
+from typing import Callable, Dict, Hashable, List, Tuple
+from search import exact_value
+from stonehenge_state import POTENTIAL_WEIGHTS, StonehengeState
+
+# The values tried for each weight of potential_outcome() when tuning.
+WEIGHT_GRID = [0.0, 0.25, 0.5, 1.0, 2.0]
+
+
+def sample_positions(side_length: int, count: int, rng: random.Random,
+                     cache: Dict[Hashable, int] = None) \
+        -> List[Tuple[StonehengeState, int]]:
+    """
+    Return count undecided positions of side_length boards from random
+    games, each with its exact score for the player whose turn it is.
+    Positions already solved are looked up in cache.
+
+    >>> positions = sample_positions(2, 3, random.Random(0))
+    >>> [score for _, score in positions]
+    [1, 1, 1]
+    """
+    if cache is None:
+        cache = {}
+    positions = []
+    while len(positions) < count:
+        state = StonehengeState(rng.random() < 0.5, side_length)
+        # Boards with more cells are played further into the game first, so
+        # that the positions can be solved quickly.
+        for _ in range(rng.randrange(max(0, 2 * side_length - 2),
+                                     3 * side_length)):
+            if state.get_possible_moves() == []:
+                break
+            state = state.make_move(rng.choice(state.get_possible_moves()))
+        if state.get_possible_moves() != [] and \
+                state.decided_score() is None:
+            positions.append((state, exact_value(state, cache)))
+    return positions
+
+
+def agreement(evaluate: Callable[[StonehengeState], float],
+              positions: List[Tuple[StonehengeState, int]]) -> float:
+    """
+    Return the fraction of positions whose exact score evaluate agrees
+    with.
+
+    >>> positions = sample_positions(2, 3, random.Random(0))
+    >>> agreement(lambda state: 1, positions)
+    1.0
+    """
+    agreed = sum(1 for state, score in positions
+                 if (evaluate(state) > 0) == (score == state.WIN))
+    return agreed / len(positions)
+
+
+def move_agreement(evaluate: Callable[[StonehengeState], float],
+                   positions: List[Tuple[StonehengeState, int]],
+                   cache: Dict[Hashable, int] = None) -> float:
+    """
+    Return the fraction of the won positions of positions in which the
+    move to the state evaluate scores lowest for the opponent keeps the
+    win. States already solved are looked up in cache.
+
+    >>> positions = sample_positions(2, 3, random.Random(0))
+    >>> move_agreement(StonehengeState.rough_outcome, positions)
+    1.0
+    """
+    if cache is None:
+        cache = {}
+    won = [state for state, score in positions if score == state.WIN]
+    kept = 0
+    for state in won:
+        children = [state.make_move(move)
+                    for move in state.iter_distinct_moves()]
+        child = min(children, key=evaluate)
+        if exact_value(child, cache) == state.LOSE:
+            kept += 1
+    return kept / len(won) if won != [] else 1.0
+
+
+def tune(positions: List[Tuple[StonehengeState, int]],
+         grid: List[float] = None) -> Tuple[Tuple[float, ...], float]:
+    """
+    Return the weights of potential_outcome() from grid with the highest
+    mean of agreement() and move_agreement() on positions, and that mean.
+    Ties go to the weights tried first.
+    """
+    if grid is None:
+        grid = WEIGHT_GRID
+    cache = {}
+    best_weights, best_agreement = POTENTIAL_WEIGHTS, -1.0
+    for weights in itertools.product(grid, repeat=len(POTENTIAL_WEIGHTS)):
+        def evaluate(state: StonehengeState) -> float:
+            """
+            Return the potential_outcome() of state with weights.
+            """
+            return state.potential_outcome(weights)
+        rate = (agreement(evaluate, positions) +
+                move_agreement(evaluate, positions, cache)) / 2
+        if rate > best_agreement:
+            best_weights, best_agreement = weights, rate
+    return best_weights, best_agreement
+
+
+def main(argv: List[str] = None) -> int:
+    """
+    Measure and tune the static evaluations from the command line.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--side-length', type=int, default=3,
+                        help='side length of the boards (default: '
+                             '%(default)s)')
+    parser.add_argument('--positions', type=int, default=300,
+                        help='number of positions to sample (default: '
+                             '%(default)s)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the random games (default: '
+                             '%(default)s)')
+    parser.add_argument('--tune', action='store_true',
+                        help='search a grid of weights for potential_outcome')
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    positions = sample_positions(args.side_length, args.positions, rng)
+    wins = sum(1 for state, score in positions if score == state.WIN)
+    print('{} positions, {} won by the player to move'.format(
+        len(positions), wins))
+    evaluations = [('rough_outcome', StonehengeState.rough_outcome),
+                   ('potential_outcome {}'.format(POTENTIAL_WEIGHTS),
+                    StonehengeState.potential_outcome)]
+    if args.tune:
+        weights, _ = tune(positions)
+        evaluations.append((
+            'potential_outcome {}'.format(weights),
+            lambda state: state.potential_outcome(weights)))
+    cache = {}
+    print('{:<40} {:>9} {:>9}'.format('evaluation', 'scores', 'moves'))
+    for name, evaluate in evaluations:
+        print('{:<40} {:>9.3f} {:>9.3f}'.format(
+            name, agreement(evaluate, positions),
+            move_agreement(evaluate, positions, cache)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
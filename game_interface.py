@@ -9,22 +9,46 @@ strategy cannot be used on Chopsticks unless you account for infinite loops.
 your own curiousity!)
 """
 
+import argparse
+import logging
+import os
+import time
 from strategy import *
 from typing import Any, Callable
+from search_stats import accepts_option, accepts_stats, choose_move
+from game_record import GameRecordWriter, start_record
+from memory_budget import MemoryBudget
+from profiling import PROFILE_ENV, MoveProfiler, move_tag
+from tracing import Tracer, accepts_tracer
 from subtract_square_game import SubtractSquareGame
 from stonehenge_game import StonehengeGame
+from multi_subtract_square_game import MultiSubtractSquareGame
 
 
 # 'h' should map to Stonehenge.
 playable_games = {'s': SubtractSquareGame,
-                  'h': StonehengeGame}
+                  'h': StonehengeGame,
+                  'm': MultiSubtractSquareGame}
 
 # 'mr' should map to your recursive implementation of minimax while
 # 'mi' should map to your iterative implementation of minimax
 usable_strategies = {'i': interactive_strategy,
                      'mr': minimax_rec,
                      'ro': rough_outcome_strategy,
-                     'mi': iterative_strategy}
+                     'mi': iterative_strategy,
+                     'pm': parallel_strategy,
+                     'mf': mtdf_strategy,
+                     'fw': fastest_win_strategy,
+                     'pn': pn_strategy,
+                     'dl': deepening_strategy,
+                     'sl': selective_strategy,
+                     'le': learned_strategy}
+
+# The usable strategies that can run in the worker processes of a Pool:
+# they need no human and start no processes of their own.
+worker_strategies = {key: strategy
+                     for key, strategy in usable_strategies.items()
+                     if key not in ['i', 'pm']}
 
 
 class GameInterface:
@@ -34,11 +58,28 @@ class GameInterface:
     """
 
     def __init__(self, game: Any, p1_strategy: Callable,
-                 p2_strategy: Callable[[Any], Any]) -> None:
+                 p2_strategy: Callable[[Any], Any],
+                 stats_output: Callable[[str], Any] = None,
+                 profiler: MoveProfiler = None,
+                 trace_directory: str = None,
+                 memory_limit: int = None, trace_memory: bool = False,
+                 move_seconds: float = None, record_path: str = None) -> None:
         """
         Initialize this GameInterface, setting its active game to game, and
         using the strategies p1_strategy for Player 1 and p2_strategy for
-        Player 2.
+        Player 2. If stats_output is given, the search statistics of every
+        move made by a strategy that reports them are passed to it as a
+        string. If profiler is given, every such move is profiled with it.
+        If trace_directory is given, the moves of strategies that can record
+        a timeline of their workers are traced to files in it. If
+        memory_limit is given, strategies that can keep to a memory budget
+        get a budget of that many bytes for every move, and if trace_memory
+        is True their real peak is measured with tracemalloc. If
+        move_seconds is given, strategies that search under a clock get that
+        many seconds for every move. If record_path is given, the game is
+        appended to the game record file at that path when it ends, with the
+        time every move took and the score the search of every strategy that
+        reports one gave it.
 
         :param game: The game to be played.
         :type game:
@@ -46,6 +87,21 @@ class GameInterface:
         :type p1_strategy:
         :param p2_strategy: The strategy for Play 2.
         :type p2_strategy:
+        :param stats_output: A function such as print to send search
+                             statistics to.
+        :type stats_output:
+        :param profiler: The profiler to run AI moves under.
+        :type profiler:
+        :param trace_directory: The directory to write move timelines to.
+        :type trace_directory:
+        :param memory_limit: The number of bytes each AI move may use.
+        :type memory_limit:
+        :param trace_memory: Whether to measure memory with tracemalloc.
+        :type trace_memory:
+        :param move_seconds: The number of seconds each AI move may take.
+        :type move_seconds:
+        :param record_path: The game record file to log the game to.
+        :type record_path:
         """
         first_player = input("Type y if player 1 is to make the first move: ")
         is_p1_turn = False
@@ -55,12 +111,24 @@ class GameInterface:
         self.game = game(is_p1_turn)
         self.p1_strategy = p1_strategy
         self.p2_strategy = p2_strategy
+        self.stats_output = stats_output
+        self.profiler = profiler
+        self.trace_directory = trace_directory
+        self.memory_limit = memory_limit
+        self.trace_memory = trace_memory
+        self.move_seconds = move_seconds
+        self.record_path = record_path
+        self.move_number = 0
+        self.last_score = None
 
     def play(self) -> None:
         """
         Play the game.
         """
         current_state = self.game.current_state
+        record = None
+        if self.record_path is not None:
+            record = start_record(self.game)
 
         print(self.game.get_instructions())
         print(current_state)
@@ -76,32 +144,126 @@ class GameInterface:
                 print(move)
 
             # Pick a (legal) move.
+            move_start = time.perf_counter()
             while not current_state.is_valid_move(move_to_make):
                 current_strategy = self.p2_strategy
                 if current_state.get_current_player_name() == 'p1':
                     current_strategy = self.p1_strategy
-                move_to_make = current_strategy(self.game)
+                move_to_make = self.choose_move(current_strategy)
 
             # Apply the move
             current_player_name = current_state.get_current_player_name()
             new_game_state = current_state.make_move(move_to_make)
             self.game.current_state = new_game_state
             current_state = self.game.current_state
+            self.move_number += 1
+            if record is not None:
+                record.moves.append(move_to_make)
+                record.scores.append(self.last_score)
+                record.times.append(time.perf_counter() - move_start)
 
             print("{} made the move {}. The game's state is now:".format(
                 current_player_name, move_to_make))
             print(current_state)
 
         # Print out the winner of the game
+        winner = 0
         if self.game.is_winner("p1"):
             print("Player 1 is the winner!")
+            winner = 1
         elif self.game.is_winner("p2"):
             print("Player 2 is the winner!")
+            winner = 2
         else:
             print("It's a tie!")
+        if record is not None:
+            with GameRecordWriter(self.record_path) as writer:
+                writer.write(record._replace(winner=winner))
+
+    def choose_move(self, strategy: Callable) -> Any:
+        """
+        Return the move strategy chooses for the current state, sending its
+        search statistics to stats_output, profiling it and tracing it if
+        that is wanted. The score its search gave the move, if any, is kept
+        in last_score.
+        """
+        self.last_score = None
+        if not accepts_stats(strategy) or (self.stats_output is None and
+                                           self.profiler is None and
+                                           self.trace_directory is None and
+                                           self.memory_limit is None and
+                                           self.move_seconds is None and
+                                           self.record_path is None):
+            return strategy(self.game)
+        player_name = self.game.current_state.get_current_player_name()
+        tag = move_tag(self.game, self.move_number + 1, strategy)
+        options = {}
+        if self.trace_directory is not None and accepts_tracer(strategy):
+            options['tracer'] = Tracer()
+        if self.memory_limit is not None and \
+                accepts_option(strategy, 'budget'):
+            options['budget'] = MemoryBudget(self.memory_limit,
+                                             self.trace_memory)
+        if self.move_seconds is not None and \
+                accepts_option(strategy, 'seconds'):
+            options['seconds'] = self.move_seconds
+        if self.profiler is not None:
+            move, stats = self.profiler.run(tag, choose_move, strategy,
+                                            self.game, **options)
+        else:
+            move, stats = choose_move(strategy, self.game, **options)
+        if 'tracer' in options:
+            options['tracer'].write(os.path.join(self.trace_directory,
+                                                 tag + '.trace.json'))
+        self.last_score = stats.score
+        if self.stats_output is None:
+            return move
+        self.stats_output("{} ({}) chose {}: {}".format(
+            player_name, strategy.__name__, move, stats))
+        return move
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Play a game.')
+    parser.add_argument('--stats', action='store_true',
+                        help='print the search statistics of every AI move')
+    parser.add_argument('--stats-log', metavar='FILE',
+                        help='log the search statistics of every AI move to '
+                             'FILE')
+    parser.add_argument('--profile', metavar='DIR',
+                        default=os.environ.get(PROFILE_ENV),
+                        help='write a cProfile profile and a collapsed '
+                             'stack file of every AI move to DIR (default: '
+                             'the {} environment variable)'.format(
+                                 PROFILE_ENV))
+    parser.add_argument('--trace', metavar='DIR',
+                        help='write a Chrome trace-event timeline of the '
+                             'workers of every parallel AI move to DIR')
+    parser.add_argument('--memory-budget', metavar='MIB', type=float,
+                        help='memory each AI move may use for its search')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='measure the peak memory of every AI move with '
+                             'tracemalloc')
+    parser.add_argument('--move-seconds', metavar='SECONDS', type=float,
+                        help='time each AI move that searches under a clock '
+                             'may take')
+    parser.add_argument('--record', metavar='FILE',
+                        help='log the game to the binary game record FILE')
+    args = parser.parse_args()
+    memory_limit = None
+    if args.memory_budget is not None:
+        memory_limit = int(args.memory_budget * 2 ** 20)
+    move_profiler = None
+    if args.profile:
+        move_profiler = MoveProfiler(args.profile)
+    stats_output = None
+    if args.stats_log:
+        logging.basicConfig(filename=args.stats_log, level=logging.INFO,
+                            format='%(asctime)s %(message)s')
+        stats_output = logging.getLogger('search_stats').info
+    elif args.stats:
+        stats_output = print
+
     games = ", ".join(["'{}': {}".format(key, playable_games[key].__name__) if
                        playable_games[key] is not None else
                        "'{}': None".format(key) for key in playable_games])
@@ -127,4 +289,6 @@ if __name__ == '__main__':
         p2 = input("Select the strategy for Player 2 ({}): ".format(strategies))
 
     GameInterface(playable_games[chosen_game], usable_strategies[p1],
-                  usable_strategies[p2]).play()
+                  usable_strategies[p2], stats_output, move_profiler,
+                  args.trace, memory_limit, args.trace_memory,
+                  args.move_seconds, args.record).play()
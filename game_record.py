@@ -0,0 +1,398 @@
+"""
+A compact binary record of played games.
+
+A record file starts with a magic number and holds any number of games one
+after another, each prefixed by its length in bytes. A game is written as
+the key of its game type, whose turn it was first, who won, the numbers that
+set up its starting state (the side length of a Stonehenge board, the number
+to subtract from, or the sizes of the heaps), and its moves as small
+unsigned integers, followed by an optional score and time for every move.
+Integers are written as LEB128 varints, so a Stonehenge move takes one byte.
+
+Games are written one at a time and read back one at a time by a
+generator, so a file of millions of games can be gone through without
+loading it into memory.
+
+Usage:
+    python game_record.py games.rec
+
+NOTE: You do not have to run python-ta on this file.
+"""
+import argparse
+import math
+import struct
+import sys
+from typing import (Any, BinaryIO, Callable, Iterator, List, NamedTuple,
+                    Tuple, Union)
+from game import Game
+from multi_subtract_square_game import MultiSubtractSquareGame
+from stonehenge_game import StonehengeGame
+from subtract_square_game import SubtractSquareGame
+
+# The first bytes of every record file.
+RECORD_MAGIC = b'SHGR\x01'
+# Flags of a game: whether p1 moved first, and which optional lists follow
+# the moves.
+_P1_STARTS = 1
+_HAS_SCORES = 2
+_HAS_TIMES = 4
+
+
+class GameFormat(NamedTuple):
+    """
+    How the games of a game type are written.
+
+    game_class - the class of the games
+    parameters - the numbers that set up a starting state
+    start - the game with a first player and parameters
+    encode - the unsigned integers a move is written as
+    decode - the move written as some unsigned integers
+    codes - the number of integers each move is written as
+    """
+    game_class: type
+    parameters: Callable[[Any], List[int]]
+    start: Callable[[bool, Tuple[int, ...]], Game]
+    encode: Callable[[Any], List[int]]
+    decode: Callable[[List[int]], Any]
+    codes: int
+
+
+# The formats of the game types, under the keys of playable_games in
+# game_interface.
+GAME_FORMATS = {
+    's': GameFormat(
+        SubtractSquareGame,
+        lambda state: [state.current_total],
+        lambda p1_starts, parameters: SubtractSquareGame(p1_starts,
+                                                         parameters[0]),
+        lambda move: [math.isqrt(move)],
+        lambda codes: codes[0] ** 2, 1),
+    'h': GameFormat(
+        StonehengeGame,
+        lambda state: [state.side_length],
+        lambda p1_starts, parameters: StonehengeGame(p1_starts,
+                                                     parameters[0]),
+        lambda move: [ord(move) - ord('A')],
+        lambda codes: chr(ord('A') + codes[0]), 1),
+    'm': GameFormat(
+        MultiSubtractSquareGame,
+        lambda state: list(state.heaps),
+        lambda p1_starts, parameters: MultiSubtractSquareGame(
+            p1_starts, tuple(parameters)),
+        lambda move: [move[0], math.isqrt(move[1])],
+        lambda codes: (codes[0], codes[1] ** 2), 2)}
+
+
+class GameRecord(NamedTuple):
+    """
+    A game that was played.
+
+    game - the key of the game type in GAME_FORMATS
+    parameters - the numbers that set up the starting state
+    p1_starts - whether p1 moved first
+    moves - the moves played, in order
+    scores - the score the search of the player who made each move gave it,
+             or None
+    times - the seconds each move took, or None
+    winner - 1 or 2 for the player who won, or 0 if the game is unfinished
+    """
+    game: str
+    parameters: Tuple[int, ...]
+    p1_starts: bool
+    moves: List[Any]
+    scores: List[Union[float, None]]
+    times: List[Union[float, None]]
+    winner: int
+
+    def start(self) -> Game:
+        """
+        Return the game this record is of, at its starting state.
+
+        >>> record = GameRecord('h', (2,), True, [], [], [], 0)
+        >>> record.start().current_state.get_possible_moves()
+        ['A', 'B', 'C', 'D', 'E', 'F', 'G']
+        """
+        return GAME_FORMATS[self.game].start(self.p1_starts, self.parameters)
+
+
+def start_record(game: Game) -> GameRecord:
+    """
+    Return a record with no moves of game, which is at its starting state.
+
+    >>> start_record(SubtractSquareGame(False, 20))
+    GameRecord(game='s', parameters=(20,), p1_starts=False, moves=[], \
+scores=[], times=[], winner=0)
+    """
+    for key, game_format in GAME_FORMATS.items():
+        if isinstance(game, game_format.game_class):
+            state = game.current_state
+            return GameRecord(key, tuple(game_format.parameters(state)),
+                              state.p1_turn, [], [], [], 0)
+    raise ValueError('{} games cannot be recorded'.format(
+        type(game).__name__))
+
+
+def _write_varint(data: bytearray, value: int) -> None:
+    """
+    Append the unsigned integer value to data as a LEB128 varint.
+    """
+    while value >= 0x80:
+        data.append(value & 0x7f | 0x80)
+        value >>= 7
+    data.append(value)
+
+
+def _read_varint(data: bytes, offset: int) -> Tuple[int, int]:
+    """
+    Return the LEB128 varint in data at offset, and the offset after it.
+
+    >>> buffer = bytearray()
+    >>> _write_varint(buffer, 300)
+    >>> bytes(buffer), _read_varint(buffer, 0)
+    (b'\\xac\\x02', (300, 2))
+    """
+    value, shift = 0, 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def _pack_floats(values: List[Union[float, None]]) -> bytes:
+    """
+    Return values as little-endian float32s, with None as NaN.
+    """
+    return struct.pack('<{}f'.format(len(values)),
+                       *[math.nan if value is None else value
+                         for value in values])
+
+
+def _unpack_floats(data: bytes, offset: int,
+                   count: int) -> List[Union[float, None]]:
+    """
+    Return the count float32s in data at offset, with NaN as None.
+    """
+    values = struct.unpack_from('<{}f'.format(count), data, offset)
+    return [None if math.isnan(value) else value for value in values]
+
+
+def encode_game(record: GameRecord) -> bytes:
+    """
+    Return record written in the binary format, without its length. Its
+    scores and times must each be empty or have one entry per move.
+
+    >>> encode_game(GameRecord('s', (5,), True, [4, 1], [0.5], [], 1))
+    Traceback (most recent call last):
+    ...
+    ValueError: 1 scores for 2 moves
+    """
+    for name, values in [('scores', record.scores), ('times', record.times)]:
+        if values != [] and len(values) != len(record.moves):
+            raise ValueError('{} {} for {} moves'.format(
+                len(values), name, len(record.moves)))
+    game_format = GAME_FORMATS[record.game]
+    has_scores = any(score is not None for score in record.scores)
+    has_times = any(seconds is not None for seconds in record.times)
+    data = bytearray(record.game.encode('ascii'))
+    data.append((_P1_STARTS if record.p1_starts else 0) |
+                (_HAS_SCORES if has_scores else 0) |
+                (_HAS_TIMES if has_times else 0))
+    data.append(record.winner)
+    _write_varint(data, len(record.parameters))
+    for parameter in record.parameters:
+        _write_varint(data, parameter)
+    _write_varint(data, len(record.moves))
+    for move in record.moves:
+        for code in game_format.encode(move):
+            _write_varint(data, code)
+    if has_scores:
+        data += _pack_floats(record.scores)
+    if has_times:
+        data += _pack_floats(record.times)
+    return bytes(data)
+
+
+def decode_game(data: bytes) -> GameRecord:
+    """
+    Return the game written in data by encode_game().
+
+    >>> record = GameRecord('m', (3, 10), True, [(1, 9), (0, 1)],
+    ...                     [0.5, None], [], 0)
+    >>> decode_game(encode_game(record)) == record
+    True
+    """
+    key = chr(data[0])
+    game_format = GAME_FORMATS[key]
+    flags, winner = data[1], data[2]
+    count, offset = _read_varint(data, 3)
+    parameters = []
+    for _ in range(count):
+        parameter, offset = _read_varint(data, offset)
+        parameters.append(parameter)
+    count, offset = _read_varint(data, offset)
+    moves = []
+    for _ in range(count):
+        codes = []
+        for _ in range(game_format.codes):
+            code, offset = _read_varint(data, offset)
+            codes.append(code)
+        moves.append(game_format.decode(codes))
+    scores, times = [], []
+    if flags & _HAS_SCORES:
+        scores = _unpack_floats(data, offset, count)
+        offset += 4 * count
+    if flags & _HAS_TIMES:
+        times = _unpack_floats(data, offset, count)
+    return GameRecord(key, tuple(parameters), bool(flags & _P1_STARTS),
+                      moves, scores, times, winner)
+
+
+class GameRecordWriter:
+    """
+    A writer that appends games to a record file, which it creates if it
+    does not exist. It can be used as a context manager.
+
+    path - the path of the record file
+    games - the number of games written by this writer
+    """
+    path: str
+    games: int
+
+    def __init__(self, path: str) -> None:
+        """
+        Initialize this writer to append to the record file at path.
+        """
+        self.path = path
+        self.games = 0
+        self._file = open(path, 'ab')
+        if self._file.tell() == 0:
+            self._file.write(RECORD_MAGIC)
+
+    def write(self, record: GameRecord) -> None:
+        """
+        Append record to the file.
+        """
+        data = encode_game(record)
+        length = bytearray()
+        _write_varint(length, len(data))
+        self._file.write(bytes(length) + data)
+        self.games += 1
+
+    def close(self) -> None:
+        """
+        Finish writing to the file.
+        """
+        self._file.close()
+
+    def __enter__(self) -> 'GameRecordWriter':
+        """
+        Return this writer.
+        """
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """
+        Close this writer.
+        """
+        self.close()
+
+
+def _read_length(record_file: BinaryIO) -> Union[int, None]:
+    """
+    Return the length of the next game in record_file, or None at the end
+    of the file.
+    """
+    length, shift = 0, 0
+    while True:
+        byte = record_file.read(1)
+        if byte == b'':
+            if shift == 0:
+                return None
+            raise ValueError('record file ends inside a game length')
+        length |= (byte[0] & 0x7f) << shift
+        if byte[0] < 0x80:
+            return length
+        shift += 7
+
+
+def _read_next(record_file: BinaryIO) -> Union[GameRecord, None]:
+    """
+    Return the game in record_file at its position, or None at the end of
+    the file.
+    """
+    length = _read_length(record_file)
+    if length is None:
+        return None
+    data = record_file.read(length)
+    if len(data) < length:
+        raise ValueError('record file ends inside a game')
+    return decode_game(data)
+
+
+def iter_games(path: str) -> Iterator[Tuple[int, GameRecord]]:
+    """
+    Yield the offset in the record file at path of every game in it, with
+    the game, one at a time.
+    """
+    with open(path, 'rb') as record_file:
+        if record_file.read(len(RECORD_MAGIC)) != RECORD_MAGIC:
+            raise ValueError('{} is not a game record file'.format(path))
+        while True:
+            offset = record_file.tell()
+            record = _read_next(record_file)
+            if record is None:
+                return
+            yield offset, record
+
+
+def read_games(path: str) -> Iterator[GameRecord]:
+    """
+    Yield the games in the record file at path, one at a time.
+    """
+    for _, record in iter_games(path):
+        yield record
+
+
+def read_game_at(record_file: BinaryIO, offset: int) -> GameRecord:
+    """
+    Return the game at offset in the open record_file, as given by
+    iter_games().
+    """
+    record_file.seek(offset)
+    record = _read_next(record_file)
+    if record is None:
+        raise ValueError('no game at offset {}'.format(offset))
+    return record
+
+
+def main(argv: List[str] = None) -> int:
+    """
+    Summarize record files from the command line.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('paths', nargs='+', metavar='FILE',
+                        help='record files to summarize')
+    args = parser.parse_args(argv)
+
+    summary = {}
+    for path in args.paths:
+        for record in read_games(path):
+            totals = summary.setdefault(record.game, [0, 0, 0, 0])
+            totals[0] += 1
+            totals[1] += len(record.moves)
+            if record.winner != 0:
+                totals[1 + record.winner] += 1
+    print('{:<24} {:>9} {:>9} {:>7} {:>7}'.format(
+        'game', 'games', 'moves', 'p1 won', 'p2 won'))
+    for key, (games, moves, p1_won, p2_won) in sorted(summary.items()):
+        print('{:<24} {:>9} {:>9} {:>7} {:>7}'.format(
+            GAME_FORMATS[key].game_class.__name__, games, moves, p1_won,
+            p2_won))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,7 +3,7 @@ The GameState superclass.
 
 NOTE: You do not have to run python-ta on this file.
 """
-from typing import Any
+from typing import Any, Hashable, Iterator, List, Union
 
 
 class GameState:
@@ -40,6 +40,39 @@ class GameState:
         """
         raise NotImplementedError
 
+    def iter_possible_moves(self) -> Iterator[Any]:
+        """
+        Yield the possible moves that can be applied to this state, in the
+        same order as get_possible_moves(). Searches that may stop early use
+        this so that states able to generate their moves lazily can do so.
+        """
+        return iter(self.get_possible_moves())
+
+    def get_move_classes(self) -> List[List[Any]]:
+        """
+        Return the possible moves grouped into classes of moves that lead to
+        equivalent states, with the classes and the moves in each class in
+        the order of get_possible_moves(). By default every move is in a
+        class of its own.
+        """
+        return [[move] for move in self.get_possible_moves()]
+
+    def iter_distinct_moves(self) -> Iterator[Any]:
+        """
+        Yield one move from each class of get_move_classes(), which is all a
+        search needs to try. States that can have equivalent moves override
+        this to yield the first move of each class.
+        """
+        return self.iter_possible_moves()
+
+    def winning_moves(self) -> List[Any]:
+        """
+        Return the moves with which the current player wins the game at once,
+        as far as this state can tell without making them. Searches use this
+        to score a state as won without generating its children.
+        """
+        return []
+
     def get_current_player_name(self) -> str:
         """
         Return 'p1' if the current player is Player 1, and 'p2' if the current
@@ -68,6 +101,22 @@ class GameState:
         """
         raise NotImplementedError
 
+    def get_key(self) -> Hashable:
+        """
+        Return a hashable key that is equal for two states exactly when the
+        same moves are possible from them with the same outcomes, so that
+        searches can recognize a state reached by different move orders.
+        """
+        raise NotImplementedError
+
+    def decided_score(self) -> Union[int, None]:
+        """
+        Return the exact score (WIN or LOSE) of the player whose turn it is
+        if this state can tell it is already decided without searching it,
+        or None otherwise. Searches stop at states whose score is decided.
+        """
+        return None
+
     def rough_outcome(self) -> float:
         """
         Return an estimate in interval [LOSE, WIN] of best outcome the current
@@ -0,0 +1,249 @@
+"""
+A static evaluation of Stonehenge states learned by logistic regression.
+
+A state is described, from the point of view of the player whose turn it
+is, by a fixed list of features for its side length: for every ley-line,
+who has claimed it, whether each player would claim it with one more cell
+and the share of its cells each player holds; for every cell, who holds
+it. The evaluation is the logistic function of the dot product of the
+features with a weight for each of them, stretched onto (LOSE, WIN), so
+scoring a state costs one pass over its ley-lines and cells.
+
+The weights are trained on positions labelled with their exact score from
+exact_value or with the outcome of the game they were played in, such as
+the shards written by self_play, and are kept for each side length in a
+small JSON file. Training needs NumPy; evaluating with trained weights does
+not.
+
+Usage:
+    python learned_evaluation.py --side-lengths 2 3 4 --positions 2000
+    python learned_evaluation.py --data positions.jsonl
+    python learned_evaluation.py --shards shards/*.bin.gz
+
+NOTE: You do not have to run python-ta on this file.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+from typing import Dict, List, Tuple
+from evaluation_tuning import agreement, sample_positions
+from self_play import read_shard, record_state
+from stonehenge_state import StonehengeState
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# The file the weights are kept in when no other file is given.
+DEFAULT_WEIGHTS_PATH = os.path.join(os.path.dirname(os.path.abspath(
+    __file__)), 'learned_weights.json')
+# Steps of gradient descent, their size, and the L2 penalty on the weights.
+EPOCHS = 2000
+LEARNING_RATE = 0.5
+L2_PENALTY = 1e-3
+
+
+def features(state: StonehengeState) -> List[float]:
+    """
+    Return the features of state for the player whose turn it is, with a
+    constant 1 first for the bias.
+
+    >>> len(features(StonehengeState(True, 2)))
+    69
+    >>> s1 = StonehengeState(True, 2).make_move('A')
+    >>> features(s1)[1:7]
+    [0.0, 1.0, 0.0, 0.0, 0.0, 0.0]
+    """
+    player, opponent = (0, 1) if state.p1_turn else (1, 0)
+    mine, theirs = player + 1, opponent + 1
+    values = [1.0]
+    for leyline in state.ley_line:
+        mark = state.ley_line_state[leyline]
+        length = len(state.ley_line[leyline])
+        counts = state.ley_line_count[leyline]
+        unclaimed = mark == '@'
+        values.extend([
+            float(mark == mine), float(mark == theirs),
+            float(unclaimed and 2 * (counts[player] + 1) >= length),
+            float(unclaimed and 2 * (counts[opponent] + 1) >= length),
+            counts[player] / length if unclaimed else 0.0,
+            counts[opponent] / length if unclaimed else 0.0])
+    for value in state.cells.values():
+        values.extend([float(value == mine), float(value == theirs)])
+    return values
+
+
+class LinearEvaluation:
+    """
+    A learned evaluation of Stonehenge states, called like rough_outcome()
+    with the state to score.
+
+    weights - the weight of every feature, by side length
+    """
+    weights: Dict[int, List[float]]
+
+    def __init__(self, weights: Dict[int, List[float]]) -> None:
+        """
+        Initialize this evaluation with the weights of every side length.
+        """
+        self.weights = weights
+
+    def __call__(self, state: StonehengeState) -> float:
+        """
+        Return an estimate in interval (LOSE, WIN) of the outcome of state
+        for the player whose turn it is, or its potential_outcome() if there
+        are no weights for its side length.
+
+        >>> s1 = StonehengeState(True, 1)
+        >>> LinearEvaluation({1: [0.0] * len(features(s1))})(s1)
+        0.0
+        """
+        weights = self.weights.get(state.side_length)
+        if weights is None:
+            return state.potential_outcome()
+        total = sum(weight * value
+                    for weight, value in zip(weights, features(state)))
+        # The logistic function of total, stretched from (0, 1).
+        return math.tanh(total / 2)
+
+    def save(self, path: str = DEFAULT_WEIGHTS_PATH) -> None:
+        """
+        Write the weights of this evaluation to the JSON file at path.
+        """
+        with open(path, 'w') as weights_file:
+            json.dump({str(side_length): [round(weight, 6)
+                                          for weight in weights]
+                       for side_length, weights in
+                       sorted(self.weights.items())},
+                      weights_file, indent=1)
+            weights_file.write('\n')
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_WEIGHTS_PATH) -> "LinearEvaluation":
+        """
+        Return the evaluation with the weights in the JSON file at path.
+        """
+        with open(path) as weights_file:
+            return cls({int(side_length): weights for side_length, weights
+                        in json.load(weights_file).items()})
+
+
+def train(positions: List[Tuple[StonehengeState, int]],
+          epochs: int = EPOCHS) -> List[float]:
+    """
+    Return the weights of a logistic regression from the features of the
+    states of positions to whether their scores are WIN, trained by
+    gradient descent on all the positions at once.
+
+    Precondition: NumPy is installed, and the states of positions all have
+    the same side length.
+    """
+    inputs = numpy.array([features(state) for state, _ in positions])
+    labels = numpy.array([float(score == state.WIN)
+                          for state, score in positions])
+    weights = numpy.zeros(inputs.shape[1])
+    penalty = numpy.full(inputs.shape[1], L2_PENALTY)
+    penalty[0] = 0.0
+    for _ in range(epochs):
+        predictions = 1 / (1 + numpy.exp(-(inputs @ weights)))
+        gradient = inputs.T @ (predictions - labels) / len(labels) + \
+            penalty * weights
+        weights -= LEARNING_RATE * gradient
+    return [float(weight) for weight in weights]
+
+
+def read_positions(path: str) -> List[Tuple[StonehengeState, int]]:
+    """
+    Return the labelled positions in the file at path, which has one JSON
+    object per line with the side_length of the board, whether p1 started
+    (p1_starts), the moves played, and the score of the position for the
+    player whose turn it is.
+    """
+    positions = []
+    with open(path) as positions_file:
+        for line in positions_file:
+            if line.strip() == '':
+                continue
+            record = json.loads(line)
+            state = StonehengeState(record['p1_starts'],
+                                    record['side_length'])
+            for move in record['moves']:
+                state = state.make_move(move)
+            positions.append((state, record['score']))
+    return positions
+
+
+def read_shards(paths: List[str]) -> List[Tuple[StonehengeState, int]]:
+    """
+    Return the positions in the self-play shards at paths, each labelled
+    with the result of its game for the player whose turn it is.
+    """
+    return [(record_state(record, side_length), record.result)
+            for path in paths
+            for side_length, record in read_shard(path)]
+
+
+def main(argv: List[str] = None) -> int:
+    """
+    Train the learned evaluation from the command line.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--side-lengths', type=int, nargs='+',
+                        default=[2, 3, 4],
+                        help='side lengths to train on positions solved by '
+                             'exact_value (default: %(default)s)')
+    parser.add_argument('--positions', type=int, default=2000,
+                        help='number of positions of each side length '
+                             '(default: %(default)s)')
+    parser.add_argument('--data', metavar='FILE',
+                        help='train on the labelled positions in FILE '
+                             'instead')
+    parser.add_argument('--shards', nargs='+', metavar='SHARD',
+                        help='train on the positions in self-play SHARDs '
+                             'instead')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the random games (default: '
+                             '%(default)s)')
+    parser.add_argument('--output', default=DEFAULT_WEIGHTS_PATH,
+                        help='file to write the weights to (default: '
+                             '%(default)s)')
+    args = parser.parse_args(argv)
+    if numpy is None:
+        print('Training needs NumPy, which is not installed.')
+        return 1
+
+    rng = random.Random(args.seed)
+    by_side_length = {}
+    if args.data is not None or args.shards is not None:
+        labelled = read_positions(args.data) if args.data is not None \
+            else read_shards(args.shards)
+        for state, score in labelled:
+            by_side_length.setdefault(state.side_length, []).append(
+                (state, score))
+    else:
+        for side_length in args.side_lengths:
+            by_side_length[side_length] = sample_positions(
+                side_length, args.positions, rng)
+    weights = {}
+    print('{:<12} {:>9} {:>9} {:>9}'.format(
+        'side length', 'positions', 'learned', 'rough'))
+    for side_length, positions in sorted(by_side_length.items()):
+        # A fifth of the positions are held out to measure agreement on.
+        held_out = len(positions) // 5
+        weights[side_length] = train(positions[held_out:])
+        evaluation = LinearEvaluation({side_length: weights[side_length]})
+        print('{:<12} {:>9} {:>9.3f} {:>9.3f}'.format(
+            side_length, len(positions),
+            agreement(evaluation, positions[:held_out]),
+            agreement(StonehengeState.rough_outcome,
+                      positions[:held_out])))
+    LinearEvaluation(weights).save(args.output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""
+Memory budgets for searches.
+
+A search charges the memory used by its tree nodes, transposition tables and
+caches to a MemoryBudget, and checks whether the budget is exceeded before
+growing them further. The amounts charged are estimates made with
+deep_size(), which is cheap enough to call once per search; when the real
+peak is wanted, the budget can also run tracemalloc over the search.
+
+NOTE: You do not have to run python-ta on this file.
+"""
+import sys
+import tracemalloc
+from typing import Any, Dict
+
+
+class MemoryBudget:
+    """
+    The memory a search is allowed to use.
+
+    limit - number of bytes the search may charge
+    used - number of bytes currently charged by each component
+    peak - highest number of bytes charged at once
+    trace - whether tracemalloc measures the real peak of the search
+    traced_peak - highest number of bytes traced by tracemalloc
+    """
+    limit: int
+    used: Dict[str, int]
+    peak: int
+    trace: bool
+    traced_peak: int
+
+    def __init__(self, limit: int, trace: bool = False) -> None:
+        """
+        Initialize this budget to allow limit bytes, measuring the real peak
+        with tracemalloc if trace is True.
+        """
+        self.limit = limit
+        self.used = {}
+        self.peak = 0
+        self.trace = trace
+        self.traced_peak = 0
+        self._total = 0
+        self._started_tracing = False
+
+    @property
+    def total(self) -> int:
+        """
+        Return the number of bytes currently charged.
+        """
+        return self._total
+
+    @property
+    def exceeded(self) -> bool:
+        """
+        Return whether more bytes are charged than the limit allows.
+
+        >>> budget = MemoryBudget(100)
+        >>> budget.charge('tree', 60)
+        >>> budget.exceeded
+        False
+        >>> budget.charge('table', 60)
+        >>> budget.exceeded
+        True
+        >>> budget.release('table', 60)
+        >>> budget.exceeded, budget.peak
+        (False, 120)
+        """
+        return self._total > self.limit
+
+    def charge(self, component: str, nbytes: int) -> None:
+        """
+        Record that component uses nbytes more bytes.
+        """
+        self.used[component] = self.used.get(component, 0) + nbytes
+        self._total += nbytes
+        if self._total > self.peak:
+            self.peak = self._total
+
+    def release(self, component: str, nbytes: int) -> None:
+        """
+        Record that component uses nbytes fewer bytes.
+        """
+        self.used[component] = self.used.get(component, 0) - nbytes
+        self._total -= nbytes
+
+    def start(self) -> None:
+        """
+        Start measuring the real peak with tracemalloc, if it is wanted.
+        """
+        if not self.trace:
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        tracemalloc.reset_peak()
+
+    def stop(self) -> None:
+        """
+        Stop measuring the real peak, and record it in traced_peak.
+        """
+        if not self.trace or not tracemalloc.is_tracing():
+            return
+        self.traced_peak = max(self.traced_peak,
+                               tracemalloc.get_traced_memory()[1])
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def __str__(self) -> str:
+        """
+        Return a summary of the memory used against this budget.
+
+        >>> budget = MemoryBudget(2 ** 20)
+        >>> budget.charge('tree', 2 ** 19)
+        >>> print(budget)
+        peak 512 KiB of 1024 KiB (tree: 512 KiB)
+        """
+        parts = ', '.join('{}: {} KiB'.format(component, nbytes // 1024)
+                          for component, nbytes in sorted(self.used.items()))
+        summary = 'peak {} KiB of {} KiB ({})'.format(
+            self.peak // 1024, self.limit // 1024, parts)
+        if self.trace:
+            summary += ', traced peak {} KiB'.format(self.traced_peak // 1024)
+        return summary
+
+
+def deep_size(obj: Any) -> int:
+    """
+    Return an estimate of the number of bytes used by obj and the objects it
+    refers to through containers and attributes.
+
+    >>> deep_size([]) == sys.getsizeof([])
+    True
+    >>> deep_size(['abc']) == sys.getsizeof(['abc']) + sys.getsizeof('abc')
+    True
+    """
+    seen = set()
+    stack = [obj]
+    total = 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        elif hasattr(item, '__dict__'):
+            stack.append(vars(item))
+    return total
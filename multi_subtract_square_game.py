@@ -0,0 +1,75 @@
+"""
+An implementation of SubtractSquare played on several heaps.
+
+NOTE: You do not have to run python-ta on this file.
+"""
+from typing import Any, Tuple
+from game import Game
+from multi_subtract_square_state import MultiSubtractSquareState
+
+
+class MultiSubtractSquareGame(Game):
+    """
+    SubtractSquare played on several heaps: each move subtracts a square
+    number from one heap, and the player who empties the last heap wins.
+    """
+
+    def __init__(self, p1_starts: bool, heaps: Tuple[int, ...] = None) -> None:
+        """
+        Initialize this Game, using p1_starts to find who the first player is.
+        The heaps are asked for interactively unless heaps is given.
+        """
+        if heaps is None:
+            heaps = ()
+            while heaps == ():
+                sizes = input("Enter the sizes of the heaps, separated by "
+                              "spaces: ").split()
+                if all(size.isdigit() for size in sizes):
+                    heaps = tuple(int(size) for size in sizes)
+        self.current_state = MultiSubtractSquareState(p1_starts, heaps)
+
+    def get_instructions(self) -> str:
+        """
+        Return the instructions for this Game.
+        """
+        instructions = "Players take turns subtracting a square number " + \
+            "from one of the heaps. Moves are written as the heap number " + \
+            "and the square, e.g. '0 4'. The winner is the person who " + \
+            "empties the last heap."
+        return instructions
+
+    def is_over(self, state: MultiSubtractSquareState) -> bool:
+        """
+        Return whether or not this game is over at state.
+        """
+        return not any(state.heaps)
+
+    def is_winner(self, player: str) -> bool:
+        """
+        Return whether player has won the game.
+
+        Precondition: player is 'p1' or 'p2'.
+        """
+        return (self.current_state.get_current_player_name() != player
+                and self.is_over(self.current_state))
+
+    def str_to_move(self, string: str) -> Any:
+        """
+        Return the move that string represents. If string is not a move,
+        return an invalid move.
+
+        >>> game = MultiSubtractSquareGame(True, (3, 10))
+        >>> game.str_to_move('1 9'), game.str_to_move('(1, 4)')
+        ((1, 9), (1, 4))
+        >>> game.str_to_move('nine')
+        -1
+        """
+        parts = string.strip(' ()').replace(',', ' ').split()
+        if len(parts) != 2 or not all(part.isdigit() for part in parts):
+            return -1
+        return int(parts[0]), int(parts[1])
+
+
+if __name__ == "__main__":
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
@@ -0,0 +1,144 @@
+"""
+An implementation of a state for SubtractSquare played on several heaps.
+
+NOTE: You do not have to run python-ta on this file.
+"""
+from math import isqrt
+from typing import Any, Hashable, Iterator, List, Tuple
+from game_state import GameState
+from subtract_square_solver import grundy_value
+
+
+class MultiSubtractSquareState(GameState):
+    """
+    The state of a game of multi-heap SubtractSquare at a certain point in
+    time. A move (heap, square) subtracts square from heaps[heap].
+    """
+    heaps: Tuple[int, ...]
+
+    def __init__(self, is_p1_turn: bool, heaps: Tuple[int, ...]) -> None:
+        """
+        Initialize this game state and set the current player based on
+        is_p1_turn.
+        """
+        super().__init__(is_p1_turn)
+        self.heaps = tuple(heaps)
+
+    def __str__(self) -> str:
+        """
+        Return a string representation of the current state of the game.
+
+        >>> print(MultiSubtractSquareState(True, (3, 10)))
+        Heaps: 0: 3, 1: 10
+        """
+        return "Heaps: {}".format(", ".join(
+            "{}: {}".format(heap, size) for heap, size in
+            enumerate(self.heaps)))
+
+    def get_possible_moves(self) -> List[Tuple[int, int]]:
+        """
+        Return all possible moves that can be applied to this state.
+
+        >>> MultiSubtractSquareState(True, (3, 4)).get_possible_moves()
+        [(0, 1), (1, 1), (1, 4)]
+        """
+        return list(self.iter_possible_moves())
+
+    def iter_possible_moves(self) -> Iterator[Tuple[int, int]]:
+        """
+        Yield the possible moves that can be applied to this state, heap by
+        heap and from the smallest square to the largest.
+        """
+        for heap, size in enumerate(self.heaps):
+            for i in range(1, isqrt(size) + 1):
+                yield heap, i * i
+
+    def get_move_classes(self) -> List[List[Tuple[int, int]]]:
+        """
+        Return the possible moves grouped into classes of moves that lead to
+        equivalent states: the same square subtracted from heaps of the same
+        size.
+
+        >>> MultiSubtractSquareState(True, (2, 3, 2)).get_move_classes()
+        [[(0, 1), (2, 1)], [(1, 1)]]
+        """
+        classes = {}
+        for heap, square in self.iter_possible_moves():
+            classes.setdefault((self.heaps[heap], square), []).append(
+                (heap, square))
+        return list(classes.values())
+
+    def iter_distinct_moves(self) -> Iterator[Tuple[int, int]]:
+        """
+        Yield the first move of each class of get_move_classes().
+        """
+        return iter([moves[0] for moves in self.get_move_classes()])
+
+    def make_move(self, move: Any) -> "MultiSubtractSquareState":
+        """
+        Return the GameState that results from applying move to this GameState.
+
+        >>> state = MultiSubtractSquareState(True, (3, 10))
+        >>> state.make_move((1, 9)).heaps
+        (3, 1)
+        """
+        heap, square = move
+        heaps = list(self.heaps)
+        heaps[heap] -= square
+        return MultiSubtractSquareState(not self.p1_turn, tuple(heaps))
+
+    def is_valid_move(self, move: Any) -> bool:
+        """
+        Return whether move is a valid move for this GameState.
+
+        >>> state = MultiSubtractSquareState(True, (3, 10))
+        >>> state.is_valid_move((1, 9)), state.is_valid_move((0, 4))
+        (True, False)
+        """
+        if not isinstance(move, tuple) or len(move) != 2:
+            return False
+        heap, square = move
+        return (0 <= heap < len(self.heaps) and 0 < square <=
+                self.heaps[heap] and isqrt(square) ** 2 == square)
+
+    def __repr__(self) -> str:
+        """
+        Return a representation of this state (which can be used for
+        equality testing).
+        """
+        return "P1's Turn: {} - Heaps: {}".format(self.p1_turn,
+                                                  list(self.heaps))
+
+    def get_key(self) -> Hashable:
+        """
+        Return a hashable key identifying this state.
+
+        >>> MultiSubtractSquareState(False, (3, 10)).get_key()
+        (False, (3, 10))
+        """
+        return self.p1_turn, self.heaps
+
+    def decided_score(self) -> int:
+        """
+        Return the exact score of the player whose turn it is, which the
+        Grundy numbers of the heaps always decide.
+        """
+        return self.rough_outcome()
+
+    def rough_outcome(self) -> float:
+        """
+        Return an estimate in interval [LOSE, WIN] of best outcome the current
+        player can guarantee from state self. The estimate is exact, since it
+        comes from the Grundy numbers of the heaps.
+
+        >>> MultiSubtractSquareState(True, (2, 2)).rough_outcome()
+        -1
+        >>> MultiSubtractSquareState(True, (2, 3)).rough_outcome()
+        1
+        """
+        return self.WIN if grundy_value(self.heaps) != 0 else self.LOSE
+
+
+if __name__ == "__main__":
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
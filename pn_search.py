@@ -0,0 +1,179 @@
+"""
+Depth-first proof-number search (df-pn).
+
+Proves or disproves that the player whose turn it is wins, expanding first
+the moves that look easiest to prove, instead of searching every move to the
+same depth. Works on any GameState, using iter_distinct_moves, make_move,
+get_key and decided_score. As in search.py, a state without possible moves
+is scored as LOSE for the player whose turn it is, so every proof ends in WIN
+or LOSE. The proof and disproof numbers are kept in a TranspositionTable
+bounded by a MemoryBudget.
+
+Run as a script, it solves positions of the decision benchmark corpus and
+reports the result, proving move, nodes and memory of each proof.
+
+Usage:
+    python pn_search.py --positions stonehenge-3 --memory-budget 64
+
+NOTE: You do not have to run python-ta on this file.
+"""
+import argparse
+import sys
+import time
+from typing import Any, List, Tuple
+from game_state import GameState
+from memory_budget import MemoryBudget
+from search import TranspositionTable
+from search_stats import SearchStats
+from tracing import Tracer
+
+# Proof and disproof numbers of states that cannot be proven or disproven.
+INFINITY = 10 ** 9
+# Memory the table of a search may use when no budget is given.
+DEFAULT_TABLE_BYTES = 64 * 2 ** 20
+
+
+class ProofNumberSearch:
+    """
+    A df-pn solver with a bounded transposition table.
+
+    The proof number of a state is the least number of states that must be
+    solved to prove the player whose turn it is wins, and its disproof number
+    the least to prove they lose.
+
+    budget - the budget the table is charged to
+    table - the proof and disproof numbers of states searched, by key
+    stats - the statistics of the searches
+    """
+    budget: MemoryBudget
+    table: TranspositionTable
+    stats: SearchStats
+
+    def __init__(self, budget: MemoryBudget = None, stats: SearchStats = None,
+                 tracer: Tracer = None) -> None:
+        """
+        Initialize this solver with a table within budget (by default,
+        DEFAULT_TABLE_BYTES), recording searches in stats and table resizes
+        in tracer.
+        """
+        self.budget = (MemoryBudget(DEFAULT_TABLE_BYTES) if budget is None
+                       else budget)
+        self.table = TranspositionTable(self.budget, tracer)
+        self.stats = SearchStats() if stats is None else stats
+
+    def solve(self, state: GameState) -> Tuple[int, Any]:
+        """
+        Return the exact score of state (WIN or LOSE) for the player whose
+        turn it is, and a move that gets it, or None if state has no moves.
+
+        >>> from subtract_square_state import SubtractSquareState
+        >>> ProofNumberSearch().solve(SubtractSquareState(True, 18))
+        (1, 16)
+        >>> ProofNumberSearch().solve(SubtractSquareState(True, 20))
+        (-1, 1)
+        """
+        self.budget.start()
+        proof, _, move = self._search(state, INFINITY, INFINITY, 0)
+        self.budget.stop()
+        self.stats.end_iteration()
+        self.stats.memory_peak = max(self.stats.memory_peak, self.budget.peak,
+                                     self.budget.traced_peak)
+        return (state.WIN if proof == 0 else state.LOSE), move
+
+    def _numbers(self, state: GameState) -> Tuple[int, int]:
+        """
+        Return the proof and disproof numbers of state from the table, or
+        else from its decided score, storing them in the table.
+        """
+        key = state.get_key()
+        self.stats.tt_probes += 1
+        numbers = self.table.get(key)
+        if numbers is not None:
+            self.stats.tt_hits += 1
+            return numbers
+        decided = state.decided_score()
+        if decided is None and state.get_possible_moves() == []:
+            decided = state.LOSE
+        if decided is None:
+            numbers = (1, 1)
+        else:
+            self.stats.leaf_evaluations += 1
+            numbers = (0, INFINITY) if decided == state.WIN else (INFINITY, 0)
+        self.table[key] = numbers
+        return numbers
+
+    def _search(self, state: GameState, proof_limit: int,
+                disproof_limit: int, depth: int) -> Tuple[int, int, Any]:
+        """
+        Search state, depth plies below the root, until its proof number
+        reaches proof_limit or its disproof number reaches disproof_limit.
+        Return its proof and disproof numbers and its most proving move.
+        """
+        self.stats.visit(depth)
+        proof, disproof = self._numbers(state)
+        if depth > 0 and (proof == 0 or disproof == 0):
+            return proof, disproof, None
+        # The root is searched even when it is decided, to find its move.
+        children = []
+        for move in state.iter_distinct_moves():
+            children.append((move, state.make_move(move)))
+            self.stats.make_move_calls += 1
+        if children == []:
+            return proof, disproof, None
+        numbers = [self._numbers(child) for _, child in children]
+        while True:
+            # A child's disproof proves this state, and the proofs of all
+            # children disprove it.
+            disproofs = [child_disproof for _, child_disproof in numbers]
+            proof = min(disproofs)
+            disproof = min(INFINITY, sum(child_proof
+                                         for child_proof, _ in numbers))
+            best = disproofs.index(proof)
+            if proof >= proof_limit or disproof >= disproof_limit:
+                break
+            second = min(disproofs[:best] + disproofs[best + 1:],
+                         default=INFINITY)
+            numbers[best] = self._search(
+                children[best][1], disproof_limit - disproof + numbers[best][0],
+                min(proof_limit, second + 1), depth + 1)[:2]
+        self.table[state.get_key()] = (proof, disproof)
+        return proof, disproof, children[best][0]
+
+
+def main(argv: List[str] = None) -> int:
+    """
+    Solve positions of the decision benchmark corpus from the command line.
+    """
+    # Imported here since decision_benchmark imports the strategies, which
+    # import this module.
+    from decision_benchmark import CORPUS, make_game
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--positions', default='stonehenge',
+                        help='only solve positions whose name contains this '
+                             '(default: %(default)s)')
+    parser.add_argument('--memory-budget', type=float, metavar='MIB',
+                        default=DEFAULT_TABLE_BYTES / 2 ** 20,
+                        help='MiB the table may use (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    print('{:<24} {:>6} {:>6} {:>10} {:>8} {:>11} {:>11} {:>7}'.format(
+        'position', 'result', 'move', 'nodes', 'seconds', 'table KiB',
+        'traced KiB', 'resizes'))
+    for name, game_key, parameter, p1_starts, moves in CORPUS:
+        if args.positions not in name:
+            continue
+        game = make_game(game_key, parameter, p1_starts, moves)
+        budget = MemoryBudget(int(args.memory_budget * 2 ** 20), trace=True)
+        solver = ProofNumberSearch(budget)
+        start = time.perf_counter()
+        score, move = solver.solve(game.current_state)
+        print('{:<24} {:>6} {:>6} {:>10} {:>8.2f} {:>11} {:>11} {:>7}'.format(
+            name, 'win' if score == game.current_state.WIN else 'loss',
+            str(move), solver.stats.nodes, time.perf_counter() - start,
+            budget.peak // 1024, budget.traced_peak // 1024,
+            solver.table.resizes))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,306 @@
+"""
+An index from positions to the recorded games that reached them.
+
+The indexer replays every game of a game record file, hashes each position
+it passes through to 64 bits, and writes an index file with one entry per
+distinct position, sorted by hash: how many games reached it, how many of
+them each player won, and where the offsets of those games in the record
+file start in the list of offsets that follows the entries. The index is
+memory-mapped rather than read, so a lookup is a binary search over the
+entries that loads only the pages it touches.
+
+Positions are sorted in runs of a fixed size that are merged from disk, so
+building the index of millions of games needs only as much memory as one
+run.
+
+Run on Stonehenge games, it is an opening explorer: it shows for every move
+from a position how often it was played and how the games went on.
+
+Usage:
+    python position_index.py games.idx --build games.rec
+    python position_index.py games.idx --side-length 3 --moves A B
+
+NOTE: You do not have to run python-ta on this file.
+"""
+import argparse
+import hashlib
+import heapq
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+from typing import Any, BinaryIO, Iterator, List, NamedTuple, Tuple
+from game_record import GameRecord, iter_games, read_game_at
+from game_state import GameState
+from stonehenge_state import StonehengeState
+
+MAGIC = b'SHPI'
+# The magic number, the number of entries and the number of offsets.
+HEADER = struct.Struct('<4sQQ')
+# The hash of a position, the index of the first offset of its games, and
+# the numbers of games that reached it, that p1 won and that p2 won.
+ENTRY = struct.Struct('<QQIII')
+OFFSET = struct.Struct('<Q')
+# The hash of a position, the offset of a game and who won it, as sorted in
+# a run.
+_POSTING = struct.Struct('<QQB')
+# Positions sorted in memory at a time while building an index.
+RUN_POSITIONS = 1000000
+
+
+class PositionStats(NamedTuple):
+    """
+    The recorded games that reached a position.
+
+    games - the number of games
+    p1_wins - the number of them p1 won
+    p2_wins - the number of them p2 won
+    offsets - the offset of each game in the record file
+    """
+    games: int
+    p1_wins: int
+    p2_wins: int
+    offsets: List[int]
+
+
+def position_hash(state: GameState) -> int:
+    """
+    Return a 64-bit hash of the position state, the same in every run and
+    on every platform, unlike hash().
+
+    >>> s1 = StonehengeState(True, 2)
+    >>> s2 = s1.make_move('A').make_move('F').make_move('D')
+    >>> s3 = s1.make_move('D').make_move('F').make_move('A')
+    >>> position_hash(s2) == position_hash(s3) != position_hash(s1)
+    True
+    """
+    return int.from_bytes(hashlib.blake2b(
+        repr(state.get_key()).encode(), digest_size=8).digest(), 'little')
+
+
+def replay(record: GameRecord) -> Iterator[GameState]:
+    """
+    Yield every state of the game of record, from its starting state to
+    the state after its last move.
+    """
+    state = record.start().current_state
+    yield state
+    for move in record.moves:
+        state = state.make_move(move)
+        yield state
+
+
+def _write_run(postings: List[Tuple[int, int, int]], directory: str,
+               runs: List[str]) -> None:
+    """
+    Sort postings and write them to a new run file in directory, adding its
+    path to runs.
+    """
+    postings.sort()
+    path = os.path.join(directory, 'run{:05d}'.format(len(runs)))
+    with open(path, 'wb') as run_file:
+        for posting in postings:
+            run_file.write(_POSTING.pack(*posting))
+    runs.append(path)
+    postings.clear()
+
+
+def _read_run(path: str) -> Iterator[Tuple[int, int, int]]:
+    """
+    Yield the postings in the run file at path, in order.
+    """
+    with open(path, 'rb') as run_file:
+        while True:
+            data = run_file.read(_POSTING.size)
+            if len(data) < _POSTING.size:
+                return
+            yield _POSTING.unpack(data)
+
+
+def build_index(record_path: str, index_path: str,
+                run_positions: int = RUN_POSITIONS) -> Tuple[int, int]:
+    """
+    Write the index of the positions of the games in the record file at
+    record_path to index_path, sorting run_positions positions in memory at
+    a time. Return the numbers of games and distinct positions indexed.
+    """
+    games = 0
+    entries = 0
+    with tempfile.TemporaryDirectory() as directory:
+        runs = []
+        postings = []
+        for offset, record in iter_games(record_path):
+            games += 1
+            for state in replay(record):
+                postings.append((position_hash(state), offset,
+                                 record.winner))
+                if len(postings) == run_positions:
+                    _write_run(postings, directory, runs)
+        if postings != []:
+            _write_run(postings, directory, runs)
+
+        offsets_path = os.path.join(directory, 'offsets')
+        with open(index_path, 'wb') as index_file, \
+                open(offsets_path, 'wb') as offsets_file:
+            index_file.write(HEADER.pack(MAGIC, 0, 0))
+            offsets = 0
+            current, first, wins, last_offset = None, 0, [0, 0, 0], None
+            for key, offset, winner in heapq.merge(
+                    *[_read_run(run) for run in runs]):
+                if key != current:
+                    if current is not None:
+                        index_file.write(ENTRY.pack(
+                            current, first, offsets - first, wins[1],
+                            wins[2]))
+                        entries += 1
+                    current, first, wins = key, offsets, [0, 0, 0]
+                elif offset == last_offset:
+                    # A game that passes through a position twice counts
+                    # once.
+                    continue
+                offsets_file.write(OFFSET.pack(offset))
+                offsets += 1
+                wins[winner] += 1
+                last_offset = offset
+            if current is not None:
+                index_file.write(ENTRY.pack(current, first, offsets - first,
+                                            wins[1], wins[2]))
+                entries += 1
+        with open(index_path, 'r+b') as index_file, \
+                open(offsets_path, 'rb') as offsets_file:
+            index_file.seek(0, os.SEEK_END)
+            shutil.copyfileobj(offsets_file, index_file)
+            index_file.seek(0)
+            index_file.write(HEADER.pack(MAGIC, entries, offsets))
+    return games, entries
+
+
+class PositionIndex:
+    """
+    A memory-mapped index of the positions of recorded games.
+
+    entries - the number of distinct positions indexed
+    """
+    entries: int
+
+    def __init__(self, data: Any, entries: int) -> None:
+        """
+        Initialize this index over data, an index file with entries
+        entries.
+        """
+        self._data = data
+        self.entries = entries
+        self._offsets_start = HEADER.size + entries * ENTRY.size
+
+    @classmethod
+    def load(cls, path: str) -> 'PositionIndex':
+        """
+        Return the index saved at path, memory-mapped rather than read.
+        """
+        with open(path, 'rb') as index_file:
+            data = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, entries, offsets = HEADER.unpack_from(data)
+        if magic != MAGIC or len(data) != HEADER.size + \
+                entries * ENTRY.size + offsets * OFFSET.size:
+            raise ValueError('{} is not a position index'.format(path))
+        return cls(data, entries)
+
+    def lookup(self, state: GameState) -> PositionStats:
+        """
+        Return the recorded games that reached state, found by a binary
+        search over the entries.
+        """
+        key = position_hash(state)
+        low, high = 0, self.entries
+        while low < high:
+            middle = (low + high) // 2
+            if ENTRY.unpack_from(self._data, HEADER.size +
+                                 middle * ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low == self.entries:
+            return PositionStats(0, 0, 0, [])
+        found, first, games, p1_wins, p2_wins = ENTRY.unpack_from(
+            self._data, HEADER.size + low * ENTRY.size)
+        if found != key:
+            return PositionStats(0, 0, 0, [])
+        start = self._offsets_start + first * OFFSET.size
+        offsets = [offset for offset, in OFFSET.iter_unpack(
+            self._data[start:start + games * OFFSET.size])]
+        return PositionStats(games, p1_wins, p2_wins, offsets)
+
+    def games(self, state: GameState,
+              record_file: BinaryIO) -> Iterator[GameRecord]:
+        """
+        Yield the games in the open record_file, the one this index was
+        built from, that reached state.
+        """
+        for offset in self.lookup(state).offsets:
+            yield read_game_at(record_file, offset)
+
+    def explore(self, state: GameState) -> List[Tuple[Any, PositionStats]]:
+        """
+        Return every move from state that recorded games played, with the
+        games that reached the state it leads to, most played first.
+        """
+        played = []
+        for move in state.get_possible_moves():
+            stats = self.lookup(state.make_move(move))
+            if stats.games > 0:
+                played.append((move, stats))
+        played.sort(key=lambda item: -item[1].games)
+        return played
+
+
+def main(argv: List[str] = None) -> int:
+    """
+    Build a position index, or explore the Stonehenge openings in one,
+    from the command line.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('index', help='the position index file')
+    parser.add_argument('--build', metavar='RECORDS',
+                        help='build the index from the game record file '
+                             'RECORDS')
+    parser.add_argument('--run-positions', type=int, default=RUN_POSITIONS,
+                        help='positions sorted in memory at a time when '
+                             'building (default: %(default)s)')
+    parser.add_argument('--side-length', type=int, default=3,
+                        help='side length of the board to explore (default: '
+                             '%(default)s)')
+    parser.add_argument('--p2-starts', action='store_true',
+                        help='explore games that p2 started')
+    parser.add_argument('--moves', nargs='*', default=[],
+                        help='moves played to the position to explore')
+    args = parser.parse_args(argv)
+
+    if args.build is not None:
+        games, entries = build_index(args.build, args.index,
+                                     args.run_positions)
+        print('Indexed {} distinct positions of {} games.'.format(
+            entries, games))
+        return 0
+    index = PositionIndex.load(args.index)
+    state = StonehengeState(not args.p2_starts, args.side_length)
+    for move in args.moves:
+        if not state.is_valid_move(move):
+            print('{} is not a move in this position.'.format(move))
+            return 1
+        state = state.make_move(move)
+    reached = index.lookup(state)
+    print('{} games reached this position: p1 won {}, p2 won {}.'.format(
+        reached.games, reached.p1_wins, reached.p2_wins))
+    mover = 'p1' if state.p1_turn else 'p2'
+    print('{:<6} {:>9} {:>9}'.format('move', 'games', mover + ' won'))
+    for move, stats in index.explore(state):
+        print('{:<6} {:>9} {:>8.1f}%'.format(
+            move, stats.games, 100 * (stats.p1_wins if state.p1_turn
+                                      else stats.p2_wins) / stats.games))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""
+Opt-in profiling of AI moves.
+
+Every profiled move is run under cProfile while a background thread samples
+the stack of the thread making the move. Two files are written per move:
+<tag>.prof, which can be read with pstats or snakeviz, and <tag>.collapsed,
+which holds one "frame;frame;frame count" line per distinct stack, the format
+read by flamegraph.pl, speedscope and inferno.
+
+NOTE: You do not have to run python-ta on this file.
+"""
+import cProfile
+import os
+import sys
+import threading
+from typing import Any, Callable, Dict
+
+# Setting this environment variable to a directory turns on profiling in
+# game_interface.py.
+PROFILE_ENV = 'STONEHENGE_PROFILE'
+DEFAULT_INTERVAL = 0.001
+
+
+class StackSampler:
+    """
+    A sampling profiler for one thread.
+
+    counts - number of samples seen of each collapsed stack
+    interval - seconds between samples
+    """
+    counts: Dict[str, int]
+    interval: float
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL) -> None:
+        """
+        Initialize this sampler to take a sample every interval seconds of
+        the thread that calls start().
+        """
+        self.counts = {}
+        self.interval = interval
+        self._thread_id = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        """
+        Start sampling the calling thread.
+        """
+        self._thread_id = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop sampling.
+        """
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        """
+        Take samples until stop() is called.
+        """
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append('{}:{}'.format(
+                    os.path.basename(code.co_filename), code.co_name))
+                frame = frame.f_back
+            if names:
+                stack = ';'.join(reversed(names))
+                self.counts[stack] = self.counts.get(stack, 0) + 1
+
+    def write_collapsed(self, path: str) -> None:
+        """
+        Write the samples taken to path in the collapsed stack format.
+        """
+        with open(path, 'w') as file:
+            for stack, count in sorted(self.counts.items()):
+                file.write('{} {}\n'.format(stack, count))
+
+
+class MoveProfiler:
+    """
+    Writes a profile and a collapsed stack file for each move it runs.
+
+    directory - the directory the files are written to
+    interval - seconds between stack samples
+    """
+    directory: str
+    interval: float
+
+    def __init__(self, directory: str,
+                 interval: float = DEFAULT_INTERVAL) -> None:
+        """
+        Initialize this profiler to write its files to directory, which is
+        created if it does not exist.
+        """
+        self.directory = directory
+        self.interval = interval
+        os.makedirs(directory, exist_ok=True)
+
+    def run(self, tag: str, function: Callable, *args: Any,
+            **kwargs: Any) -> Any:
+        """
+        Return function(*args, **kwargs), writing the profile of the call to
+        the files <tag>.prof and <tag>.collapsed in this profiler's directory.
+        """
+        profile = cProfile.Profile()
+        sampler = StackSampler(self.interval)
+        sampler.start()
+        try:
+            result = profile.runcall(function, *args, **kwargs)
+        finally:
+            sampler.stop()
+        path = os.path.join(self.directory, tag)
+        profile.dump_stats(path + '.prof')
+        sampler.write_collapsed(path + '.collapsed')
+        return result
+
+
+def move_tag(game: Any, move_number: int, strategy: Callable) -> str:
+    """
+    Return the name to give to the profile of move number move_number being
+    chosen by strategy in game.
+
+    >>> from subtract_square_game import SubtractSquareGame
+    >>> from stonehenge_game import StonehengeGame
+    >>> def my_strategy(game):
+    ...     return None
+    >>> move_tag(StonehengeGame(True, 3), 4, my_strategy)
+    'StonehengeGame-side3-move004-my_strategy'
+    >>> move_tag(SubtractSquareGame(True, 20), 1, my_strategy)
+    'SubtractSquareGame-move001-my_strategy'
+    """
+    parts = [type(game).__name__]
+    if hasattr(game, 'side_length'):
+        parts.append('side{}'.format(game.side_length))
+    parts.append('move{:03d}'.format(move_number))
+    parts.append(strategy.__name__)
+    return '-'.join(parts)
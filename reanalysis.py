@@ -0,0 +1,283 @@
+"""
+Parallel re-analysis of recorded games.
+
+Replays the Stonehenge and SubtractSquare games of game record files and
+scores every position in them with a chosen strategy, across a pool of
+worker processes. A move that scores at least a given amount lower for the
+player who made it than the move the strategy would have made is flagged as
+a blunder, and every game is written to an annotated output file with one
+JSON object per line.
+
+The score and best move of every position are kept in an SQLite database
+under the name of the engine that analysed them, so each position is
+searched only once across runs: a repeated run only searches the positions
+of new games, or every position again under a new --engine name after the
+engine has changed.
+
+Usage:
+    python reanalysis.py games.rec --strategy mf --output annotated.jsonl
+    python reanalysis.py games.rec --strategy sl --seconds 0.5 --engine sl-v2
+
+NOTE: You do not have to run python-ta on this file.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+from multiprocessing import Pool
+from typing import Any, Dict, Iterator, List, TextIO, Tuple, Union
+from game_interface import worker_strategies
+from game_record import GAME_FORMATS, GameRecord, iter_games
+from game_state import GameState
+from position_index import position_hash, replay
+from search_stats import accepts_option, choose_move
+
+# The least loss of score for the player who moved that makes a move a
+# blunder.
+BLUNDER_LOSS = 0.5
+# Games replayed and analysed together before their results are saved.
+BATCH_GAMES = 64
+# The database the results are kept in when no other is given.
+DEFAULT_CACHE_PATH = 'reanalysis.sqlite'
+
+# The strategy of a worker process and the options it is called with.
+_WORKER = {}
+
+
+class AnalysisCache:
+    """
+    A persistent store of the score and best move of positions, by the
+    engine that analysed them and the position_hash() of the position.
+
+    path - the path of the SQLite database
+    """
+    path: str
+
+    def __init__(self, path: str) -> None:
+        """
+        Initialize this cache with the database at path, which is created if
+        it does not exist.
+        """
+        self.path = path
+        self._connection = sqlite3.connect(path)
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS positions (engine TEXT, hash INTEGER,'
+            ' score REAL, move TEXT, PRIMARY KEY (engine, hash))')
+
+    def get(self, engine: str,
+            key: int) -> Union[Tuple[float, Any], None]:
+        """
+        Return the score and best move of the position with hash key as
+        analysed by engine, or None if it has not been.
+        """
+        row = self._connection.execute(
+            'SELECT score, move FROM positions WHERE engine = ? AND hash = ?',
+            (engine, _signed(key))).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def put(self, engine: str, results: List[Tuple[int, float, Any]]) -> None:
+        """
+        Store the hash, score and best move of every position in results as
+        analysed by engine, and save them to disk.
+        """
+        self._connection.executemany(
+            'INSERT OR REPLACE INTO positions VALUES (?, ?, ?, ?)',
+            [(engine, _signed(key), score, json.dumps(move))
+             for key, score, move in results])
+        self._connection.commit()
+
+    def close(self) -> None:
+        """
+        Close the database.
+        """
+        self._connection.close()
+
+
+def _signed(key: int) -> int:
+    """
+    Return the unsigned 64-bit key as the signed integer SQLite stores.
+
+    >>> _signed(5), _signed(2 ** 64 - 1)
+    (5, -1)
+    """
+    return key - (1 << 64) if key >= 1 << 63 else key
+
+
+def _start_worker(strategy_key: str, seconds: Union[float, None]) -> None:
+    """
+    Set up a worker process to analyse with the worker strategy named by
+    strategy_key, given seconds for every search if it takes them.
+    """
+    _WORKER['strategy'] = worker_strategies[strategy_key]
+    _WORKER['options'] = {}
+    if seconds is not None and accepts_option(_WORKER['strategy'],
+                                              'seconds'):
+        _WORKER['options']['seconds'] = seconds
+
+
+def _analyse(task: Tuple[int, str, Tuple[int, ...], bool, GameState]) \
+        -> Tuple[int, float, Any]:
+    """
+    Return the hash of the position of task, a state with the key,
+    parameters and first player of its game, with the score the strategy of
+    this worker gives it for the player whose turn it is and the move it
+    would make.
+    """
+    key, game_key, parameters, p1_starts, state = task
+    game = GAME_FORMATS[game_key].start(p1_starts, parameters)
+    game.current_state = state
+    move, stats = choose_move(_WORKER['strategy'], game,
+                              **_WORKER['options'])
+    if stats.score is None:
+        raise ValueError('{} reports no score'.format(
+            _WORKER['strategy'].__name__))
+    return key, float(stats.score), move
+
+
+def annotate(record: GameRecord, states: List[GameState],
+             results: Dict[int, Tuple[float, Any]],
+             threshold: float = BLUNDER_LOSS) -> Dict[str, Any]:
+    """
+    Return the annotation of the game of record, whose states are states,
+    from the score and best move of each of its positions in results, by
+    position_hash(). The game is over in a position with no moves, which is
+    lost for the player whose turn it is.
+    """
+    moves = []
+    blunders = {'p1': 0, 'p2': 0}
+    for move, before, after in zip(record.moves, states, states[1:]):
+        best_score, best_move = results[position_hash(before)]
+        if after.get_possible_moves() == []:
+            score = float(-after.LOSE)
+        else:
+            score = -results[position_hash(after)][0]
+        loss = max(0.0, best_score - score)
+        player = before.get_current_player_name()
+        blunder = loss >= threshold
+        if blunder:
+            blunders[player] += 1
+        moves.append({'player': player, 'move': move, 'score': score,
+                      'best_move': best_move, 'best_score': best_score,
+                      'loss': round(loss, 6), 'blunder': blunder})
+    return {'game': record.game, 'parameters': list(record.parameters),
+            'p1_starts': record.p1_starts, 'winner': record.winner,
+            'moves': moves, 'blunders': blunders}
+
+
+def _batches(paths: List[str], size: int) \
+        -> Iterator[List[Tuple[str, int, GameRecord]]]:
+    """
+    Yield the path, offset and record of every game in the record files at
+    paths, size games at a time.
+    """
+    batch = []
+    for path in paths:
+        for offset, record in iter_games(path):
+            batch.append((path, offset, record))
+            if len(batch) == size:
+                yield batch
+                batch = []
+    if batch != []:
+        yield batch
+
+
+def reanalyse(paths: List[str], output: TextIO, cache: AnalysisCache,
+              engine: str, pool: Any, threshold: float = BLUNDER_LOSS,
+              batch_games: int = BATCH_GAMES) -> Dict[str, int]:
+    """
+    Write the annotation of every game in the record files at paths to
+    output as a line of JSON, analysing the positions not yet in cache for
+    engine with the workers of pool, batch_games games at a time. Return
+    the numbers of games, moves, distinct positions searched and found in
+    cache in each batch, and blunders of each player.
+    """
+    totals = {'games': 0, 'moves': 0, 'searched': 0, 'cached': 0, 'p1': 0,
+              'p2': 0}
+    for batch in _batches(paths, batch_games):
+        games = [(path, offset, record, list(replay(record)))
+                 for path, offset, record in batch]
+        results = {}
+        tasks = []
+        for _, _, record, states in games:
+            for state in states:
+                key = position_hash(state)
+                if key in results or state.get_possible_moves() == []:
+                    continue
+                results[key] = cache.get(engine, key)
+                if results[key] is None:
+                    tasks.append((key, record.game, record.parameters,
+                                  record.p1_starts, state))
+                else:
+                    totals['cached'] += 1
+        searched = list(pool.imap_unordered(_analyse, tasks))
+        cache.put(engine, searched)
+        for key, score, move in searched:
+            results[key] = score, move
+        for path, offset, record, states in games:
+            annotation = annotate(record, states, results, threshold)
+            annotation['path'], annotation['offset'] = path, offset
+            output.write(json.dumps(annotation) + '\n')
+            totals['games'] += 1
+            totals['moves'] += len(record.moves)
+            totals['p1'] += annotation['blunders']['p1']
+            totals['p2'] += annotation['blunders']['p2']
+        totals['searched'] += len(searched)
+    return totals
+
+
+def main(argv: List[str] = None) -> int:
+    """
+    Re-analyse recorded games from the command line.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('paths', nargs='+', metavar='FILE',
+                        help='game record files to re-analyse')
+    parser.add_argument('--strategy', default='mf',
+                        choices=sorted(worker_strategies),
+                        help='key of the usable strategy to analyse with, '
+                             'other than i and pm (default: %(default)s)')
+    parser.add_argument('--seconds', type=float,
+                        help='time for each search of a strategy that '
+                             'searches under a clock')
+    parser.add_argument('--engine',
+                        help='name the results are cached under (default: '
+                             'the strategy key and seconds)')
+    parser.add_argument('--threshold', type=float, default=BLUNDER_LOSS,
+                        help='least loss of score that is a blunder '
+                             '(default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='number of worker processes (default: '
+                             '%(default)s)')
+    parser.add_argument('--cache', default=DEFAULT_CACHE_PATH,
+                        help='SQLite database of results (default: '
+                             '%(default)s)')
+    parser.add_argument('--output', default='annotated.jsonl',
+                        help='file to write the annotated games to (default: '
+                             '%(default)s)')
+    args = parser.parse_args(argv)
+
+    engine = args.engine
+    if engine is None:
+        engine = args.strategy if args.seconds is None else \
+            '{}/{}'.format(args.strategy, args.seconds)
+    cache = AnalysisCache(args.cache)
+    try:
+        with Pool(args.workers, _start_worker,
+                  (args.strategy, args.seconds)) as pool, \
+                open(args.output, 'w') as output:
+            totals = reanalyse(args.paths, output, cache, engine, pool,
+                               args.threshold)
+    finally:
+        cache.close()
+    print('{} games, {} moves: {} positions searched, {} from the cache.'
+          .format(totals['games'], totals['moves'], totals['searched'],
+                  totals['cached']))
+    print('Blunders: p1 {}, p2 {}.'.format(totals['p1'], totals['p2']))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
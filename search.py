@@ -0,0 +1,433 @@
+"""
+Search routines shared by the strategies and the analysis tools.
+
+Every routine here works on any GameState, using only get_possible_moves,
+make_move and get_key. A state without possible moves is over, and since the
+player who made the last move is the one who ended the game, it is scored as
+LOSE for the player whose turn it is.
+"""
+from typing import Any, Dict, Hashable, Tuple, Union
+from game_state import GameState
+from memory_budget import MemoryBudget, deep_size
+from search_stats import SearchStats
+from tracing import Tracer
+
+# More moves than any game played here lasts. A distance-aware score is WIN
+# or LOSE times LONGEST_GAME less the moves left in the game.
+LONGEST_GAME = 10 ** 6
+
+
+class TranspositionTable:
+    """
+    A table from state keys to search results that stays within a memory
+    budget by evicting its oldest entries.
+
+    budget - the budget the entries are charged to, if any
+    tracer - the tracer resizes are recorded in, if any
+    share - the most bytes of the budget the entries may use
+    resizes - number of times entries were evicted
+    """
+    budget: Union[MemoryBudget, None]
+    tracer: Union[Tracer, None]
+    share: Union[int, None]
+    resizes: int
+
+    def __init__(self, budget: MemoryBudget = None, tracer: Tracer = None,
+                 share: int = None) -> None:
+        """
+        Initialize this empty table, charging its entries to budget, of which
+        they may use share bytes (by default, all of it).
+        """
+        self.budget = budget
+        self.tracer = tracer
+        self.share = share
+        if share is None and budget is not None:
+            self.share = budget.limit
+        self.resizes = 0
+        self._entries = {}
+        self._entry_bytes = 0
+
+    def __len__(self) -> int:
+        """
+        Return the number of entries in this table.
+        """
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        """
+        Return whether this table has an entry for key.
+        """
+        return key in self._entries
+
+    def __getitem__(self, key: Hashable) -> Any:
+        """
+        Return the entry for key.
+        """
+        return self._entries[key]
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Return the entry for key, or default if there is none.
+        """
+        return self._entries.get(key, default)
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        """
+        Store value as the entry for key, evicting old entries if the budget
+        is exceeded while the entries use more than their share of it.
+        """
+        if key not in self._entries and self.budget is not None:
+            if self._entry_bytes == 0:
+                # Entries of one search all have keys and values of the same
+                # shape, so the first one is measured for all of them.
+                self._entry_bytes = deep_size((key, value)) + 2 * 8
+            self.budget.charge('table', self._entry_bytes)
+        self._entries[key] = value
+        if self.budget is not None and self.budget.exceeded and \
+                len(self._entries) * self._entry_bytes > self.share:
+            self.shrink()
+
+    def shrink(self) -> None:
+        """
+        Evict the oldest half of the entries of this table.
+        """
+        evicted = (len(self._entries) + 1) // 2
+        for key in list(self._entries)[:evicted]:
+            del self._entries[key]
+        if self.budget is not None:
+            self.budget.release('table', evicted * self._entry_bytes)
+        self.resizes += 1
+        if self.tracer is not None:
+            self.tracer.instant('TT resize', entries=len(self._entries))
+
+
+def exact_value(state: GameState,
+                cache: Union[Dict[Hashable, int], TranspositionTable] = None,
+                stats: SearchStats = None, depth: int = 0) -> int:
+    """
+    Return the exact minimax score of state (WIN, LOSE or DRAW) for the
+    player whose turn it is.
+
+    The scores of states already solved are kept in cache (a dictionary or a
+    TranspositionTable), keyed by get_key(), so that they can be reused by
+    later calls. If stats is given, the search is recorded in it as starting
+    depth plies below its root.
+
+    >>> from subtract_square_state import SubtractSquareState
+    >>> exact_value(SubtractSquareState(True, 18))
+    1
+    >>> exact_value(SubtractSquareState(True, 2))
+    -1
+    """
+    if cache is None:
+        cache = {}
+    if stats is None:
+        stats = SearchStats()
+    stats.visit(depth)
+    stats.tt_probes += 1
+    key = state.get_key()
+    if key in cache:
+        stats.tt_hits += 1
+        return cache[key]
+    score = state.LOSE
+    is_leaf = True
+    decided = state.decided_score()
+    if decided is not None:
+        stats.leaf_evaluations += 1
+        cache[key] = decided
+        return decided
+    for move in state.iter_distinct_moves():
+        is_leaf = False
+        stats.make_move_calls += 1
+        score = max(score, -exact_value(state.make_move(move), cache, stats,
+                                        depth + 1))
+        if score == state.WIN:
+            stats.cutoffs += 1
+            break
+    if is_leaf:
+        stats.leaf_evaluations += 1
+    cache[key] = score
+    return score
+
+
+def bounded_value(state: GameState, alpha: int, beta: int,
+                  table: Union[Dict[Hashable, Tuple[int, int]],
+                               TranspositionTable],
+                  stats: SearchStats = None, depth: int = 0) -> int:
+    """
+    Return the minimax score of state for the player whose turn it is if it
+    is strictly between alpha and beta, or else a score at most alpha that
+    is at least the minimax score, or at least beta that is at most it.
+
+    The bounds on the scores of states searched are kept in table as
+    (lower, upper) pairs, keyed by get_key(), so that later searches with
+    other windows can reuse them. If stats is given, the search is recorded
+    in it as starting depth plies below its root.
+
+    >>> from subtract_square_state import SubtractSquareState
+    >>> bounded_value(SubtractSquareState(True, 18), -1, 0, {})
+    1
+    """
+    if stats is None:
+        stats = SearchStats()
+    stats.visit(depth)
+    stats.tt_probes += 1
+    key = state.get_key()
+    lower, upper = state.LOSE, state.WIN
+    if key in table:
+        stats.tt_hits += 1
+        lower, upper = table[key]
+        if lower >= beta:
+            return lower
+        if upper <= alpha:
+            return upper
+        alpha, beta = max(alpha, lower), min(beta, upper)
+    decided = state.decided_score()
+    if decided is not None:
+        stats.leaf_evaluations += 1
+        table[key] = (decided, decided)
+        return decided
+    score = state.LOSE
+    is_leaf = True
+    best = alpha
+    for move in state.iter_distinct_moves():
+        is_leaf = False
+        stats.make_move_calls += 1
+        score = max(score, -bounded_value(state.make_move(move), -beta, -best,
+                                          table, stats, depth + 1))
+        best = max(best, score)
+        if score >= beta:
+            stats.cutoffs += 1
+            break
+    if is_leaf:
+        stats.leaf_evaluations += 1
+        table[key] = (score, score)
+    elif score <= alpha:
+        table[key] = (lower, score)
+    elif score >= beta:
+        table[key] = (score, upper)
+    else:
+        table[key] = (score, score)
+    return score
+
+
+def distance_score(score: int, plies: int) -> int:
+    """
+    Return the distance-aware score of a state whose exact score is score
+    (WIN, LOSE or DRAW) and whose game ends plies moves later. Wins score
+    higher the sooner they come, and losses the later.
+
+    >>> distance_score(1, 3) > distance_score(1, 5) > 0
+    True
+    >>> 0 > distance_score(-1, 5) > distance_score(-1, 3)
+    True
+    """
+    return score * (LONGEST_GAME - plies)
+
+
+def plies_to_end(score: int) -> int:
+    """
+    Return the number of moves left in the game of a state whose
+    distance-aware score is score, or 0 for a DRAW.
+
+    >>> plies_to_end(distance_score(-1, 4))
+    4
+    """
+    return 0 if score == 0 else LONGEST_GAME - abs(score)
+
+
+def _one_ply_earlier(score: int) -> int:
+    """
+    Return distance-aware score score, which is the same for both players
+    up to its sign, counted from one move further from the end of the game.
+    """
+    if score > 0:
+        return score - 1
+    if score < 0:
+        return score + 1
+    return 0
+
+
+def _one_ply_later(score: int) -> int:
+    """
+    Return the score that, counted from one move nearer the end of the
+    game, must be beaten to beat distance-aware score score.
+    """
+    if score > 0:
+        return score + 1
+    if score < 0:
+        return score - 1
+    return 0
+
+
+def distance_value(state: GameState, alpha: int = -LONGEST_GAME,
+                   beta: int = LONGEST_GAME,
+                   table: Union[Dict[Hashable, Tuple[int, int]],
+                                TranspositionTable] = None,
+                   stats: SearchStats = None, depth: int = 0) -> int:
+    """
+    Return the distance-aware score of state for the player whose turn it
+    is, by alpha-beta search bounded like bounded_value, with the bounds of
+    states searched kept in table.
+
+    The scores of a state do not depend on how it was reached, so table can
+    be shared between searches. A state with moves is won at the soonest
+    with its move, and lost at the soonest after the reply, so windows that
+    only a sooner win or a later loss would fall in are cut off without
+    search: once a win is found, no line longer than it is searched.
+
+    >>> from subtract_square_state import SubtractSquareState
+    >>> plies_to_end(distance_value(SubtractSquareState(True, 18)))
+    3
+    """
+    if table is None:
+        table = {}
+    if stats is None:
+        stats = SearchStats()
+    stats.visit(depth)
+    beta = min(beta, distance_score(state.WIN, 1))
+    if alpha >= beta:
+        stats.cutoffs += 1
+        return beta
+    stats.tt_probes += 1
+    key = state.get_key()
+    lower, upper = -LONGEST_GAME, LONGEST_GAME
+    if key in table:
+        stats.tt_hits += 1
+        lower, upper = table[key]
+        if lower >= beta:
+            return lower
+        if upper <= alpha:
+            return upper
+        alpha, beta = max(alpha, lower), min(beta, upper)
+    if state.winning_moves() != []:
+        stats.leaf_evaluations += 1
+        table[key] = (distance_score(state.WIN, 1),) * 2
+        return distance_score(state.WIN, 1)
+    moves = list(state.iter_distinct_moves())
+    if moves == []:
+        stats.leaf_evaluations += 1
+        table[key] = (distance_score(state.LOSE, 0),) * 2
+        return distance_score(state.LOSE, 0)
+    alpha = max(alpha, distance_score(state.LOSE, 2))
+    if alpha >= beta:
+        stats.cutoffs += 1
+        return alpha
+    score = -LONGEST_GAME
+    best = alpha
+    for move in moves:
+        stats.make_move_calls += 1
+        score = max(score, _one_ply_earlier(-distance_value(
+            state.make_move(move), -_one_ply_later(beta),
+            -_one_ply_later(best), table, stats, depth + 1)))
+        best = max(best, score)
+        if score >= beta:
+            stats.cutoffs += 1
+            break
+    if score <= alpha:
+        table[key] = (lower, score)
+    elif score >= beta:
+        table[key] = (score, upper)
+    else:
+        table[key] = (score, score)
+    return score
+
+
+def fastest_move(state: GameState,
+                 table: Union[Dict[Hashable, Tuple[int, int]],
+                              TranspositionTable] = None,
+                 stats: SearchStats = None) -> Tuple[int, Any]:
+    """
+    Return the distance-aware score of state for the player whose turn it
+    is, and the first of its distinct moves that gets it: the move that wins
+    soonest, or else loses latest. The move is None if state has no moves.
+
+    >>> from subtract_square_state import SubtractSquareState
+    >>> score, move = fastest_move(SubtractSquareState(True, 18))
+    >>> plies_to_end(score), move
+    (3, 16)
+    """
+    if table is None:
+        table = {}
+    if stats is None:
+        stats = SearchStats()
+    stats.visit(0)
+    best_score, best_move = distance_score(state.LOSE, 0), None
+    for move in state.iter_distinct_moves():
+        stats.make_move_calls += 1
+        score = _one_ply_earlier(-distance_value(
+            state.make_move(move), -LONGEST_GAME,
+            -_one_ply_later(best_score), table, stats, 1))
+        if best_move is None or score > best_score:
+            best_score, best_move = score, move
+    stats.end_iteration()
+    return best_score, best_move
+
+
+def mtdf(state: GameState,
+         table: Union[Dict[Hashable, Tuple[int, int]],
+                      TranspositionTable] = None,
+         stats: SearchStats = None, guess: int = 0) -> Tuple[int, Any]:
+    """
+    Return the exact minimax score of state for the player whose turn it is,
+    and the first of its distinct moves that gets it, or None if state has
+    no moves.
+
+    The score is closed in on by zero-window calls of bounded_value,
+    starting from guess, which share the bounds kept in table. Each call is
+    recorded in stats as an iteration, if stats is given.
+
+    >>> from subtract_square_state import SubtractSquareState
+    >>> mtdf(SubtractSquareState(True, 18))
+    (1, 1)
+    >>> mtdf(SubtractSquareState(True, 20))
+    (-1, 1)
+    """
+    if table is None:
+        table = {}
+    if stats is None:
+        stats = SearchStats()
+    score = guess
+    lower, upper = state.LOSE, state.WIN
+    while lower < upper:
+        beta = score + 1 if score == lower else score
+        score = bounded_value(state, beta - 1, beta, table, stats)
+        if score < beta:
+            upper = score
+        else:
+            lower = score
+        stats.end_iteration()
+    # The first move whose state scores at most -score for the opponent is
+    # the first move that gets score.
+    for move in state.iter_distinct_moves():
+        stats.make_move_calls += 1
+        if bounded_value(state.make_move(move), -score, 1 - score, table,
+                         stats, 1) <= -score:
+            return score, move
+    return score, None
+
+
+def exact_move_values(state: GameState,
+                      cache: Dict[Hashable, int] = None) -> Dict[Any, int]:
+    """
+    Return a dictionary mapping each possible move from state to the exact
+    score that the player whose turn it is gets by making it. One move of
+    each class of equivalent moves is searched.
+
+    >>> from subtract_square_state import SubtractSquareState
+    >>> exact_move_values(SubtractSquareState(True, 18))
+    {1: 1, 4: -1, 9: -1, 16: 1}
+    """
+    if cache is None:
+        cache = {}
+    values = {}
+    for moves in state.get_move_classes():
+        score = -exact_value(state.make_move(moves[0]), cache)
+        for move in moves:
+            values[move] = score
+    return {move: values[move] for move in state.get_possible_moves()}
+
+
+if __name__ == "__main__":
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
@@ -0,0 +1,182 @@
+"""
+Statistics about what a strategy did while choosing a move.
+
+NOTE: You do not have to run python-ta on this file.
+"""
+import inspect
+import time
+from typing import Any, Callable, Dict, List, Tuple, Union
+
+
+class SearchStats:
+    """
+    Counters filled in by a strategy while it searches for a move.
+
+    nodes - number of states visited
+    leaf_evaluations - number of states scored without searching further
+    make_move_calls - number of calls to make_move
+    max_depth - deepest ply below the current state that was visited
+    tt_probes - number of transposition table lookups
+    tt_hits - number of transposition table lookups that found an entry
+    cutoffs - number of times the rest of a state's moves were skipped
+    iteration_times - seconds taken by each iteration of the search
+    memory_peak - highest number of bytes used by the search, if measured
+    score - score of the move chosen for the player whose turn it is, if
+            the search found one
+    """
+    nodes: int
+    leaf_evaluations: int
+    make_move_calls: int
+    max_depth: int
+    tt_probes: int
+    tt_hits: int
+    cutoffs: int
+    iteration_times: List[float]
+    memory_peak: int
+    score: Union[float, None]
+
+    def __init__(self) -> None:
+        """
+        Initialize these statistics with all counters at zero, and start
+        timing the first iteration.
+        """
+        self.nodes = 0
+        self.leaf_evaluations = 0
+        self.make_move_calls = 0
+        self.max_depth = 0
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.cutoffs = 0
+        self.iteration_times = []
+        self.memory_peak = 0
+        self.score = None
+        self._iteration_start = time.perf_counter()
+
+    def visit(self, depth: int) -> None:
+        """
+        Record a visit to a state depth plies below the current state.
+        """
+        self.nodes += 1
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def end_iteration(self) -> None:
+        """
+        Record the time taken by the iteration that just finished, and start
+        timing the next one.
+        """
+        now = time.perf_counter()
+        self.iteration_times.append(now - self._iteration_start)
+        self._iteration_start = now
+
+    def merge(self, other: 'SearchStats') -> None:
+        """
+        Add the counters of other, the statistics of a search run for this
+        one by another worker, to these statistics.
+        """
+        self.nodes += other.nodes
+        self.leaf_evaluations += other.leaf_evaluations
+        self.make_move_calls += other.make_move_calls
+        self.max_depth = max(self.max_depth, other.max_depth)
+        self.tt_probes += other.tt_probes
+        self.tt_hits += other.tt_hits
+        self.cutoffs += other.cutoffs
+
+    @property
+    def effective_branching_factor(self) -> float:
+        """
+        Return the branching factor of a uniform tree as deep as max_depth
+        with as many nodes as were visited.
+
+        >>> stats = SearchStats()
+        >>> stats.nodes, stats.max_depth = 1 + 3 + 9, 2
+        >>> round(stats.effective_branching_factor, 2)
+        3.61
+        """
+        if self.max_depth == 0:
+            return 0.0
+        return self.nodes ** (1 / self.max_depth)
+
+    @property
+    def seconds(self) -> float:
+        """
+        Return the total time of the iterations finished so far.
+        """
+        return sum(self.iteration_times)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """
+        Return these statistics as a dictionary.
+        """
+        return {'nodes': self.nodes,
+                'leaf_evaluations': self.leaf_evaluations,
+                'make_move_calls': self.make_move_calls,
+                'max_depth': self.max_depth,
+                'tt_probes': self.tt_probes,
+                'tt_hits': self.tt_hits,
+                'cutoffs': self.cutoffs,
+                'effective_branching_factor':
+                    self.effective_branching_factor,
+                'iteration_times': self.iteration_times[:],
+                'memory_peak': self.memory_peak,
+                'score': self.score}
+
+    def __str__(self) -> str:
+        """
+        Return a one-line summary of these statistics.
+
+        >>> print(SearchStats())
+        nodes: 0, leaves: 0, make_move: 0, depth: 0, tt: 0/0, cutoffs: 0, \
+ebf: 0.00, iterations: 0 in 0.000s
+        """
+        summary = ('nodes: {}, leaves: {}, make_move: {}, depth: {}, '
+                   'tt: {}/{}, cutoffs: {}, ebf: {:.2f}, iterations: {} in '
+                   '{:.3f}s').format(
+                       self.nodes, self.leaf_evaluations, self.make_move_calls,
+                       self.max_depth, self.tt_hits, self.tt_probes,
+                       self.cutoffs, self.effective_branching_factor,
+                       len(self.iteration_times), self.seconds)
+        if self.memory_peak:
+            summary += ', memory: {} KiB'.format(self.memory_peak // 1024)
+        return summary
+
+
+def accepts_option(strategy: Callable, name: str) -> bool:
+    """
+    Return whether strategy takes an argument called name.
+
+    >>> accepts_option(lambda game, budget=None: None, 'budget')
+    True
+    >>> accepts_option(lambda game: None, 'budget')
+    False
+    """
+    return name in inspect.signature(strategy).parameters
+
+
+def accepts_stats(strategy: Callable) -> bool:
+    """
+    Return whether strategy takes a stats argument to fill in.
+
+    >>> accepts_stats(lambda game, stats=None: None)
+    True
+    >>> accepts_stats(lambda game: None)
+    False
+    """
+    return accepts_option(strategy, 'stats')
+
+
+def choose_move(strategy: Callable, game: Any,
+                **options: Any) -> Tuple[Any, SearchStats]:
+    """
+    Return the move strategy chooses for game, along with the statistics of
+    its search. Strategies that do not report statistics get statistics with
+    only the time filled in. Any options are passed on to strategy.
+    """
+    stats = SearchStats()
+    if accepts_stats(strategy):
+        move = strategy(game, stats=stats, **options)
+    else:
+        move = strategy(game, **options)
+    if stats.iteration_times == []:
+        stats.end_iteration()
+    return move, stats
@@ -0,0 +1,734 @@
+"""
+Unittests for the search tools shared by the strategies.
+"""
+import gzip
+import io
+import json
+import os
+import random
+import tempfile
+import time
+import unittest
+from multiprocessing import Pool
+
+from evaluation_tuning import agreement, sample_positions
+from game_interface import (playable_games, usable_strategies,
+                            worker_strategies)
+from game_record import GameRecordWriter, read_games, start_record
+import learned_evaluation
+from learned_evaluation import LinearEvaluation, features, train
+from search import (distance_score, exact_move_values, exact_value,
+                    fastest_move, mtdf)
+from search_stats import SearchStats, accepts_option, choose_move
+from selective_search import DepthLimitedSearch
+from self_play import (ShardWriter, play_game, read_shard, record_state,
+                       run_worker)
+from tracing import Tracer
+from memory_budget import MemoryBudget
+from pn_search import ProofNumberSearch
+from position_index import PositionIndex, build_index
+from reanalysis import AnalysisCache, _start_worker, reanalyse
+from search import TranspositionTable
+from subtract_square_solver import SubtractSquareTable, grundy_value
+import stonehenge_batch
+from stonehenge_batch import StonehengeBatch, cell_index, child_rough_outcomes
+from stonehenge_state import StonehengeState, check_state
+from strategy import TABLE_SHARE
+
+StonehengeGame = playable_games['h']
+SubtractSquareGame = playable_games['s']
+MultiSubtractSquareGame = playable_games['m']
+
+
+class SearchStatsUnitTests(unittest.TestCase):
+    def test_minimax_fills_in_stats(self):
+        """
+        Test that both minimax strategies count the same search tree.
+        """
+        counts = []
+        for key in ['mr', 'mi']:
+            game = StonehengeGame(True, 2)
+            for move in ['A', 'F']:
+                game.current_state = game.current_state.make_move(move)
+            move, stats = choose_move(usable_strategies[key], game)
+            self.assertEqual(move, 'B')
+            self.assertEqual(stats.make_move_calls, stats.nodes - 1)
+            self.assertEqual(len(stats.iteration_times), 1)
+            counts.append((stats.nodes, stats.leaf_evaluations,
+                           stats.max_depth))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_strategy_without_stats(self):
+        """
+        Test that a strategy that does not report statistics still gets
+        timed.
+        """
+        game = SubtractSquareGame(True, 4)
+        move, stats = choose_move(lambda game: 4, game)
+        self.assertEqual(move, 4)
+        self.assertEqual(stats.nodes, 0)
+        self.assertEqual(len(stats.iteration_times), 1)
+
+    def test_stats_default(self):
+        """
+        Test that strategies can still be called without stats.
+        """
+        game = StonehengeGame(True, 2)
+        for move in ['A', 'F', 'D']:
+            game.current_state = game.current_state.make_move(move)
+        self.assertEqual(usable_strategies['mr'](game), 'E')
+        self.assertIsInstance(SearchStats().effective_branching_factor,
+                              float)
+
+
+class ExactSolverUnitTests(unittest.TestCase):
+    def test_exact_move_values_stonehenge(self):
+        """
+        Test the exact solver on a Stonehenge state with one winning move.
+        """
+        game = StonehengeGame(True, 2)
+        for move in ['A', 'F', 'D']:
+            game.current_state = game.current_state.make_move(move)
+        values = exact_move_values(game.current_state)
+        self.assertEqual([move for move in values if values[move] == 1],
+                         ['E'])
+
+    def test_equivalent_moves_score_alike(self):
+        """
+        Test that every move of a class of equivalent moves has the same
+        exact score, along random games.
+        """
+        rng = random.Random(4)
+        cache = {}
+        for _ in range(20):
+            state = StonehengeState(rng.random() < 0.5, 2)
+            while state.get_possible_moves() != []:
+                for moves in state.get_move_classes():
+                    scores = {exact_value(state.make_move(move), cache)
+                              for move in moves}
+                    self.assertEqual(len(scores), 1)
+                state = state.make_move(rng.choice(
+                    state.get_possible_moves()))
+
+    def test_proof_number_search_matches(self):
+        """
+        Test that df-pn search finds the exact score and a move that gets
+        it, along random games on a small budget.
+        """
+        rng = random.Random(5)
+        cache = {}
+        for _ in range(10):
+            state = StonehengeState(rng.random() < 0.5, 3)
+            for _ in range(rng.randrange(3, 8)):
+                state = state.make_move(rng.choice(
+                    state.get_possible_moves()))
+            if state.get_possible_moves() == []:
+                continue
+            score, move = ProofNumberSearch(MemoryBudget(2 ** 16)).solve(
+                state)
+            self.assertEqual(score, exact_value(state, cache))
+            self.assertEqual(-exact_value(state.make_move(move), cache),
+                             score)
+
+    def test_mtdf_matches_minimax(self):
+        """
+        Test that MTD(f) finds the exact score and the move minimax_rec
+        chooses, along random games.
+        """
+        rng = random.Random(6)
+        for _ in range(10):
+            game = StonehengeGame(rng.random() < 0.5, 3)
+            for _ in range(rng.randrange(5, 9)):
+                game.current_state = game.current_state.make_move(
+                    rng.choice(game.current_state.get_possible_moves()))
+            if game.current_state.get_possible_moves() == []:
+                continue
+            score, move = mtdf(game.current_state)
+            self.assertEqual(score, exact_value(game.current_state))
+            self.assertEqual(move, usable_strategies['mr'](game))
+
+
+class RoughOutcomeUnitTests(unittest.TestCase):
+    def test_matches_two_ply_states(self):
+        """
+        Test that rough_outcome agrees with check_state, which makes every
+        state two moves ahead, along random games.
+        """
+        rng = random.Random(0)
+        for side_length in [1, 2, 3]:
+            for _ in range(20):
+                state = StonehengeState(rng.random() < 0.5, side_length)
+                moves = state.get_possible_moves()
+                while moves:
+                    player = state.get_current_player_name()
+                    expected = max(sum([check_state(state, move, player)
+                                        for move in moves], []))
+                    self.assertEqual(state.rough_outcome(), expected)
+                    state = state.make_move(rng.choice(moves))
+                    moves = state.get_possible_moves()
+
+    @unittest.skipIf(stonehenge_batch.numpy is None, "NumPy is not installed")
+    def test_child_outcomes_batched(self):
+        """
+        Test that the batched rough_outcome of every child agrees with making
+        the children one at a time, along random games.
+        """
+        rng = random.Random(1)
+        for side_length in [1, 2, 3, 4]:
+            for _ in range(10):
+                state = StonehengeState(rng.random() < 0.5, side_length)
+                moves = state.get_possible_moves()
+                while moves:
+                    self.assertEqual(
+                        stonehenge_batch._stonehenge_child_outcomes(state),
+                        [state.make_move(move).rough_outcome()
+                         for move in moves])
+                    state = state.make_move(rng.choice(moves))
+                    moves = state.get_possible_moves()
+
+    def test_child_outcomes_counted(self):
+        """
+        Test that the children made one at a time are counted in the stats.
+        """
+        state = SubtractSquareGame(True, 20).current_state
+        stats = SearchStats()
+        self.assertEqual(child_rough_outcomes(state, stats),
+                         [state.make_move(move).rough_outcome()
+                          for move in state.get_possible_moves()])
+        self.assertEqual(stats.make_move_calls,
+                         len(state.get_possible_moves()))
+
+
+class ThreatIndexUnitTests(unittest.TestCase):
+    def test_winning_moves_match_children(self):
+        """
+        Test that the winning moves found from the threat index are the moves
+        after which the current player has won, along random games.
+        """
+        rng = random.Random(3)
+        for side_length in [1, 2, 3]:
+            for _ in range(20):
+                state = StonehengeState(rng.random() < 0.5, side_length)
+                moves = state.get_possible_moves()
+                while moves:
+                    game = StonehengeGame(state.p1_turn, side_length)
+                    player = state.get_current_player_name()
+                    winning = []
+                    for move in moves:
+                        game.current_state = state.make_move(move)
+                        if game.is_winner(player):
+                            winning.append(move)
+                    self.assertEqual(state.winning_moves(), winning)
+                    state = state.make_move(rng.choice(moves))
+                    moves = state.get_possible_moves()
+
+
+class PotentialUnitTests(unittest.TestCase):
+    def test_kept_potential_matches_sum(self):
+        """
+        Test that the potential every state gets from make_move, without
+        ever being summed along the way, is the one summed from scratch,
+        along random games.
+        """
+        rng = random.Random(9)
+        for side_length in [1, 2, 3, 4, 5]:
+            for _ in range(10):
+                state = StonehengeState(rng.random() < 0.5, side_length)
+                while state.get_possible_moves() != []:
+                    state = state.make_move(rng.choice(
+                        state.get_possible_moves()))
+                    kept = state.get_potential()[:]
+                    state.recount_potential()
+                    self.assertEqual(kept, state.get_potential())
+
+    def test_potential_outcome_range(self):
+        """
+        Test that potential_outcome is WIN exactly when there is a winning
+        move, LOSE exactly when the game is over, and strictly between
+        otherwise, along random games.
+        """
+        rng = random.Random(10)
+        for side_length in [2, 3, 4]:
+            for _ in range(10):
+                state = StonehengeState(rng.random() < 0.5, side_length)
+                while True:
+                    outcome = state.potential_outcome()
+                    if state.get_possible_moves() == []:
+                        self.assertEqual(outcome, state.LOSE)
+                        break
+                    if state.winning_moves() != []:
+                        self.assertEqual(outcome, state.WIN)
+                    else:
+                        self.assertLess(abs(outcome), state.WIN)
+                    state = state.make_move(rng.choice(
+                        state.get_possible_moves()))
+
+
+@unittest.skipIf(stonehenge_batch.numpy is None, "NumPy is not installed")
+class StonehengeBatchUnitTests(unittest.TestCase):
+    def test_batch_matches_states(self):
+        """
+        Test that a batch of positions plays the same random games as the
+        StonehengeStates it was made from.
+        """
+        rng = random.Random(2)
+        states = [StonehengeState(rng.random() < 0.5, 3) for _ in range(50)]
+        batch = StonehengeBatch.from_states(states)
+        while not batch.is_over().all():
+            self.assertEqual([state.get_key() for state in batch.to_states()],
+                             [state.get_key() for state in states])
+            self.assertEqual(batch.legal_mask().sum(axis=1).tolist(),
+                             [len(state.get_possible_moves())
+                              for state in states])
+            moves = [rng.choice(state.get_possible_moves() or ['A'])
+                     for state in states]
+            states = [state.make_move(move)
+                      for state, move in zip(states, moves)]
+            batch = batch.make_moves([cell_index(move) for move in moves])
+        self.assertTrue(all(state.get_possible_moves() == []
+                            for state in states))
+
+
+def _negamax(state, cache):
+    """
+    Return the exact score of state for the player whose turn it is,
+    searching every move without any of the shortcuts of exact_value.
+    """
+    key = state.get_key()
+    if key not in cache:
+        cache[key] = max([-_negamax(state.make_move(move), cache)
+                          for move in state.get_possible_moves()],
+                         default=state.LOSE)
+    return cache[key]
+
+
+class DecidedScoreUnitTests(unittest.TestCase):
+    def test_decided_scores_are_exact(self):
+        """
+        Test that every decided score agrees with a search of every move to
+        the end of the game, along random games.
+        """
+        rng = random.Random(5)
+        cache = {}
+        for side_length in [2, 3]:
+            for _ in range(10):
+                state = StonehengeState(rng.random() < 0.5, side_length)
+                for _ in range(3):
+                    state = state.make_move(rng.choice(
+                        state.get_possible_moves()))
+                while state.get_possible_moves() != []:
+                    decided = state.decided_score()
+                    if decided is not None:
+                        self.assertEqual(decided, _negamax(state, cache))
+                    state = state.make_move(rng.choice(
+                        state.get_possible_moves()))
+                self.assertEqual(state.decided_score(), state.LOSE)
+
+
+def _score_and_plies(state, cache):
+    """
+    Return the exact score of state for the player whose turn it is, and
+    the moves left when the winner wins soonest and the loser loses latest,
+    searching every move.
+    """
+    key = state.get_key()
+    if key not in cache:
+        results = []
+        for move in state.get_possible_moves():
+            score, plies = _score_and_plies(state.make_move(move), cache)
+            results.append((-score, plies + 1))
+        cache[key] = max(results, default=(state.LOSE, 0),
+                         key=lambda result: (result[0],
+                                             -result[0] * result[1]))
+    return cache[key]
+
+
+class DistanceScoreUnitTests(unittest.TestCase):
+    def test_fastest_move_matches_search(self):
+        """
+        Test that fastest_move finds the soonest win or latest loss, and a
+        move that gets it, along random games.
+        """
+        rng = random.Random(7)
+        cache = {}
+        for side_length, plies in [(2, 2), (3, 7)]:
+            for _ in range(10):
+                state = StonehengeState(rng.random() < 0.5, side_length)
+                for _ in range(rng.randrange(plies - 2, plies + 1)):
+                    state = state.make_move(rng.choice(
+                        state.get_possible_moves()))
+                if state.get_possible_moves() == []:
+                    continue
+                score, move = fastest_move(state)
+                self.assertEqual(score, distance_score(
+                    *_score_and_plies(state, cache)))
+                child_score, child_plies = _score_and_plies(
+                    state.make_move(move), cache)
+                self.assertEqual(score, distance_score(-child_score,
+                                                       child_plies + 1))
+
+
+class SelectiveSearchUnitTests(unittest.TestCase):
+    def test_deepens_to_exact_scores(self):
+        """
+        Test that both modes of depth-limited search, given time to reach
+        the end of the game, find the exact score and a move that gets it,
+        along random games.
+        """
+        rng = random.Random(8)
+        cache = {}
+        for _ in range(10):
+            state = StonehengeState(rng.random() < 0.5, 3)
+            for _ in range(rng.randrange(4, 7)):
+                state = state.make_move(rng.choice(
+                    state.get_possible_moves()))
+            if state.get_possible_moves() == []:
+                continue
+            for selective in [False, True]:
+                score, move, _ = DepthLimitedSearch(60, selective).search(
+                    state)
+                self.assertEqual(score, exact_value(state, cache))
+                self.assertEqual(-exact_value(state.make_move(move), cache),
+                                 score)
+
+    def test_stops_in_time(self):
+        """
+        Test that a search of a board too big to search to the end stops
+        soon after its time is up, with a legal move.
+        """
+        state = StonehengeState(True, 5)
+        start = time.perf_counter()
+        _, move, plies = DepthLimitedSearch(0.2).search(state)
+        self.assertLess(time.perf_counter() - start, 2)
+        self.assertIn(move, state.get_possible_moves())
+        self.assertGreaterEqual(plies, 1)
+
+
+class LearnedEvaluationUnitTests(unittest.TestCase):
+    def test_weights_round_trip(self):
+        """
+        Test that saved weights load back to the same evaluation.
+        """
+        rng = random.Random(11)
+        state = StonehengeState(True, 3).make_move('A').make_move('L')
+        evaluation = LinearEvaluation(
+            {3: [rng.uniform(-1, 1) for _ in features(state)]})
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'weights.json')
+            evaluation.save(path)
+            loaded = LinearEvaluation.load(path)
+        self.assertAlmostEqual(loaded(state), evaluation(state), places=4)
+        self.assertLess(abs(loaded(state)), state.WIN)
+
+    @unittest.skipIf(learned_evaluation.numpy is None,
+                     "NumPy is not installed")
+    def test_training_fits_positions(self):
+        """
+        Test that trained weights agree with the exact scores of the
+        positions they were trained on more often than always guessing WIN.
+        """
+        positions = sample_positions(3, 200, random.Random(12))
+        evaluation = LinearEvaluation({3: train(positions, 500)})
+        self.assertGreater(agreement(evaluation, positions),
+                           agreement(lambda state: 1, positions))
+
+
+class SelfPlayUnitTests(unittest.TestCase):
+    def test_shards_round_trip(self):
+        """
+        Test that the positions of a self-play game read back from rotated
+        shards as the same states, with results alternating between the
+        players and the last player to move winning.
+        """
+        records = play_game((usable_strategies['ro'], usable_strategies['mr']),
+                            2, random.Random(13))
+        with tempfile.TemporaryDirectory() as directory:
+            writer = ShardWriter(directory, 'test', 2, records_per_shard=2)
+            for record in records:
+                writer.write(record)
+            writer.close()
+            self.assertEqual(len(writer.paths), (len(records) + 1) // 2)
+            read = [record for path in writer.paths
+                    for _, record in read_shard(path)]
+        self.assertEqual([record[:3] for record in read],
+                         [record[:3] for record in records])
+        self.assertEqual(read[-1].result, StonehengeState.WIN)
+        for record in read:
+            self.assertNotEqual(
+                record_state(record, 2).get_possible_moves(), [])
+
+    def test_worker_reproducible(self):
+        """
+        Test that a worker playing depth-limited strategies writes the same
+        shards every time it is run with the same seed.
+        """
+        shards = []
+        for _ in range(2):
+            with tempfile.TemporaryDirectory() as directory:
+                run_worker(0, ('sl', 'sl'), 3, 2, 7, directory)
+                with open(os.path.join(directory,
+                                       'worker00-00000.bin.gz'), 'rb') as f:
+                    shards.append(gzip.decompress(f.read()))
+        self.assertEqual(shards[0], shards[1])
+
+
+def _random_record(game, rng):
+    """
+    Return the record of a game played from game with random moves chosen
+    with rng, with the player left without a move losing.
+    """
+    record = start_record(game)
+    state = game.current_state
+    while state.get_possible_moves() != []:
+        move = rng.choice(state.get_possible_moves())
+        record.moves.append(move)
+        state = state.make_move(move)
+    return record._replace(winner=2 if state.p1_turn else 1)
+
+
+class GameRecordUnitTests(unittest.TestCase):
+    def test_records_round_trip(self):
+        """
+        Test that games appended by separate writers read back in order
+        with their moves, scores and times, and replay to their end.
+        """
+        rng = random.Random(14)
+        records = []
+        for game in [StonehengeGame(True, 3), SubtractSquareGame(False, 40),
+                     MultiSubtractSquareGame(True, (5, 12))]:
+            record = _random_record(game, rng)
+            records.append(record._replace(
+                scores=[rng.choice([None, 0.5]) for _ in record.moves],
+                times=[0.25] * len(record.moves)))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'games.rec')
+            with GameRecordWriter(path) as writer:
+                writer.write(records[0])
+            with GameRecordWriter(path) as writer:
+                for record in records[1:]:
+                    writer.write(record)
+            read = list(read_games(path))
+        self.assertEqual(read, records)
+        for record in read:
+            game = record.start()
+            for move in record.moves:
+                self.assertTrue(game.current_state.is_valid_move(move))
+                game.current_state = game.current_state.make_move(move)
+            self.assertEqual(game.current_state.get_possible_moves(), [])
+
+
+class PositionIndexUnitTests(unittest.TestCase):
+    def test_lookup_finds_games(self):
+        """
+        Test that an index built in several runs finds every game that
+        reached a position, with its result, and no games for a position
+        never reached.
+        """
+        rng = random.Random(15)
+        with tempfile.TemporaryDirectory() as directory:
+            record_path = os.path.join(directory, 'games.rec')
+            index_path = os.path.join(directory, 'games.idx')
+            records = []
+            with GameRecordWriter(record_path) as writer:
+                for _ in range(30):
+                    records.append(_random_record(StonehengeGame(True, 2),
+                                                  rng))
+                    writer.write(records[-1])
+            self.assertEqual(build_index(record_path, index_path, 50)[0], 30)
+            index = PositionIndex.load(index_path)
+            start = StonehengeState(True, 2)
+            reached = index.lookup(start)
+            self.assertEqual(reached.games, 30)
+            self.assertEqual(reached.p1_wins, sum(
+                1 for record in records if record.winner == 1))
+            state = start.make_move(records[0].moves[0])
+            with open(record_path, 'rb') as record_file:
+                found = list(index.games(state, record_file))
+            self.assertEqual(found, [record for record in records
+                                     if record.moves[0] ==
+                                     records[0].moves[0]])
+            self.assertEqual(sum(stats.games for _, stats in
+                                 index.explore(start)), 30)
+            self.assertEqual(index.lookup(StonehengeState(False, 2)).games, 0)
+
+
+class ReanalysisUnitTests(unittest.TestCase):
+    def test_blunder_flagged_and_cached(self):
+        """
+        Test that a move throwing away a won SubtractSquare game is flagged
+        as a blunder, and that a second run finds every position in the
+        cache instead of searching it again.
+        """
+        game = SubtractSquareGame(True, 13)
+        record = start_record(game)._replace(moves=[4, 9], winner=2)
+        with tempfile.TemporaryDirectory() as directory:
+            record_path = os.path.join(directory, 'games.rec')
+            with GameRecordWriter(record_path) as writer:
+                writer.write(record)
+            cache = AnalysisCache(os.path.join(directory, 'cache.sqlite'))
+            with Pool(1, _start_worker, ('mr', None)) as pool:
+                outputs = []
+                for expected_searches in [2, 0]:
+                    output = io.StringIO()
+                    totals = reanalyse([record_path], output, cache, 'mr',
+                                       pool)
+                    self.assertEqual(totals['searched'], expected_searches)
+                    outputs.append(output.getvalue())
+            cache.close()
+        self.assertEqual(outputs[0], outputs[1])
+        moves = json.loads(outputs[0])['moves']
+        self.assertEqual([move['blunder'] for move in moves], [True, False])
+        self.assertEqual((moves[0]['best_move'], moves[0]['loss']), (1, 2.0))
+
+    def test_strategies_report_scores(self):
+        """
+        Test that every strategy reanalysis can use reports the score of the
+        move it chose in a Stonehenge state, and that the exact strategies
+        agree on it.
+        """
+        state = StonehengeState(True, 2).make_move('A').make_move('G')
+        exact = {}
+        for key, strategy in usable_strategies.items():
+            if key == 'i':
+                continue
+            game = StonehengeGame(True, 2)
+            game.current_state = state
+            options = {'seconds': 0.1} if accepts_option(strategy,
+                                                          'seconds') else {}
+            _, stats = choose_move(strategy, game, **options)
+            self.assertIsNotNone(stats.score, key)
+            if key in ['mr', 'mi', 'mf', 'fw', 'pn', 'pm']:
+                exact[key] = stats.score
+        self.assertEqual(set(exact.values()), {exact_value(state)})
+
+    def test_every_strategy_in_pool(self):
+        """
+        Test that a Stonehenge game is re-analysed through a Pool with every
+        strategy the command line offers, and that the exact strategies
+        give its moves the same scores.
+        """
+        record = _random_record(StonehengeGame(True, 2), random.Random(16))
+        exact = {}
+        with tempfile.TemporaryDirectory() as directory:
+            record_path = os.path.join(directory, 'games.rec')
+            with GameRecordWriter(record_path) as writer:
+                writer.write(record)
+            cache = AnalysisCache(os.path.join(directory, 'cache.sqlite'))
+            for key in worker_strategies:
+                with Pool(1, _start_worker, (key, 0.05)) as pool:
+                    output = io.StringIO()
+                    totals = reanalyse([record_path], output, cache, key,
+                                       pool)
+                self.assertEqual(totals['moves'], len(record.moves), key)
+                moves = json.loads(output.getvalue())['moves']
+                if key in ['mr', 'mi', 'mf', 'fw', 'pn']:
+                    exact[key] = [move['score'] for move in moves]
+            cache.close()
+        self.assertEqual(len(set(map(tuple, exact.values()))), 1)
+
+
+class SubtractSquareSolverUnitTests(unittest.TestCase):
+    def test_table_matches_search(self):
+        """
+        Test that the solved table agrees with the exact solver, and that
+        minimax answers from it with a best move.
+        """
+        table = SubtractSquareTable.solve(200)
+        cache = {}
+        for total in range(1, 201):
+            game = SubtractSquareGame(True, total)
+            values = exact_move_values(game.current_state, cache)
+            self.assertEqual(table.is_win(total),
+                             max(values.values()) == 1)
+            for key in ['mr', 'mi']:
+                move = usable_strategies[key](game)
+                self.assertEqual(values[move], max(values.values()))
+
+    def test_grundy_matches_search(self):
+        """
+        Test that the Grundy numbers of the heaps agree with the exact solver
+        on multi-heap SubtractSquare, and that minimax moves to a win.
+        """
+        cache = {}
+        for heaps in [(1, 1), (2, 2), (4, 3), (2, 5), (6, 7, 8), (10, 3, 9)]:
+            game = MultiSubtractSquareGame(True, heaps)
+            values = exact_move_values(game.current_state, cache)
+            self.assertEqual(grundy_value(heaps) != 0,
+                             max(values.values()) == 1)
+            for key in ['mr', 'mi']:
+                move = usable_strategies[key](game)
+                self.assertEqual(values[move], max(values.values()))
+
+
+class ParallelStrategyUnitTests(unittest.TestCase):
+    def test_parallel_strategy_traced(self):
+        """
+        Test that the parallel strategy finds the only winning move and
+        records a span for every root move.
+        """
+        game = StonehengeGame(True, 2)
+        for move in ['A', 'F', 'D']:
+            game.current_state = game.current_state.make_move(move)
+        tracer = Tracer()
+        move, stats = choose_move(usable_strategies['pm'], game,
+                                  tracer=tracer, workers=2)
+        self.assertEqual(move, 'E')
+        spans = [event for event in tracer.events()
+                 if event['name'] == 'root move']
+        self.assertEqual(sorted(span['args']['move'] for span in spans),
+                         list(game.current_state.iter_distinct_moves()))
+        self.assertGreater(stats.nodes, len(spans))
+
+
+class MemoryBudgetUnitTests(unittest.TestCase):
+    def test_iterative_within_budget(self):
+        """
+        Test that iterative minimax chooses the same move when its budget
+        runs out, and reports its peak memory.
+        """
+        moves = []
+        for limit in [None, 2 ** 12]:
+            game = StonehengeGame(False, 3)
+            for move in ['K', 'A', 'C', 'B', 'F']:
+                game.current_state = game.current_state.make_move(move)
+            budget = None if limit is None else MemoryBudget(limit)
+            stats = SearchStats()
+            moves.append(usable_strategies['mi'](game, stats, budget))
+        self.assertEqual(moves[0], moves[1])
+        self.assertGreater(stats.memory_peak, 0)
+        self.assertGreater(stats.tt_probes, 0)
+
+    def test_iterative_keeps_table(self):
+        """
+        Test that once the trees of iterative minimax have used their share
+        of the budget, the transposition table it falls back to keeps the
+        rest instead of being emptied by the trees.
+        """
+        game = StonehengeGame(False, 3)
+        for move in ['K', 'A', 'C']:
+            game.current_state = game.current_state.make_move(move)
+        budget = MemoryBudget(2 ** 16)
+        stats = SearchStats()
+        usable_strategies['mi'](game, stats, budget)
+        share = budget.limit * TABLE_SHARE
+        self.assertGreater(budget.used['table'], share / 4)
+        self.assertLessEqual(budget.used['table'], share)
+        self.assertGreater(stats.tt_hits, 0)
+
+    def test_table_shrinks(self):
+        """
+        Test that a transposition table evicts its oldest entries to stay
+        within its budget.
+        """
+        budget = MemoryBudget(2 ** 12)
+        table = TranspositionTable(budget)
+        for key in range(1000):
+            table[(True, key)] = 1
+        self.assertFalse(budget.exceeded)
+        self.assertGreater(table.resizes, 0)
+        self.assertIn((True, 999), table)
+        self.assertNotIn((True, 0), table)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,244 @@
+"""
+Depth-limited search under a clock.
+
+Searches to a fixed number of moves, scoring the states at the horizon with
+rough_outcome() or a given evaluation, and deepens one move at a time until
+the time for the move runs out. In selective mode, the moves of a state are
+ranked by the rough_outcome() of the states they lead to, late moves are
+searched less deep unless they turn out better than the moves before them,
+and moves whose rough_outcome() is too poor to raise alpha are not searched
+just above the horizon. This lets a search reach deeper in the same time on
+boards too big to search to the end.
+
+Run as a script, it compares how deep full-width and selective search reach
+in the same time.
+
+Usage:
+    python selective_search.py --side-length 5 --seconds 2
+
+NOTE: You do not have to run python-ta on this file.
+"""
+import argparse
+import random
+import sys
+import time
+from typing import Any, Callable, List, Tuple, Union
+from game_state import GameState
+from search_stats import SearchStats
+from stonehenge_batch import child_rough_outcomes
+
+# Seconds a move may take when no time is given.
+DEFAULT_MOVE_SECONDS = 1.0
+# Number of best ranked moves of a state searched to full depth.
+LATE_MOVES = 3
+# Number of moves less deep that late moves are searched.
+REDUCTION = 1
+# Most a move can gain on its rough_outcome() in a search two moves deep.
+FUTILITY_MARGIN = 0.25
+
+
+class OutOfTime(Exception):
+    """
+    Raised when a search runs out of time.
+    """
+    pass
+
+
+class DepthLimitedSearch:
+    """
+    An iterative-deepening alpha-beta search that stops when its time runs
+    out.
+
+    seconds - the time a search may take
+    selective - whether late moves are reduced and futile moves pruned
+    evaluate - the evaluation of states at the horizon, or None for
+               rough_outcome()
+    max_plies - the most moves a search looks ahead, or None to deepen
+                until the time runs out
+    stats - the statistics of the searches
+    researches - number of reduced moves searched again to full depth
+    pruned - number of moves not searched since they were futile
+    """
+    seconds: float
+    selective: bool
+    evaluate: Union[Callable[[GameState], float], None]
+    max_plies: Union[int, None]
+    stats: SearchStats
+    researches: int
+    pruned: int
+
+    def __init__(self, seconds: float = DEFAULT_MOVE_SECONDS,
+                 selective: bool = True, stats: SearchStats = None,
+                 evaluate: Callable[[GameState], float] = None,
+                 max_plies: int = None) -> None:
+        """
+        Initialize this search to take seconds, selectively if selective is
+        True, scoring the states at the horizon with evaluate, looking at
+        most max_plies moves ahead, and recording searches in stats. A
+        search limited only by max_plies visits the same states every time
+        it is run.
+        """
+        self.seconds = seconds
+        self.selective = selective
+        self.evaluate = evaluate
+        self.max_plies = max_plies
+        self.stats = SearchStats() if stats is None else stats
+        self.researches = 0
+        self.pruned = 0
+        self._deadline = None
+        self._horizon_reached = False
+
+    def search(self, state: GameState) -> Tuple[float, Any, int]:
+        """
+        Return the score of state for the player whose turn it is from the
+        deepest search that finished in time, its best move, and the number
+        of moves it searched ahead. The search stops deepening early once
+        it reaches the end of the game everywhere or max_plies moves ahead.
+        The move is None if state has no moves.
+
+        >>> from subtract_square_state import SubtractSquareState
+        >>> DepthLimitedSearch().search(SubtractSquareState(True, 18))
+        (1, 16, 1)
+        """
+        self._deadline = time.perf_counter() + self.seconds
+        self._horizon_reached = True
+        self.stats.visit(0)
+        moves = self._ordered_moves(state)
+        if moves == []:
+            return state.LOSE, None, 0
+        # Ranking the moves searched them one move ahead.
+        score, move, plies = -moves[0][1], moves[0][0], 1
+        try:
+            while abs(score) != state.WIN and self._horizon_reached and \
+                    (self.max_plies is None or plies < self.max_plies):
+                self._horizon_reached = False
+                scores = []
+                alpha = state.LOSE - 1
+                for candidate, _ in moves:
+                    self.stats.make_move_calls += 1
+                    value = -self._value(state.make_move(candidate), plies,
+                                         state.LOSE - 1, -alpha, 1)
+                    scores.append((value, candidate))
+                    alpha = max(alpha, value)
+                plies += 1
+                self.stats.end_iteration()
+                # The next search tries the best moves of this one first.
+                ranked = sorted(range(len(moves)),
+                                key=lambda i: -scores[i][0])
+                moves = [moves[i] for i in ranked]
+                score, move = scores[ranked[0]]
+        except OutOfTime:
+            self.stats.end_iteration()
+        self.stats.score = score
+        return score, move, plies
+
+    def _value(self, state: GameState, plies: int, alpha: float,
+               beta: float, depth: int) -> float:
+        """
+        Return the score of state for the player whose turn it is, searching
+        plies moves ahead, if it is strictly between alpha and beta, or else
+        a bound on it on the same side of the window.
+        """
+        if time.perf_counter() > self._deadline:
+            raise OutOfTime
+        self.stats.visit(depth)
+        decided = state.decided_score()
+        if decided is None and state.get_possible_moves() == []:
+            decided = state.LOSE
+        if decided is not None:
+            self.stats.leaf_evaluations += 1
+            return decided
+        if plies == 0:
+            self._horizon_reached = True
+            self.stats.leaf_evaluations += 1
+            if self.evaluate is None:
+                return state.rough_outcome()
+            return self.evaluate(state)
+        moves = self._ordered_moves(state)
+        if plies == 1 and self.evaluate is None:
+            # The states one move ahead would be scored by rough_outcome(),
+            # which ranking the moves already did.
+            self._horizon_reached = True
+            self.stats.leaf_evaluations += len(moves)
+            return -moves[0][1]
+        best = state.LOSE
+        for i, (move, outcome) in enumerate(moves):
+            if self.selective and plies == 2 and i > 0 and \
+                    -outcome + FUTILITY_MARGIN <= alpha:
+                # The moves are ranked, so the rest are futile as well.
+                self.pruned += len(moves) - i
+                break
+            child = state.make_move(move)
+            self.stats.make_move_calls += 1
+            if self.selective and i >= LATE_MOVES and plies > 1 + REDUCTION:
+                value = -self._value(child, plies - 1 - REDUCTION, -beta,
+                                     -alpha, depth + 1)
+                if value > alpha:
+                    self.researches += 1
+                    value = -self._value(child, plies - 1, -beta, -alpha,
+                                         depth + 1)
+            else:
+                value = -self._value(child, plies - 1, -beta, -alpha,
+                                     depth + 1)
+            best = max(best, value)
+            alpha = max(alpha, value)
+            if alpha >= beta:
+                self.stats.cutoffs += 1
+                break
+        return best
+
+    def _ordered_moves(self, state: GameState) -> List[Tuple[Any, float]]:
+        """
+        Return the distinct moves of state with the rough_outcome() of the
+        state each leads to, best move for the player whose turn it is
+        first.
+        """
+        moves = state.get_possible_moves()
+        distinct = set(state.iter_distinct_moves())
+        outcomes = child_rough_outcomes(state, self.stats)
+        ranked = [(move, outcome) for move, outcome in zip(moves, outcomes)
+                  if move in distinct]
+        ranked.sort(key=lambda item: item[1])
+        return ranked
+
+
+def main(argv: List[str] = None) -> int:
+    """
+    Compare full-width and selective search from the command line.
+    """
+    # Imported here since strategy imports this module.
+    from stonehenge_state import StonehengeState
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--side-length', type=int, default=4,
+                        help='side length of the boards (default: '
+                             '%(default)s)')
+    parser.add_argument('--seconds', type=float, default=DEFAULT_MOVE_SECONDS,
+                        help='time for each search (default: %(default)s)')
+    parser.add_argument('--positions', type=int, default=5,
+                        help='number of random positions (default: '
+                             '%(default)s)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the random positions (default: '
+                             '%(default)s)')
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    print('{:<10} {:>9} {:>6} {:>6} {:>10} {:>10} {:>7}'.format(
+        'position', 'mode', 'plies', 'move', 'nodes', 'researches',
+        'pruned'))
+    for number in range(args.positions):
+        state = StonehengeState(rng.random() < 0.5, args.side_length)
+        for _ in range(rng.randrange(4)):
+            state = state.make_move(rng.choice(state.get_possible_moves()))
+        for selective in [False, True]:
+            search = DepthLimitedSearch(args.seconds, selective)
+            _, move, plies = search.search(state)
+            print('{:<10} {:>9} {:>6} {:>6} {:>10} {:>10} {:>7}'.format(
+                number, 'selective' if selective else 'full', plies,
+                str(move), search.stats.nodes, search.researches,
+                search.pruned))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,303 @@
+"""
+Self-play data generation for training and tuning evaluations.
+
+Worker processes play Stonehenge games between two of the usable strategies
+and stream a record of every position into rotating, gzip-compressed shard
+files: the cells each player holds, the ley-lines each player has claimed,
+whose turn it is, the score the search of the player to move gave the
+position, and the final result of the game for that player. Every worker
+has its own seed, plays its own share of the games and writes its own
+shards, and depth-limited strategies look a fixed number of moves ahead
+instead of searching under a clock, so a run can be reproduced. The memory
+used stays the same however many games are played.
+
+Usage:
+    python self_play.py --players sl le --side-length 4 --games 100 \
+        --workers 4 --output shards
+
+NOTE: You do not have to run python-ta on this file.
+"""
+import argparse
+import gzip
+import math
+import os
+import random
+import struct
+import sys
+from multiprocessing import Pool
+from typing import Any, Iterator, List, NamedTuple, Tuple
+from search_stats import accepts_option, choose_move
+from stonehenge_game import StonehengeGame
+from stonehenge_state import StonehengeState
+
+# The first bytes of every shard, followed by its side length.
+SHARD_MAGIC = b'SHSP1'
+# Records written to a shard before the next shard is started.
+RECORDS_PER_SHARD = 100000
+# Moves ahead each move of a depth-limited strategy looks, in place of a
+# clock, so that the same seed plays the same games.
+SELF_PLAY_PLIES = 2
+# The score, the result and whose turn it is, after the cells and marks.
+_TAIL = struct.Struct('<fb?')
+
+
+class PositionRecord(NamedTuple):
+    """
+    A position of a self-play game.
+
+    owners - player (1 or 2) holding each cell, or 0, in cell order
+    marks - player (1 or 2) who claimed each ley-line, or 0
+    p1_turn - whether it is p1's turn
+    score - score the search of the player to move gave the position
+    result - WIN if the player to move went on to win the game, else LOSE
+    """
+    owners: Tuple[int, ...]
+    marks: Tuple[int, ...]
+    p1_turn: bool
+    score: float
+    result: int
+
+
+def position_record(state: StonehengeState, score: float,
+                    result: int) -> PositionRecord:
+    """
+    Return the record of state with score and result.
+
+    >>> state = StonehengeState(True, 1).make_move('A')
+    >>> position_record(state, 0.5, -1)
+    PositionRecord(owners=(1, 0, 0), marks=(1, 0, 0, 1, 1, 0), \
+p1_turn=False, score=0.5, result=-1)
+    """
+    return PositionRecord(
+        tuple(value if value in (1, 2) else 0
+              for value in state.cells.values()),
+        tuple(0 if mark == '@' else mark
+              for mark in state.ley_line_state.values()),
+        state.p1_turn, score, result)
+
+
+def record_state(record: PositionRecord,
+                 side_length: int) -> StonehengeState:
+    """
+    Return the state of a side_length board that record is of.
+
+    >>> state = StonehengeState(True, 2).make_move('A').make_move('D')
+    >>> copy = record_state(position_record(state, 0.0, 1), 2)
+    >>> copy.get_key() == state.get_key()
+    True
+    """
+    state = StonehengeState(record.p1_turn, side_length)
+    for cell, owner in zip(list(state.cells), record.owners):
+        if owner != 0:
+            state.cells[cell] = owner
+            for leyline in state.ley_line:
+                if int(cell[1:]) in state.ley_line[leyline]:
+                    state.ley_line_count[leyline][owner - 1] += 1
+    for leyline, mark in zip(state.ley_line, record.marks):
+        if mark != 0:
+            state.ley_line_state[leyline] = mark
+    state.recount_potential()
+    return state
+
+
+class ShardWriter:
+    """
+    A writer of position records into gzip-compressed shards, starting a
+    new shard every records_per_shard records.
+
+    directory - the directory the shards are written to
+    prefix - the start of the name of every shard
+    side_length - the side length of the boards of the positions
+    records_per_shard - the most records written to one shard
+    paths - the paths of the shards written so far
+    records - the number of records written so far
+    """
+    directory: str
+    prefix: str
+    side_length: int
+    records_per_shard: int
+    paths: List[str]
+    records: int
+
+    def __init__(self, directory: str, prefix: str, side_length: int,
+                 records_per_shard: int = RECORDS_PER_SHARD) -> None:
+        """
+        Initialize this writer to write shards named after prefix into
+        directory.
+        """
+        self.directory = directory
+        self.prefix = prefix
+        self.side_length = side_length
+        self.records_per_shard = records_per_shard
+        self.paths = []
+        self.records = 0
+        self._file = None
+        self._in_shard = 0
+
+    def write(self, record: PositionRecord) -> None:
+        """
+        Write record to the current shard, starting a new one if it is full.
+        """
+        if self._file is None or self._in_shard == self.records_per_shard:
+            self.close()
+            path = os.path.join(self.directory, '{}-{:05d}.bin.gz'.format(
+                self.prefix, len(self.paths)))
+            self._file = gzip.open(path, 'wb')
+            self._file.write(SHARD_MAGIC + bytes([self.side_length]))
+            self.paths.append(path)
+            self._in_shard = 0
+        self._file.write(bytes(record.owners) + bytes(record.marks) +
+                         _TAIL.pack(record.score, record.result,
+                                    record.p1_turn))
+        self._in_shard += 1
+        self.records += 1
+
+    def close(self) -> None:
+        """
+        Finish the current shard, if any.
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_shard(path: str) -> Iterator[Tuple[int, PositionRecord]]:
+    """
+    Yield the side length and record of every position in the shard at
+    path, one at a time.
+    """
+    with gzip.open(path, 'rb') as shard:
+        header = shard.read(len(SHARD_MAGIC) + 1)
+        if header[:len(SHARD_MAGIC)] != SHARD_MAGIC:
+            raise ValueError('{} is not a self-play shard'.format(path))
+        side_length = header[-1]
+        board = StonehengeState(True, side_length)
+        cells, leylines = len(board.cells), len(board.ley_line)
+        size = cells + leylines + _TAIL.size
+        while True:
+            data = shard.read(size)
+            if len(data) < size:
+                return
+            score, result, p1_turn = _TAIL.unpack(data[cells + leylines:])
+            yield side_length, PositionRecord(
+                tuple(data[:cells]), tuple(data[cells:cells + leylines]),
+                p1_turn, score, result)
+
+
+def play_game(strategies: Tuple[Any, Any], side_length: int,
+              rng: random.Random, opening_moves: int = 2,
+              plies: int = SELF_PLAY_PLIES) -> List[PositionRecord]:
+    """
+    Return the records of the positions of a game on a side_length board
+    between strategies, the first of which plays p1, after opening_moves
+    random moves chosen with rng. Depth-limited strategies look plies moves
+    ahead instead of searching under a clock, so the game depends only on
+    rng. Positions whose search gave no score are scored with their
+    rough_outcome().
+    """
+    game = StonehengeGame(rng.random() < 0.5, side_length)
+    for _ in range(opening_moves):
+        if game.current_state.get_possible_moves() == []:
+            break
+        game.current_state = game.current_state.make_move(
+            rng.choice(game.current_state.get_possible_moves()))
+    positions = []
+    while game.current_state.get_possible_moves() != []:
+        state = game.current_state
+        strategy = strategies[0] if state.p1_turn else strategies[1]
+        options = {}
+        if accepts_option(strategy, 'plies'):
+            options['plies'] = plies
+            options['seconds'] = math.inf
+        move, stats = choose_move(strategy, game, **options)
+        score = stats.score if stats.score is not None \
+            else state.rough_outcome()
+        positions.append((state, score))
+        game.current_state = state.make_move(move)
+    # The player to move at the end has lost.
+    loser_p1 = game.current_state.p1_turn
+    return [position_record(state, score,
+                            state.LOSE if state.p1_turn == loser_p1
+                            else state.WIN)
+            for state, score in positions]
+
+
+def run_worker(worker: int, players: Tuple[str, str], side_length: int,
+               games: int, seed: int, directory: str,
+               records_per_shard: int = RECORDS_PER_SHARD,
+               plies: int = SELF_PLAY_PLIES) -> Tuple[int, int, int]:
+    """
+    Play games self-play games between the worker strategies named by
+    players, swapping sides every game, with a random generator seeded from
+    seed and worker, and write their positions to shards in directory.
+    Return the worker, and the numbers of records and shards written.
+    """
+    # Imported here since game_interface imports every strategy.
+    from game_interface import worker_strategies
+    rng = random.Random('{}/{}'.format(seed, worker))
+    writer = ShardWriter(directory, 'worker{:02d}'.format(worker),
+                         side_length, records_per_shard)
+    try:
+        for number in range(games):
+            first, second = players if number % 2 == 0 else players[::-1]
+            for record in play_game((worker_strategies[first],
+                                     worker_strategies[second]),
+                                    side_length, rng, plies=plies):
+                writer.write(record)
+    finally:
+        writer.close()
+    return worker, writer.records, len(writer.paths)
+
+
+def main(argv: List[str] = None) -> int:
+    """
+    Generate self-play shards from the command line.
+    """
+    # Imported here since game_interface imports every strategy.
+    from game_interface import worker_strategies
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--players', nargs=2, default=['sl', 'sl'],
+                        metavar='KEY', choices=sorted(worker_strategies),
+                        help='keys of the usable strategies that play, '
+                             'other than i and pm (default: %(default)s)')
+    parser.add_argument('--side-length', type=int, default=4,
+                        help='side length of the boards (default: '
+                             '%(default)s)')
+    parser.add_argument('--games', type=int, default=100,
+                        help='number of games in all (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='number of worker processes (default: '
+                             '%(default)s)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed the seed of every worker is made from '
+                             '(default: %(default)s)')
+    parser.add_argument('--plies', type=int, default=SELF_PLAY_PLIES,
+                        help='moves ahead each move of a depth-limited '
+                             'strategy looks (default: %(default)s)')
+    parser.add_argument('--records-per-shard', type=int,
+                        default=RECORDS_PER_SHARD,
+                        help='records in each shard (default: %(default)s)')
+    parser.add_argument('--output', default='shards',
+                        help='directory to write the shards to (default: '
+                             '%(default)s)')
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.output, exist_ok=True)
+    shares = [args.games // args.workers +
+              (1 if worker < args.games % args.workers else 0)
+              for worker in range(args.workers)]
+    tasks = [(worker, tuple(args.players), args.side_length, shares[worker],
+              args.seed, args.output, args.records_per_shard, args.plies)
+             for worker in range(args.workers) if shares[worker] > 0]
+    if tasks == []:
+        print('No games to play.')
+        return 0
+    with Pool(len(tasks)) as pool:
+        for worker, records, shards in pool.starmap(run_worker, tasks):
+            print('worker {}: {} games, {} records in {} shards'.format(
+                worker, shares[worker], records, shards))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
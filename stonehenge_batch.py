@@ -0,0 +1,257 @@
+"""
+Batched evaluation of Stonehenge states.
+
+A board is encoded as arrays: the ley-line counts of each player, and a
+cell x ley-line incidence matrix with a 1 where a ley-line passes through a
+cell. The ley-lines claimed in every continuation of a state then come from
+a few array operations over all the continuations at once, instead of from
+making each state. NumPy is used when it is installed; without it the
+states are evaluated one at a time.
+
+NOTE: You do not have to run python-ta on this file.
+"""
+from typing import Any, List, Tuple
+from search_stats import SearchStats
+from stonehenge_state import StonehengeState
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# The incidence matrix and ley-line lengths of each side length.
+_INCIDENCE = {}
+
+
+def incidence(state: StonehengeState) -> Tuple[Any, Any]:
+    """
+    Return the cell x ley-line incidence matrix of the board of state, with
+    cells and ley-lines in the order of state.cells and state.ley_line, and
+    the length of each ley-line.
+
+    Precondition: NumPy is installed.
+    """
+    if state.side_length not in _INCIDENCE:
+        cells = [int(cell[1:]) for cell in state.cells]
+        matrix = numpy.array([[int(cell in state.ley_line[leyline])
+                               for leyline in state.ley_line]
+                              for cell in cells], dtype=numpy.int16)
+        _INCIDENCE[state.side_length] = (matrix, matrix.sum(axis=0))
+    return _INCIDENCE[state.side_length]
+
+
+def child_rough_outcomes(state: Any, stats: SearchStats = None) -> List[float]:
+    """
+    Return the rough_outcome() of the state after each of the possible moves
+    of state, in the order of state.get_possible_moves().
+
+    Stonehenge states are evaluated together when NumPy is installed; other
+    states are made and evaluated one at a time, and the moves made are
+    recorded in stats if it is given.
+
+    >>> s1 = StonehengeState(True, 2).make_move('A').make_move('C')
+    >>> child_rough_outcomes(s1) == [s1.make_move(move).rough_outcome()
+    ...                              for move in s1.get_possible_moves()]
+    True
+    """
+    if numpy is not None and isinstance(state, StonehengeState):
+        return _stonehenge_child_outcomes(state)
+    outcomes = []
+    for move in state.get_possible_moves():
+        outcomes.append(state.make_move(move).rough_outcome())
+        if stats is not None:
+            stats.make_move_calls += 1
+    return outcomes
+
+
+def _stonehenge_child_outcomes(state: StonehengeState) -> List[float]:
+    """
+    Return the rough_outcome() of the state after each possible move of
+    state, working out the ley-lines claimed by the move, every reply, and
+    every move after the reply with array operations.
+    """
+    if state.get_possible_moves() == []:
+        return []
+    matrix, lengths = incidence(state)
+    player, opponent = (0, 1) if state.p1_turn else (1, 0)
+    total = len(state.ley_line)
+    marks = list(state.ley_line_state.values())
+    claimed = [marks.count(1), marks.count(2)]
+    unclaimed = numpy.array([mark == '@' for mark in marks])
+    counts = numpy.array([state.ley_line_count[leyline]
+                          for leyline in state.ley_line]).T
+    free = [i for i, value in enumerate(state.cells.values())
+            if value != 1 and value != 2]
+    moves = matrix[free].astype(bool)
+    size = len(free)
+
+    # The ley-lines the player claims with each move, and those they would
+    # claim with one more cell afterwards.
+    after = counts[player] + matrix[free]
+    gained = moves & unclaimed & (2 * after >= lengths)
+    mine = claimed[player] + gained.sum(axis=1)
+    left = unclaimed & ~gained
+    ready = left & (2 * (after + 1) >= lengths)
+
+    # The ley-lines the opponent claims with each reply to each move.
+    replies = left[:, None, :] & moves[None, :, :] & \
+        (2 * (counts[opponent] + 1) >= lengths)
+    theirs = claimed[opponent] + replies.sum(axis=2)
+
+    # The most ley-lines the player claims with any move after each reply.
+    answers = (ready[:, None, :] & ~replies).reshape(size * size, -1)
+    answers = (answers.astype(numpy.int16) @ matrix[free].T).reshape(
+        size, size, size)
+    index = numpy.arange(size)
+    answers[index, :, index] = -1
+    answers[:, index, index] = -1
+    most = answers.max(axis=2)
+
+    # The reply wins, or ends in a loss, or scores its share of ley-lines.
+    wins = 2 * theirs >= total
+    losses = (2 * (mine[:, None] + most) >= total) | (size <= 3)
+    scores = numpy.where(wins | losses, -1, theirs)
+    scores[index, index] = -1
+    wins[index, index] = False
+    outcomes = []
+    for i in range(size):
+        if 2 * mine[i] >= total or size == 1:
+            outcomes.append(state.LOSE)
+        elif size == 2 or wins[i].any():
+            outcomes.append(state.WIN)
+        elif scores[i].max() < 0:
+            outcomes.append(state.LOSE)
+        else:
+            outcomes.append(int(scores[i].max()) / total)
+    return outcomes
+
+
+class StonehengeBatch:
+    """
+    Many Stonehenge positions with the same side length, stored as arrays
+    with one row per position. A move is the index of its cell, so 'A' is 0.
+
+    Precondition: NumPy is installed.
+
+    side_length - side length of the boards
+    owners - player (1 or 2) owning each cell, or 0 if it is unclaimed
+    counts - number of cells of each ley-line owned by each player
+    marks - player (1 or 2) who claimed each ley-line, or 0 if unclaimed
+    p1_turn - whether it is p1's turn in each position
+    """
+    side_length: int
+    owners: Any
+    counts: Any
+    marks: Any
+    p1_turn: Any
+
+    def __init__(self, side_length: int, owners: Any, counts: Any,
+                 marks: Any, p1_turn: Any) -> None:
+        """
+        Initialize this batch from its arrays, of shapes (n, cells),
+        (n, 2, ley-lines), (n, ley-lines) and (n,).
+        """
+        self.side_length = side_length
+        self.owners = owners
+        self.counts = counts
+        self.marks = marks
+        self.p1_turn = p1_turn
+        self._matrix, self._lengths = incidence(
+            StonehengeState(True, side_length))
+
+    def __len__(self) -> int:
+        """
+        Return the number of positions in this batch.
+        """
+        return len(self.p1_turn)
+
+    @classmethod
+    def from_states(cls, states: List[StonehengeState]) -> "StonehengeBatch":
+        """
+        Return a batch of the positions of states, which all have the same
+        side length.
+        """
+        owners = [[value if value == 1 or value == 2 else 0
+                   for value in state.cells.values()] for state in states]
+        counts = [[[state.ley_line_count[leyline][player]
+                    for leyline in state.ley_line] for player in range(2)]
+                  for state in states]
+        marks = [[0 if mark == '@' else mark
+                  for mark in state.ley_line_state.values()]
+                 for state in states]
+        return cls(states[0].side_length,
+                   numpy.array(owners, dtype=numpy.int8),
+                   numpy.array(counts, dtype=numpy.int16),
+                   numpy.array(marks, dtype=numpy.int8),
+                   numpy.array([state.p1_turn for state in states],
+                               dtype=bool))
+
+    def to_states(self) -> List[StonehengeState]:
+        """
+        Return the positions of this batch as StonehengeStates.
+        """
+        states = []
+        for i in range(len(self)):
+            state = StonehengeState(bool(self.p1_turn[i]), self.side_length)
+            for cell, owner in zip(list(state.cells), self.owners[i]):
+                if owner != 0:
+                    state.cells[cell] = int(owner)
+            for j, leyline in enumerate(state.ley_line):
+                state.ley_line_count[leyline] = [int(self.counts[i, 0, j]),
+                                                 int(self.counts[i, 1, j])]
+                if self.marks[i, j] != 0:
+                    state.ley_line_state[leyline] = int(self.marks[i, j])
+            state.recount_potential()
+            states.append(state)
+        return states
+
+    def is_over(self) -> Any:
+        """
+        Return whether the game is over in each position: a player has
+        claimed at least half of the ley-lines, or every cell is claimed.
+        """
+        total = self.marks.shape[1]
+        return ((2 * (self.marks == 1).sum(axis=1) >= total) |
+                (2 * (self.marks == 2).sum(axis=1) >= total) |
+                (self.owners != 0).all(axis=1))
+
+    def legal_mask(self) -> Any:
+        """
+        Return whether each cell is a legal move in each position.
+        """
+        return (self.owners == 0) & ~self.is_over()[:, None]
+
+    def make_moves(self, moves: Any) -> "StonehengeBatch":
+        """
+        Return the batch that results from making moves[i] in position i of
+        this batch. Like StonehengeState.make_move, a position is left as it
+        is if its move is not legal.
+        """
+        moves = numpy.asarray(moves)
+        rows = numpy.arange(len(self))
+        legal = self.legal_mask()[rows, moves]
+        rows, moves = rows[legal], moves[legal]
+        player = numpy.where(self.p1_turn[rows], 0, 1)
+        owners = self.owners.copy()
+        counts = self.counts.copy()
+        marks = self.marks.copy()
+        p1_turn = self.p1_turn.copy()
+        owners[rows, moves] = player + 1
+        counts[rows, player] += self._matrix[moves]
+        claimed = (marks[rows] == 0) & \
+            (2 * counts[rows, player] >= self._lengths)
+        marks[rows] = numpy.where(claimed, (player + 1)[:, None], marks[rows])
+        p1_turn[rows] = ~p1_turn[rows]
+        return StonehengeBatch(self.side_length, owners, counts, marks,
+                               p1_turn)
+
+
+def cell_index(move: str) -> int:
+    """
+    Return the index of the cell that move claims, as used by
+    StonehengeBatch.
+
+    >>> cell_index('A'), cell_index('K')
+    (0, 10)
+    """
+    return ord(move) - ord('A')
@@ -11,17 +11,20 @@ class StonehengeGame(Game):
     Abstract class for a game to be played with two players.
     """
 
-    def __init__(self, p1_starts: bool) -> None:
+    def __init__(self, p1_starts: bool, side_length: int = None) -> None:
         """
         Initialize this Game, using p1_starts to find who the first player is.
+        The side length is asked for interactively unless side_length is
+        given.
         """
         self.p1_starts = p1_starts
-        self.side_length = input('What side length between'
-                                 ' 1 and 5 inclusive?: ')
-        while not self.side_length.isdigit():
-            self.side_length = input('What side length between'
-                                     ' 1 and 5 inclusive?: ')
-        self.side_length = int(self.side_length)
+        if side_length is None:
+            side_length = input('What side length between'
+                                ' 1 and 5 inclusive?: ')
+            while not side_length.isdigit():
+                side_length = input('What side length between'
+                                    ' 1 and 5 inclusive?: ')
+        self.side_length = int(side_length)
         if self.side_length >= 6 or self.side_length < 1:
             raise Exception('Wrong input value')
         self.current_state = StonehengeState(self.p1_starts, self.side_length)
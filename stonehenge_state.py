@@ -1,9 +1,15 @@
 """
 An implementation of a state for Stonehenge
 """
-from typing import Any, List
+from typing import Any, Dict, Hashable, Iterator, List, Set, Union
 from game_state import GameState
 
+# Weights of the ley-lines claimed, the potential of the unclaimed ones, the
+# most ley-lines one cell would claim, and the turn, in potential_outcome().
+POTENTIAL_WEIGHTS = (1.0, 2.0, 0.25, 2.0)
+# The potential of both players on an empty board, by side length.
+_START_POTENTIAL = {}
+
 
 class StonehengeState(GameState):
     """
@@ -30,6 +36,11 @@ class StonehengeState(GameState):
         self.ley_line_state = {}
         self.cells = {}
         self.ley_line_count = {}
+        self._claimed = None
+        self._threats = None
+        self._winning_cells = {}
+        self._move_classes = None
+        self._potential = None
         amount_cells = (self.side_length**2 + 5*self.side_length)//2
         alphabet = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
         for i in range(amount_cells):
@@ -70,6 +81,10 @@ class StonehengeState(GameState):
                 self.ley_line[i] = [x for x in lst_diag_up_left[m]
                                     if 'c' + str(x) in self.cells]
                 m += 1
+        if side_length not in _START_POTENTIAL:
+            self.recount_potential()
+            _START_POTENTIAL[side_length] = self._potential
+        self._potential = _START_POTENTIAL[side_length][:]
 
     def __str__(self) -> str:
         """
@@ -316,6 +331,14 @@ class StonehengeState(GameState):
                         not even_leyline and check_unclaimed:
                     new_state.ley_line_state[leyline] = \
                         new_state.ley_line_count[leyline].index(count) + 1
+        # Only the ley-lines through the cell claimed have changed.
+        new_state._potential = self._potential[:]
+        for leyline in self.ley_line:
+            if move_equiv in self.ley_line[leyline]:
+                for player in range(2):
+                    new_state._potential[player] += \
+                        new_state._line_potential(leyline, player) - \
+                        self._line_potential(leyline, player)
         return new_state
 
     def __repr__(self) -> str:
@@ -341,11 +364,34 @@ class StonehengeState(GameState):
                  "{}".format(str(leylines_cap_p1), str(leylines_cap_p2))
         return string
 
+    def get_key(self) -> Hashable:
+        """
+        Return a hashable key identifying this state. Ley-line markers are
+        part of the key since which player claimed a ley-line first depends
+        on the order the cells were claimed in.
+
+        >>> s1 = StonehengeState(True, 1)
+        >>> s1.get_key()
+        (True, ('A', 'B', 'C'), ('@', '@', '@', '@', '@', '@'))
+        >>> s1 = StonehengeState(True, 2)
+        >>> s2 = s1.make_move('A').make_move('F').make_move('D')
+        >>> s3 = s1.make_move('D').make_move('F').make_move('A')
+        >>> s2.get_key() == s3.get_key()
+        True
+        """
+        return (self.p1_turn, tuple(self.cells.values()),
+                tuple(self.ley_line_state.values()))
+
     def rough_outcome(self) -> float:
         """
         Return an estimate in interval [LOSE, WIN] of best outcome the current
         player can guarantee from state self.
 
+        This gives the same value as taking the best of check_state() over
+        every move, but works out which ley-lines each move and reply would
+        claim from the threat index, instead of making the states two moves
+        ahead.
+
         >>> s1 = StonehengeState(True, 2)
         >>> s2 = s1.make_move('A')
         >>> s3 = s2.make_move('C')
@@ -354,12 +400,274 @@ class StonehengeState(GameState):
         -1
         """
         moves_lst = self.get_possible_moves()
-        starting_player = self.get_current_player_name()
         if moves_lst == []:
             return self.LOSE
-        score_lst = sum([check_state(self, move, starting_player)
-                         for move in moves_lst], [])
-        return max(score_lst)
+        player, opponent = (0, 1) if self.p1_turn else (1, 0)
+        total = len(self.ley_line_state)
+        claimed = self.get_claimed()
+        threats = self.get_threats()
+        best = self.LOSE
+        for cell in [int(cell[1:]) for cell in self.cells
+                     if self.cells[cell] in moves_lst]:
+            gained = threats[player].get(cell, set())
+            mine = claimed[player] + len(gained)
+            if 2 * mine >= total or len(moves_lst) == 1:
+                return self.WIN
+            theirs = max([len(threats[opponent][other] - gained)
+                          for other in threats[opponent] if other != cell],
+                         default=0)
+            if 2 * (claimed[opponent] + theirs) < total and \
+                    len(moves_lst) > 2:
+                best = max(best, mine / total)
+        return best
+
+    def decided_score(self) -> Union[int, None]:
+        """
+        Return WIN or LOSE if the game is decided for the player whose turn
+        it is, or None otherwise.
+
+        Since a ley-line is claimed as soon as a player has half its cells,
+        every unclaimed ley-line can still be claimed by both players, and
+        so the game is only decided once it is over, or once rough_outcome()
+        is WIN or LOSE: the player has a winning move, or every move allows
+        a winning reply. A move never ends the game in the other player's
+        favour, which makes those two outcomes exact.
+
+        >>> s1 = StonehengeState(True, 2).make_move('A').make_move('B')
+        >>> s1.decided_score(), s1.make_move('C').decided_score()
+        (1, -1)
+        >>> print(StonehengeState(True, 2).decided_score())
+        None
+        """
+        outcome = self.rough_outcome()
+        if outcome == self.WIN or outcome == self.LOSE:
+            return outcome
+        return None
+
+    def get_claimed(self) -> List[int]:
+        """
+        Return the number of ley-lines claimed by p1 and by p2.
+
+        >>> StonehengeState(True, 2).make_move('A').get_claimed()
+        [2, 0]
+        """
+        if self._claimed is None:
+            marks = list(self.ley_line_state.values())
+            self._claimed = [marks.count(1), marks.count(2)]
+        return self._claimed
+
+    def get_potential(self) -> List[float]:
+        """
+        Return the potential of p1 and of p2 over the unclaimed ley-lines:
+        the sum over those ley-lines of one half to the power of the number
+        of cells the player still needs to claim it. Every unclaimed
+        ley-line can still be claimed by both players, since a ley-line is
+        claimed as soon as one player has half its cells.
+
+        The potential is summed when the board is set up, and then kept up
+        to date by make_move from the ley-lines through the cell claimed.
+
+        >>> s1 = StonehengeState(True, 2)
+        >>> s1.get_potential()
+        [3.75, 3.75]
+        >>> s1.make_move('D').get_potential()
+        [4.5, 3.75]
+        """
+        return self._potential
+
+    def recount_potential(self) -> None:
+        """
+        Sum the potential of both players from scratch, as is needed after
+        cells or ley-lines were changed other than by make_move.
+        """
+        self._potential = [sum(self._line_potential(leyline, player)
+                               for leyline in self.ley_line)
+                           for player in range(2)]
+
+    def _line_potential(self, leyline: int, player: int) -> float:
+        """
+        Return the potential of leyline for player (0 for p1, 1 for p2).
+        Powers of one half are added and taken away exactly, so the kept
+        sum never drifts.
+        """
+        if self.ley_line_state[leyline] != '@':
+            return 0.0
+        needed = (len(self.ley_line[leyline]) + 1) // 2 - \
+            self.ley_line_count[leyline][player]
+        return 0.5 ** needed
+
+    def potential_outcome(self, weights: tuple = POTENTIAL_WEIGHTS) -> float:
+        """
+        Return an estimate in interval [LOSE, WIN] of the outcome for the
+        current player, from the ley-lines each player has claimed, their
+        potential over the unclaimed ley-lines, the most ley-lines one cell
+        would claim for them, and whose turn it is, weighted by weights.
+        States the current player wins at once score WIN and states that
+        are over score LOSE.
+
+        >>> s1 = StonehengeState(True, 2)
+        >>> s1.potential_outcome() > 0
+        True
+        >>> s1.make_move('A').make_move('B').potential_outcome()
+        1
+        """
+        if self.get_possible_moves() == []:
+            return self.LOSE
+        if self.winning_moves() != []:
+            return self.WIN
+        player, opponent = (0, 1) if self.p1_turn else (1, 0)
+        claimed = self.get_claimed()
+        potential = self.get_potential()
+        threats = self.get_threats()
+        forks = [max([len(lines) for lines in threats[side].values()],
+                     default=0) for side in range(2)]
+        score = (weights[0] * (claimed[player] - claimed[opponent]) +
+                 weights[1] * (potential[player] - potential[opponent]) +
+                 weights[2] * (forks[player] - forks[opponent]) +
+                 weights[3])
+        return score / (1 + abs(score))
+
+    def get_threats(self) -> List[Dict[int, Set[int]]]:
+        """
+        Return the threat index of this state: for p1 and for p2, the
+        unclaimed cells that would claim ley-lines, by cell number, with the
+        ley-lines each would claim. The index is built once per state and
+        is empty once the game is over.
+
+        >>> s1 = StonehengeState(True, 2).make_move('A')
+        >>> threats = s1.get_threats()
+        >>> sorted(threats[0][8]), sorted(threats[1][8])
+        ([3, 5, 9], [3, 9])
+        """
+        if self._threats is None:
+            self._threats = [{}, {}]
+            total = len(self.ley_line_state)
+            if all(2 * count < total for count in self.get_claimed()):
+                for player in range(2):
+                    for leyline in self._ready_lines(player):
+                        for cell in self.ley_line[leyline]:
+                            if self.cells['c' + str(cell)] not in (1, 2):
+                                self._threats[player].setdefault(
+                                    cell, set()).add(leyline)
+        return self._threats
+
+    def _ready_lines(self, player: int) -> List[int]:
+        """
+        Return the unclaimed ley-lines that player (0 for p1, 1 for p2)
+        would claim by claiming one more of their cells.
+        """
+        return [leyline for leyline in self.ley_line
+                if self.ley_line_state[leyline] == '@' and
+                2 * (self.ley_line_count[leyline][player] + 1) >=
+                len(self.ley_line[leyline])]
+
+    def get_winning_cells(self, player: int) -> List[int]:
+        """
+        Return the cells, by cell number, with which player (0 for p1, 1 for
+        p2) would win the game at once.
+        """
+        if player not in self._winning_cells:
+            total = len(self.ley_line_state)
+            claimed = self.get_claimed()[player]
+            self._winning_cells[player] = [
+                cell for cell, lines in self.get_threats()[player].items()
+                if 2 * (claimed + len(lines)) >= total]
+        return self._winning_cells[player]
+
+    def get_move_classes(self) -> List[List[str]]:
+        """
+        Return the possible moves grouped into classes of moves that lead to
+        equivalent states. Cells are equivalent when the same unclaimed
+        ley-lines pass through them, since claimed ley-lines no longer
+        matter; the dead cells, through which every ley-line is claimed,
+        form one class.
+
+        >>> s1 = StonehengeState(True, 2)
+        >>> s1 = s1.make_move('G').make_move('A').make_move('B')
+        >>> s1.make_move('F').get_move_classes()
+        [['C', 'E'], ['D']]
+        """
+        if self._move_classes is None:
+            classes = {}
+            if self.get_possible_moves() != []:
+                unclaimed = self._unclaimed_lines()
+                for cell in self.cells:
+                    if self.cells[cell] not in (1, 2):
+                        classes.setdefault(
+                            tuple(unclaimed.get(int(cell[1:]), [])),
+                            []).append(self.cells[cell])
+            self._move_classes = list(classes.values())
+        return self._move_classes
+
+    def get_dead_moves(self) -> List[str]:
+        """
+        Return the moves that claim a cell through which every ley-line is
+        already claimed, and so change nothing but whose turn it is.
+
+        >>> s1 = StonehengeState(True, 2)
+        >>> s1 = s1.make_move('A').make_move('D').make_move('F')
+        >>> s1.make_move('E').get_dead_moves()
+        ['C']
+        """
+        unclaimed = self._unclaimed_lines()
+        return [self.cells[cell] for cell in self.cells
+                if self.cells[cell] not in (1, 2) and
+                int(cell[1:]) not in unclaimed]
+
+    def _unclaimed_lines(self) -> Dict[int, List[int]]:
+        """
+        Return the unclaimed ley-lines through each cell, by cell number,
+        leaving out cells with none.
+        """
+        unclaimed = {}
+        for leyline in self.ley_line:
+            if self.ley_line_state[leyline] == '@':
+                for cell in self.ley_line[leyline]:
+                    unclaimed.setdefault(cell, []).append(leyline)
+        return unclaimed
+
+    def iter_distinct_moves(self) -> Iterator[str]:
+        """
+        Yield the first move of each class of get_move_classes().
+        """
+        return iter([moves[0] for moves in self.get_move_classes()])
+
+    def winning_moves(self) -> List[str]:
+        """
+        Return the moves with which the current player wins the game at once.
+
+        >>> s1 = StonehengeState(True, 2).make_move('A').make_move('B')
+        >>> s1.winning_moves()
+        ['G']
+        """
+        player = 0 if self.p1_turn else 1
+        return sorted(self.cells['c' + str(cell)]
+                      for cell in self.get_winning_cells(player))
+
+    def blocking_moves(self) -> List[str]:
+        """
+        Return the moves that take a cell the other player would win with at
+        once. If there are several, no single one of them stops the other
+        player from winning next move.
+
+        >>> s1 = StonehengeState(True, 2).make_move('A').make_move('B')
+        >>> s1.make_move('C').blocking_moves()
+        ['D', 'E', 'G']
+        """
+        opponent = 1 if self.p1_turn else 0
+        return sorted(self.cells['c' + str(cell)]
+                      for cell in self.get_winning_cells(opponent))
+
+    def opponent_wins_next(self) -> bool:
+        """
+        Return whether the other player could win the game at once if it
+        were their turn.
+
+        >>> s1 = StonehengeState(True, 2).make_move('A').make_move('B')
+        >>> s1.opponent_wins_next(), s1.make_move('C').opponent_wins_next()
+        (False, True)
+        """
+        return self.blocking_moves() != []
 
 
 def check_state(state: 'StonehengeState', move: Any, starting_player: str)\
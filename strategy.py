@@ -5,8 +5,33 @@ NOTE: Make sure this file adheres to python-ta.
 Adjust the type annotations as needed, and implement both a recursive
 and an iterative version of minimax.
 """
-from typing import Any, Union, List
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Union, List, Tuple
 from copy import deepcopy
+from learned_evaluation import DEFAULT_WEIGHTS_PATH, LinearEvaluation
+from memory_budget import MemoryBudget, deep_size
+from search import TranspositionTable, exact_value, fastest_move, mtdf
+from search_stats import SearchStats
+from selective_search import DEFAULT_MOVE_SECONDS, DepthLimitedSearch
+from stonehenge_batch import child_rough_outcomes
+from stonehenge_state import StonehengeState
+from multi_subtract_square_state import MultiSubtractSquareState
+from pn_search import ProofNumberSearch
+from subtract_square_solver import (get_table, grundy_move, grundy_value,
+                                    solved_move)
+from subtract_square_state import SubtractSquareState
+from tracing import Tracer
+
+# The transposition table and tracer of a parallel_strategy worker process.
+_WORKER = {}
+# The learned evaluation, once learned_strategy has loaded it.
+_LEARNED = {}
+# The states of games that minimax answers from a solved table.
+SOLVED_STATES = (SubtractSquareState, MultiSubtractSquareState)
+# The part of the budget of iterative_strategy kept for the transposition
+# table that scores the trees left once the trees have used the rest.
+TABLE_SHARE = 0.5
 
 
 def interactive_strategy(game: Any) -> Any:
@@ -17,50 +42,95 @@ def interactive_strategy(game: Any) -> Any:
     return game.str_to_move(move)
 
 
-def minimax_rec(game: Any) -> Any:
+def minimax_rec(game: Any, stats: SearchStats = None) -> Any:
     """
     Return a best move possible for computer resulting
     in the lowest score for opponent
+
+    If stats is given, the statistics of the search are recorded in it,
+    with the score of the move chosen. SubtractSquare is answered from its
+    solved tables instead of searched.
     """
+    if stats is None:
+        stats = SearchStats()
+    stats.visit(0)
+    if isinstance(game.current_state, SOLVED_STATES):
+        return _solved_move(game.current_state, stats, False)
     old_state = game.current_state
-    moves_lst = game.current_state.get_possible_moves()
+    moves_lst = list(game.current_state.iter_distinct_moves())
     starting_player = game.current_state.get_current_player_name()
     if moves_lst == []:
         return 0
-    score_lst = [get_move_score(game, move, starting_player)
+    score_lst = [get_move_score(game, move, starting_player, stats)
                  for move in moves_lst]
+    stats.end_iteration()
     game.current_state = old_state
     max_score = max(score_lst)
+    stats.score = max_score
     return moves_lst[score_lst.index(max_score)]
 
 
-def get_move_score(game: Any, move: Any, starting_player: str) -> int:
+def _solved_move(state: Any, stats: SearchStats, fewest_replies: bool) -> Any:
+    """
+    Return the move minimax chooses in state, a SubtractSquare or
+    multi-heap SubtractSquare state, looked up in the solved tables, and
+    record its exact score in stats. Ties in SubtractSquare are broken by
+    fewest replies if fewest_replies is True.
+    """
+    stats.tt_probes += 1
+    stats.tt_hits += 1
+    if isinstance(state, MultiSubtractSquareState):
+        move = grundy_move(state.heaps)
+        won = grundy_value(state.heaps) != 0
+    else:
+        move = solved_move(state, fewest_replies)
+        won = get_table(state.current_total).is_win(state.current_total)
+    stats.score = state.WIN if won else state.LOSE
+    stats.end_iteration()
+    return 0 if move is None else move
+
+
+def get_move_score(game: Any, move: Any, starting_player: str,
+                   stats: SearchStats = None, depth: int = 1) -> int:
     """ Return score of move on the state depending on the starting player
+
+    The state move leads to is depth plies below the state minimax started
+    from, and the statistics of the search are recorded in stats.
     """
+    if stats is None:
+        stats = SearchStats()
     new_game1 = deepcopy(game)
     old_state = new_game1.current_state
     current_player = old_state.get_current_player_name()
     current_state = new_game1.current_state.make_move(move)
+    stats.make_move_calls += 1
+    stats.visit(depth)
 
     new_game1.current_state = current_state
-    new_moves_lst = new_game1.current_state.get_possible_moves()
+    decided = current_state.decided_score()
+    if decided is not None:
+        stats.leaf_evaluations += 1
+        return -1 * decided
+    new_moves_lst = list(new_game1.current_state.iter_distinct_moves())
     other_player = ''
     if current_player == "p1":
         other_player = "p2"
     elif current_player == "p2":
         other_player = "p1"
     if new_game1.current_state.get_possible_moves() == []:
+        stats.leaf_evaluations += 1
         if new_game1.is_winner(current_player):
             return new_game1.current_state.WIN
         elif new_game1.is_winner(other_player):
             return new_game1.current_state.LOSE
         return new_game1.current_state.DRAW
 
-    return -1 * max([get_move_score(new_game1, new_move, starting_player)
+    return -1 * max([get_move_score(new_game1, new_move, starting_player,
+                                    stats, depth + 1)
                      for new_move in new_moves_lst])
 
 
-def rough_outcome_strategy(game: Any) -> Any:
+def rough_outcome_strategy(game: Any, stats: SearchStats = None) -> Any:
     """
     Return a move for game by picking a move which results in a state with
     the lowest rough_outcome() for the opponent.
@@ -79,34 +149,66 @@ def rough_outcome_strategy(game: Any) -> Any:
         In essence: rough_outcome() will only look 1 or 2 states ahead to
         'guess' the outcome of the game, but no further. It's better than
         random, but worse than minimax.
+
+    The rough_outcome() of every move is found at once by
+    child_rough_outcomes(). If stats is given, the statistics of the search
+    are recorded in it, with the guessed score of the move chosen.
     """
+    if stats is None:
+        stats = SearchStats()
+    stats.visit(0)
     current_state = game.current_state
     best_move = None
     best_outcome = -2  # Temporarily -- just so we can replace this easily later
 
     # Get the move that results in the lowest rough_outcome for the opponent
-    for move in current_state.get_possible_moves():
-        new_state = current_state.make_move(move)
+    outcomes = child_rough_outcomes(current_state, stats)
+    for move, outcome in zip(current_state.get_possible_moves(), outcomes):
+        stats.visit(1)
+        stats.leaf_evaluations += 1
 
         # We multiply the below by -1 since a state that's bad for the opponent
         # is good for us.
-        guessed_score = new_state.rough_outcome() * -1
+        guessed_score = outcome * -1
         if guessed_score > best_outcome:
             best_outcome = guessed_score
             best_move = move
 
+    stats.end_iteration()
+    if best_move is not None:
+        stats.score = best_outcome
     # Return the move that resulted in the best rough_outcome
     return best_move
 
 
-def iterative_strategy(game: Any) -> Any:
+def iterative_strategy(game: Any, stats: SearchStats = None,
+                       budget: MemoryBudget = None) -> Any:
     """
     Return a best move possible for computer resulting
     in the lowest score for opponent
+
+    If stats is given, the statistics of the search are recorded in it,
+    with the score of the move chosen. The children of a tree are dropped
+    as soon as its score is known. If budget is given, the trees are
+    charged to it, and once they use more than their share of it the trees
+    left are scored by a depth-first search whose transposition table
+    shrinks to stay within the rest. SubtractSquare is answered from its
+    solved tables instead of searched.
     """
-    stack, lst_states = [], []
-    stack.append(Tree(1, None, game.current_state, None))
+    if stats is None:
+        stats = SearchStats()
+    if isinstance(game.current_state, SOLVED_STATES):
+        stats.visit(0)
+        return _solved_move(game.current_state, stats, True)
+    root = Tree(1, None, game.current_state, None)
+    stack = [root]
+    stats.visit(0)
     old_state = game.current_state
+    share = None if budget is None else int(budget.limit * TABLE_SHARE)
+    table = TranspositionTable(budget, share=share)
+    if budget is not None:
+        budget.start()
+        tree_bytes = deep_size(root)
     i = 2
     while stack != []:
         top_item = stack.pop()
@@ -115,41 +217,292 @@ def iterative_strategy(game: Any) -> Any:
         else:
             other_player = "p1"
         game.current_state = top_item.state
+        decided = None
+        if top_item.depth > 0 and top_item.children == []:
+            decided = top_item.state.decided_score()
         if top_item.state.get_possible_moves() == []:
+            stats.leaf_evaluations += 1
             if game.is_winner(top_item.state.get_current_player_name()):
                 top_item.score = top_item.state.LOSE
             elif game.is_winner(other_player):
                 top_item.score = top_item.state.WIN
             else:
                 top_item.score = top_item.state.DRAW
+        elif decided is not None:
+            stats.leaf_evaluations += 1
+            top_item.score = -1 * decided
+        elif top_item.children == [] and top_item.depth > 0 and \
+                budget is not None and \
+                budget.used.get('tree', 0) > budget.limit - table.share:
+            top_item.score = -exact_value(top_item.state, table, stats,
+                                          top_item.depth)
         elif top_item.children == [] or top_item.children is None:
             stack.append(top_item)
-            for move in top_item.state.get_possible_moves():
+            for move in top_item.state.iter_distinct_moves():
                 new_state = top_item.state.make_move(move)
-                new_item = Tree(i, move, new_state, None)
+                new_item = Tree(i, move, new_state, None, top_item.depth + 1)
+                stats.make_move_calls += 1
+                stats.visit(new_item.depth)
                 stack.append(new_item)
                 top_item.children.append(new_item)
                 i += 1
+            if budget is not None:
+                budget.charge('tree', tree_bytes * len(top_item.children))
         elif top_item.children is not None:
             top_item.score = -1 * max([child.score for child in
                                        top_item.children])
-            lst_states.append(top_item)
-    if lst_states == []:
+            if top_item.depth > 0:
+                if budget is not None:
+                    budget.release('tree',
+                                   tree_bytes * len(top_item.children))
+                top_item.children = []
+    stats.end_iteration()
+    if budget is not None:
+        budget.stop()
+        stats.memory_peak = max(budget.peak, budget.traced_peak)
+    game.current_state = old_state
+    if root.children == []:
         return 0
-    best_score = max([child.score for child in lst_states[-1].children])
+    best_score = max([child.score for child in root.children])
+    stats.score = best_score
     get_index_best_state = [child.score for child in
-                            lst_states[-1].children].index(best_score)
-    move_to_make = lst_states[-1].children[get_index_best_state].move_made
+                            root.children].index(best_score)
+    move_to_make = root.children[get_index_best_state].move_made
     shortest_len = 100000000000000  # Temporary will change
-    for item in lst_states[-1].children:
+    for item in root.children:
         if item.score == best_score:
-            if len(item.children) < shortest_len:
-                shortest_len = len(item.children)
+            if len(item.state.get_possible_moves()) < shortest_len:
+                shortest_len = len(item.state.get_possible_moves())
                 move_to_make = item.move_made
-    game.current_state = old_state
     return move_to_make
 
 
+def mtdf_strategy(game: Any, stats: SearchStats = None,
+                  budget: MemoryBudget = None) -> Any:
+    """
+    Return the move minimax_rec chooses for game, found by MTD(f): a few
+    zero-window alpha-beta searches that share a transposition table of
+    bounds, instead of one search of every move.
+
+    If stats is given, the statistics of the search are recorded in it. If
+    budget is given, the table is charged to it and shrinks to stay within
+    it. SubtractSquare is answered from its solved tables instead of
+    searched.
+    """
+    if stats is None:
+        stats = SearchStats()
+    if isinstance(game.current_state, SOLVED_STATES):
+        stats.visit(0)
+        return _solved_move(game.current_state, stats, False)
+    table = TranspositionTable(budget)
+    if budget is not None:
+        budget.start()
+    stats.score, move = mtdf(game.current_state, table, stats)
+    if budget is not None:
+        budget.stop()
+        stats.memory_peak = max(budget.peak, budget.traced_peak)
+    return 0 if move is None else move
+
+
+def fastest_win_strategy(game: Any, stats: SearchStats = None,
+                         budget: MemoryBudget = None) -> Any:
+    """
+    Return the move that wins game soonest for the player whose turn it is,
+    or that loses it latest if it cannot be won, found by fastest_move.
+
+    If stats is given, the statistics of the search are recorded in it,
+    with the exact score of the move chosen. If budget is given, the table
+    of bounds is charged to it and shrinks to stay within it.
+    """
+    if stats is None:
+        stats = SearchStats()
+    table = TranspositionTable(budget)
+    if budget is not None:
+        budget.start()
+    score, move = fastest_move(game.current_state, table, stats)
+    # The sign of a distance-aware score is the exact score.
+    stats.score = (score > 0) - (score < 0)
+    if budget is not None:
+        budget.stop()
+        stats.memory_peak = max(budget.peak, budget.traced_peak)
+    return 0 if move is None else move
+
+
+def deepening_strategy(game: Any, stats: SearchStats = None,
+                       seconds: float = DEFAULT_MOVE_SECONDS,
+                       plies: int = None) -> Any:
+    """
+    Return the best move for game found by full-width alpha-beta search,
+    deepened one move at a time for seconds, scoring Stonehenge states at
+    the horizon with potential_outcome() and other states with
+    rough_outcome().
+
+    If stats is given, the statistics of the search are recorded in it,
+    with one iteration for each depth. If plies is given, the search looks
+    at most that many moves ahead.
+    """
+    search = DepthLimitedSearch(seconds, False, stats,
+                                _horizon_evaluation(game.current_state),
+                                plies)
+    _, move, _ = search.search(game.current_state)
+    return 0 if move is None else move
+
+
+def selective_strategy(game: Any, stats: SearchStats = None,
+                       seconds: float = DEFAULT_MOVE_SECONDS,
+                       plies: int = None) -> Any:
+    """
+    Return the best move for game found like deepening_strategy, but
+    searching late moves less deep and skipping futile moves near the
+    horizon, which reaches deeper in the same time.
+
+    If stats is given, the statistics of the search are recorded in it,
+    with one iteration for each depth. If plies is given, the search looks
+    at most that many moves ahead.
+    """
+    search = DepthLimitedSearch(seconds, True, stats,
+                                _horizon_evaluation(game.current_state),
+                                plies)
+    _, move, _ = search.search(game.current_state)
+    return 0 if move is None else move
+
+
+def learned_strategy(game: Any, stats: SearchStats = None,
+                     seconds: float = DEFAULT_MOVE_SECONDS,
+                     plies: int = None) -> Any:
+    """
+    Return the best move for game found like selective_strategy, scoring
+    Stonehenge states at the horizon with the learned evaluation, whose
+    weights are loaded from DEFAULT_WEIGHTS_PATH the first time.
+
+    If stats is given, the statistics of the search are recorded in it,
+    with one iteration for each depth. If plies is given, the search looks
+    at most that many moves ahead.
+    """
+    evaluate = None
+    if isinstance(game.current_state, StonehengeState):
+        if 'evaluation' not in _LEARNED:
+            _LEARNED['evaluation'] = LinearEvaluation.load(
+                DEFAULT_WEIGHTS_PATH) \
+                if os.path.exists(DEFAULT_WEIGHTS_PATH) \
+                else LinearEvaluation({})
+        evaluate = _LEARNED['evaluation']
+    search = DepthLimitedSearch(seconds, True, stats, evaluate, plies)
+    _, move, _ = search.search(game.current_state)
+    return 0 if move is None else move
+
+
+def _horizon_evaluation(state: Any) -> Any:
+    """
+    Return the evaluation depth-limited search scores states like state
+    with at its horizon, or None for rough_outcome().
+    """
+    if isinstance(state, StonehengeState):
+        return StonehengeState.potential_outcome
+    return None
+
+
+def pn_strategy(game: Any, stats: SearchStats = None,
+                budget: MemoryBudget = None) -> Any:
+    """
+    Return a move for game that wins for the player whose turn it is, if
+    there is one, found by df-pn search instead of searching every move.
+
+    If stats is given, the statistics of the search are recorded in it. The
+    table of proof numbers is charged to budget if it is given.
+    """
+    if stats is None:
+        stats = SearchStats()
+    stats.score, move = ProofNumberSearch(budget, stats).solve(
+        game.current_state)
+    return 0 if move is None else move
+
+
+def parallel_strategy(game: Any, stats: SearchStats = None,
+                      tracer: Tracer = None, workers: int = None,
+                      budget: MemoryBudget = None) -> Any:
+    """
+    Return a best move possible for computer resulting
+    in the lowest score for opponent, searching the moves of the current
+    state in parallel in workers processes (by default, one per CPU).
+
+    If stats is given, the statistics of the search are recorded in it,
+    with the score of the move chosen. If tracer is given, the root moves
+    searched by each worker are recorded in it. If budget is given, it is
+    split evenly between the transposition tables of the workers.
+    """
+    if stats is None:
+        stats = SearchStats()
+    stats.visit(0)
+    state = game.current_state
+    moves_lst = list(state.iter_distinct_moves())
+    if moves_lst == []:
+        return 0
+    if tracer is not None:
+        tracer.name_worker(tracer.worker_id, 'main')
+    if workers is None:
+        workers = os.cpu_count()
+    worker_limit = None if budget is None else budget.limit // workers
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=_start_worker,
+                             initargs=(tracer is not None,
+                                       worker_limit)) as executor:
+        futures = [executor.submit(_score_root_move, state, move)
+                   for move in moves_lst]
+        score_lst, worker_peaks = [], {}
+        for future in futures:
+            score, worker_stats, events, worker_id = future.result()
+            score_lst.append(score)
+            stats.merge(worker_stats)
+            worker_peaks[worker_id] = worker_stats.memory_peak
+            if tracer is not None and events != []:
+                tracer.name_worker(events[0]['tid'],
+                                   'worker {}'.format(events[0]['tid']))
+                tracer.extend(events)
+    stats.end_iteration()
+    stats.memory_peak = sum(worker_peaks.values())
+    if budget is not None:
+        budget.peak = max(budget.peak, stats.memory_peak)
+    stats.score = max(score_lst)
+    move_to_make = moves_lst[score_lst.index(stats.score)]
+    if tracer is not None:
+        tracer.instant('move decided', move=move_to_make)
+    return move_to_make
+
+
+def _start_worker(trace: bool, limit: Union[int, None]) -> None:
+    """
+    Set up the transposition table of a parallel_strategy worker process,
+    within a budget of limit bytes if limit is not None, and its tracer if
+    trace is True.
+    """
+    _WORKER['tracer'] = Tracer(os.getpid()) if trace else None
+    _WORKER['table'] = TranspositionTable(
+        None if limit is None else MemoryBudget(limit), _WORKER['tracer'])
+
+
+def _score_root_move(state: Any,
+                     move: Any) -> Tuple[int, SearchStats, list, int]:
+    """
+    Return the score of making move in state, the statistics of the search,
+    the events recorded by this worker while searching and the id of this
+    worker.
+    """
+    stats = SearchStats()
+    stats.make_move_calls += 1
+    tracer = _WORKER['tracer']
+    table = _WORKER['table']
+    if tracer is None:
+        score = -exact_value(state.make_move(move), table, stats, 1)
+    else:
+        with tracer.span('root move', move=move):
+            score = -exact_value(state.make_move(move), table, stats, 1)
+    if table.budget is not None:
+        stats.memory_peak = table.budget.peak
+    events = [] if tracer is None else tracer.drain()
+    return score, stats, events, os.getpid()
+
+
 class Tree:
     """
     Tree ADT that holds the score of the given state and the childrne and move
@@ -159,16 +512,19 @@ class Tree:
     - children: child nodes
     - score: score of tree
     - id: id of tree
+    - depth: number of moves made from the root to get to state
     """
     children: list
     state: object
     score: int
     id: int
     move_made: Any
+    depth: int
 
     def __init__(self, identifier: int, move_made: Any = None,
                  state: Any = None,
-                 children: List[Union['Tree', None]] = None):
+                 children: List[Union['Tree', None]] = None,
+                 depth: int = 0):
         """
         Create Tree with a value of state and 0 or more children and
         score related to it and with an id
@@ -179,6 +535,7 @@ class Tree:
         self.score = 0
         self.identifier = identifier
         self.move_made = move_made
+        self.depth = depth
 
     def __repr__(self):
         """
@@ -12,15 +12,19 @@ class SubtractSquareGame(Game):
     Abstract class for a game to be played with two players.
     """
 
-    def __init__(self, p1_starts):
+    def __init__(self, p1_starts, count=None):
         """
         Initialize this Game, using p1_starts to find who the first player is.
 
         :param p1_starts: A boolean representing whether Player 1 is the first
                           to make a move.
         :type p1_starts: bool
+        :param count: The number to subtract from. It is asked for
+                      interactively if it is not given.
+        :type count: int
         """
-        count = int(input("Enter the number to subtract from: "))
+        if count is None:
+            count = int(input("Enter the number to subtract from: "))
         self.current_state = SubtractSquareState(p1_starts, count)
 
     def get_instructions(self):
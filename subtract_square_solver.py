@@ -0,0 +1,429 @@
+"""
+An exact solver for SubtractSquare and multi-heap SubtractSquare.
+
+A total is losing for the player to move exactly when every square they can
+subtract leaves a winning total, so all totals up to a limit can be solved
+in one sweep from 0 upwards: every time a losing total is found, each total
+a square above it is marked as winning. The result is stored as a bit array
+(bit n is set when total n is a win for the player to move), which can be
+saved to a file and memory-mapped back, so a strategy answers any total
+within the limit with one lookup.
+
+When the game is played on several heaps, a position is losing exactly when
+the XOR of the Grundy numbers of its heaps is 0. The Grundy number of a heap
+is the smallest number that is not the Grundy number of a heap a square
+smaller, so GrundyTable computes them value by value with the same sweep:
+the heaps with Grundy number v are found among the heaps without a smaller
+one exactly as the losing totals are found among all totals. The numbers
+are stored as 16-bit integers, which can also be saved and memory-mapped.
+
+The sweeps use NumPy when it is installed, which makes solving totals up to
+10^8 offline practical; otherwise it falls back to pure Python.
+
+Usage:
+    python subtract_square_solver.py 100000000 subtract_square.bits
+    python subtract_square_solver.py --grundy 1000000 grundy.bin
+
+NOTE: You do not have to run python-ta on this file.
+"""
+import mmap
+import os
+import struct
+import sys
+from array import array
+from functools import reduce
+from math import isqrt
+from operator import xor
+from typing import Any, List, Tuple, Union
+from subtract_square_state import SubtractSquareState
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+MAGIC = b'SSQW'
+GRUNDY_MAGIC = b'SSQG'
+HEADER = struct.Struct('<4sQ')
+# Setting these environment variables to table files saved by save() makes
+# get_table() and get_grundy_table() use them.
+TABLE_ENV = 'SUBTRACT_SQUARE_TABLE'
+GRUNDY_TABLE_ENV = 'SUBTRACT_SQUARE_GRUNDY_TABLE'
+# Chunk of totals scanned at a time by NumPy for the next losing total.
+_SCAN_CHUNK = 1 << 16
+
+_TABLES = []
+_GRUNDY_TABLES = []
+_LOADED_PATHS = set()
+
+
+class SubtractSquareTable:
+    """
+    Whether each total from 0 to limit is a win for the player to move.
+
+    limit - the largest total solved
+    """
+    limit: int
+
+    def __init__(self, limit: int, bits: Any, offset: int = 0) -> None:
+        """
+        Initialize this table for totals up to limit, where bit n of the
+        bytes of bits starting at offset is set when total n is a win.
+        """
+        self.limit = limit
+        self._bits = bits
+        self._offset = offset
+
+    def is_win(self, total: int) -> bool:
+        """
+        Return whether total is a win for the player to move.
+
+        Precondition: 0 <= total <= self.limit
+
+        >>> table = SubtractSquareTable.solve(20)
+        >>> [total for total in range(21) if not table.is_win(total)]
+        [0, 2, 5, 7, 10, 12, 15, 17, 20]
+        """
+        return bool((self._bits[self._offset + (total >> 3)] >> (total & 7))
+                    & 1)
+
+    def winning_moves(self, total: int) -> List[int]:
+        """
+        Return the moves from total that leave the opponent a losing total.
+
+        >>> SubtractSquareTable.solve(20).winning_moves(18)
+        [1, 16]
+        """
+        return [move for move in
+                SubtractSquareState(True, total).iter_possible_moves()
+                if not self.is_win(total - move)]
+
+    @classmethod
+    def solve(cls, limit: int) -> 'SubtractSquareTable':
+        """
+        Return the table of every total from 0 to limit.
+        """
+        if numpy is not None:
+            return cls(limit, _solve_numpy(limit))
+        return cls(limit, _solve_python(limit))
+
+    def save(self, path: str) -> None:
+        """
+        Write this table to path.
+        """
+        with open(path, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, self.limit))
+            file.write(self._bits[self._offset:
+                                  self._offset + _bits_length(self.limit)])
+
+    @classmethod
+    def load(cls, path: str) -> 'SubtractSquareTable':
+        """
+        Return the table saved at path, memory-mapped rather than read, so
+        that only the pages that are looked up are loaded.
+        """
+        with open(path, 'rb') as file:
+            bits = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, limit = HEADER.unpack(bits[:HEADER.size])
+        if magic != MAGIC or len(bits) < HEADER.size + _bits_length(limit):
+            raise ValueError('{} is not a SubtractSquare table'.format(path))
+        return cls(limit, bits, HEADER.size)
+
+
+class GrundyTable:
+    """
+    The Grundy number of each SubtractSquare heap from 0 to limit.
+
+    limit - the largest heap solved
+    """
+    limit: int
+
+    def __init__(self, limit: int, values: Any) -> None:
+        """
+        Initialize this table for heaps up to limit, where values[n] is the
+        Grundy number of heap n.
+        """
+        self.limit = limit
+        self._values = values
+
+    def grundy(self, heap: int) -> int:
+        """
+        Return the Grundy number of heap.
+
+        Precondition: 0 <= heap <= self.limit
+
+        >>> table = GrundyTable.solve(12)
+        >>> [table.grundy(heap) for heap in range(13)]
+        [0, 1, 0, 1, 2, 0, 1, 0, 1, 2, 0, 1, 0]
+        """
+        return self._values[heap]
+
+    @classmethod
+    def solve(cls, limit: int) -> 'GrundyTable':
+        """
+        Return the table of every heap from 0 to limit.
+        """
+        if numpy is not None:
+            return cls(limit, _grundy_numpy(limit))
+        return cls(limit, _grundy_python(limit))
+
+    def save(self, path: str) -> None:
+        """
+        Write this table to path.
+        """
+        values = array('H', self._values[:self.limit + 1])
+        if sys.byteorder != 'little':
+            values.byteswap()
+        with open(path, 'wb') as file:
+            file.write(HEADER.pack(GRUNDY_MAGIC, self.limit))
+            file.write(values.tobytes())
+
+    @classmethod
+    def load(cls, path: str) -> 'GrundyTable':
+        """
+        Return the table saved at path, memory-mapped rather than read.
+        """
+        with open(path, 'rb') as file:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, limit = HEADER.unpack(data[:HEADER.size])
+        if magic != GRUNDY_MAGIC or \
+                len(data) != HEADER.size + 2 * (limit + 1):
+            raise ValueError('{} is not a Grundy table'.format(path))
+        if sys.byteorder != 'little':
+            values = array('H', data[HEADER.size:])
+            values.byteswap()
+            return cls(limit, values)
+        return cls(limit, memoryview(data)[HEADER.size:].cast('H'))
+
+
+def _bits_length(limit: int) -> int:
+    """
+    Return the number of bytes needed for the bits of totals 0 to limit.
+    """
+    return limit // 8 + 1
+
+
+def _solve_python(limit: int) -> bytearray:
+    """
+    Return the bits of the table of totals 0 to limit, computed without
+    NumPy.
+    """
+    wins = bytearray(limit + 1)
+    squares = [i * i for i in range(1, isqrt(limit) + 1)]
+    total = wins.find(0)
+    while total != -1:
+        for square in squares[:isqrt(limit - total)]:
+            wins[total + square] = 1
+        total = wins.find(0, total + 1)
+    # Pack the bytes into bits: byte i of packed has bit k set when total
+    # 8 * i + k is a win. The bytes of wins are 0 or 1, so shifting them as
+    # one integer by k < 8 bits never carries into the next byte.
+    length = _bits_length(limit)
+    packed = 0
+    for k in range(8):
+        column = bytes(wins[k::8])
+        packed |= int.from_bytes(column, 'little') << k
+    return bytearray(packed.to_bytes(length, 'little'))
+
+
+def _solve_numpy(limit: int) -> bytearray:
+    """
+    Return the bits of the table of totals 0 to limit, computed with NumPy.
+    """
+    wins = numpy.zeros(limit + 1, dtype=bool)
+    squares = numpy.arange(1, isqrt(limit) + 1, dtype=numpy.int64) ** 2
+    start = 0
+    while start <= limit:
+        chunk = wins[start:start + _SCAN_CHUNK]
+        found = int(chunk.argmin())
+        if chunk[found]:
+            start += _SCAN_CHUNK
+            continue
+        # The first total not yet marked as a win is losing, since every
+        # losing total below it has already marked its successors.
+        total = start + found
+        wins[total + squares[:isqrt(limit - total)]] = True
+        start = total + 1
+    return bytearray(numpy.packbits(wins, bitorder='little').tobytes())
+
+
+def _grundy_python(limit: int) -> array:
+    """
+    Return the Grundy numbers of heaps 0 to limit, computed without NumPy.
+    """
+    values = array('H', bytes(2 * (limit + 1)))
+    squares = [i * i for i in range(1, isqrt(limit) + 1)]
+    for heap in range(1, limit + 1):
+        options = {values[heap - square] for square in squares[:isqrt(heap)]}
+        value = 0
+        while value in options:
+            value += 1
+        values[heap] = value
+    return values
+
+
+def _grundy_numpy(limit: int) -> Any:
+    """
+    Return the Grundy numbers of heaps 0 to limit, computed with NumPy.
+    """
+    values = numpy.zeros(limit + 1, dtype=numpy.uint16)
+    unsolved = numpy.ones(limit + 1, dtype=bool)
+    squares = numpy.arange(1, isqrt(limit) + 1, dtype=numpy.int64) ** 2
+    value = 0
+    first = 0
+    while first <= limit:
+        # The heaps still unsolved have every smaller value as an option, so
+        # the first one not a square above a heap with this value has it.
+        available = unsolved.copy()
+        start = first
+        while start <= limit:
+            chunk = available[start:start + _SCAN_CHUNK]
+            found = int(chunk.argmax())
+            if not chunk[found]:
+                start += _SCAN_CHUNK
+                continue
+            heap = start + found
+            values[heap] = value
+            unsolved[heap] = False
+            available[heap + squares[:isqrt(limit - heap)]] = False
+            start = heap + 1
+        value += 1
+        remaining = numpy.flatnonzero(unsolved)
+        first = int(remaining[0]) if len(remaining) else limit + 1
+    return values
+
+
+def _cached_table(tables: list, env: str, table_class: type,
+                  size: int) -> Any:
+    """
+    Return a table of table_class from tables that covers size: the table
+    saved at the path in the environment variable env if it is big enough,
+    or else a table solved in memory, which is added to tables for later
+    calls.
+    """
+    for table in tables:
+        if table.limit >= size:
+            return table
+    path = os.environ.get(env)
+    if path and path not in _LOADED_PATHS:
+        _LOADED_PATHS.add(path)
+        tables.append(table_class.load(path))
+        return _cached_table(tables, env, table_class, size)
+    largest = max([table.limit for table in tables] + [1 << 10])
+    while largest < size:
+        largest *= 2
+    tables.append(table_class.solve(largest))
+    return tables[-1]
+
+
+def get_table(total: int) -> SubtractSquareTable:
+    """
+    Return a table that covers total: the table saved at the path in the
+    SUBTRACT_SQUARE_TABLE environment variable if it is big enough, or else
+    a table solved in memory, which is kept for later calls.
+    """
+    return _cached_table(_TABLES, TABLE_ENV, SubtractSquareTable, total)
+
+
+def get_grundy_table(heap: int) -> GrundyTable:
+    """
+    Return a Grundy table that covers heap, found like get_table() but from
+    the SUBTRACT_SQUARE_GRUNDY_TABLE environment variable.
+    """
+    return _cached_table(_GRUNDY_TABLES, GRUNDY_TABLE_ENV, GrundyTable, heap)
+
+
+def grundy_value(heaps: Tuple[int, ...]) -> int:
+    """
+    Return the XOR of the Grundy numbers of heaps, which is 0 exactly when
+    the player to move loses.
+
+    >>> grundy_value((2, 5)), grundy_value((4, 3))
+    (0, 3)
+    """
+    if not heaps:
+        return 0
+    table = get_grundy_table(max(heaps))
+    return reduce(xor, (table.grundy(heap) for heap in heaps), 0)
+
+
+def grundy_move(heaps: Tuple[int, ...]) -> Union[Tuple[int, int], None]:
+    """
+    Return a move (heap, square) from the multi-heap position heaps that
+    leaves the opponent a losing position, or the first possible move if
+    there is none, or None if the game is over.
+
+    >>> grundy_move((4, 3))
+    (0, 1)
+    >>> grundy_move((2, 5))
+    (0, 1)
+    """
+    if not any(heaps):
+        return None
+    table = get_grundy_table(max(heaps))
+    total = grundy_value(heaps)
+    for heap, size in enumerate(heaps):
+        target = table.grundy(size) ^ total
+        if total == 0 or target >= table.grundy(size):
+            continue
+        for i in range(1, isqrt(size) + 1):
+            if table.grundy(size - i * i) == target:
+                return heap, i * i
+    heap = [size > 0 for size in heaps].index(True)
+    return heap, 1
+
+
+def solved_move(state: SubtractSquareState,
+                fewest_replies: bool = False) -> Union[int, None]:
+    """
+    Return the move minimax would choose in state using the solved table, or
+    None if the game is over.
+
+    Minimax chooses the first move with the best score; if fewest_replies is
+    True, it breaks ties between moves with the best score by choosing the
+    one leaving the opponent the fewest moves, as iterative minimax does.
+
+    >>> solved_move(SubtractSquareState(True, 18))
+    1
+    >>> solved_move(SubtractSquareState(True, 18), True)
+    16
+    """
+    moves = state.get_possible_moves()
+    if moves == []:
+        return None
+    best = get_table(state.current_total).winning_moves(state.current_total)
+    if best == []:
+        best = moves
+    if not fewest_replies:
+        return best[0]
+    replies = [isqrt(state.current_total - move) for move in best]
+    return best[replies.index(min(replies))]
+
+
+def main(argv: List[str]) -> int:
+    """
+    Solve every total up to argv[1] and save the table to argv[2], or with
+    --grundy as argv[1], the Grundy numbers of every heap up to argv[2] to
+    argv[3].
+    """
+    if len(argv) == 4 and argv[1] == '--grundy':
+        grundy_table = GrundyTable.solve(int(argv[2]))
+        grundy_table.save(argv[3])
+        print('Solved heaps up to {} (largest Grundy number {}).'.format(
+            grundy_table.limit, max(grundy_table.grundy(heap) for heap in
+                                    range(grundy_table.limit + 1))))
+        return 0
+    if len(argv) != 3:
+        print('Usage: python subtract_square_solver.py [--grundy] LIMIT PATH')
+        return 2
+    table = SubtractSquareTable.solve(int(argv[1]))
+    table.save(argv[2])
+    losing = sum(1 for total in range(min(table.limit, 10 ** 6) + 1)
+                 if not table.is_win(total))
+    print('Solved totals up to {} ({} losing totals up to {}).'.format(
+        table.limit, losing, min(table.limit, 10 ** 6)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -3,7 +3,8 @@ An implementation of a state for SubtractSquare.
 
 NOTE: You do not have to run python-ta on this file.
 """
-from typing import Any
+from math import isqrt
+from typing import Any, Hashable, Iterator, List, Union
 from game_state import GameState
 
 
@@ -29,13 +30,23 @@ class SubtractSquareState(GameState):
     def get_possible_moves(self) -> list:
         """
         Return all possible moves that can be applied to this state.
+
+        >>> SubtractSquareState(True, 10).get_possible_moves()
+        [1, 4, 9]
+        """
+        return list(self.iter_possible_moves())
+
+    def iter_possible_moves(self) -> Iterator[int]:
         """
-        moves = []
-        for i in range(1, self.current_total + 1):
-            if i ** 2 <= self.current_total:
-                moves.append(i ** 2)
+        Yield the possible moves that can be applied to this state, from the
+        smallest to the largest, without building a list of them.
 
-        return moves
+        >>> moves = SubtractSquareState(True, 10 ** 7).iter_possible_moves()
+        >>> next(moves), next(moves)
+        (1, 4)
+        """
+        for i in range(1, isqrt(self.current_total) + 1):
+            yield i * i
 
     def make_move(self, move: Any) -> "SubtractSquareState":
         """
@@ -56,6 +67,43 @@ class SubtractSquareState(GameState):
         return "P1's Turn: {} - Total: {}".format(self.p1_turn,
                                                   self.current_total)
 
+    def get_key(self) -> Hashable:
+        """
+        Return a hashable key identifying this state.
+
+        >>> SubtractSquareState(True, 5).get_key()
+        (True, 5)
+        """
+        return self.p1_turn, self.current_total
+
+    def winning_moves(self) -> List[int]:
+        """
+        Return the moves with which the current player wins the game at once.
+
+        >>> SubtractSquareState(True, 9).winning_moves()
+        [9]
+        >>> SubtractSquareState(True, 8).winning_moves()
+        []
+        """
+        if is_pos_square(self.current_total):
+            return [self.current_total]
+        return []
+
+    def decided_score(self) -> Union[int, None]:
+        """
+        Return WIN or LOSE if rough_outcome() finds the game decided for the
+        player whose turn it is, which it does exactly, or None otherwise.
+
+        >>> SubtractSquareState(True, 9).decided_score()
+        1
+        >>> SubtractSquareState(True, 2).decided_score()
+        -1
+        >>> print(SubtractSquareState(True, 18).decided_score())
+        None
+        """
+        outcome = self.rough_outcome()
+        return None if outcome == self.DRAW else outcome
+
     def rough_outcome(self) -> float:
         """
         Return an estimate in interval [LOSE, WIN] of best outcome the current
@@ -64,7 +112,7 @@ class SubtractSquareState(GameState):
         if is_pos_square(self.current_total):
             return self.WIN
         elif all([is_pos_square(self.current_total - n ** 2)
-                  for n in range(1, self.current_total + 1)
+                  for n in range(1, isqrt(self.current_total) + 1)
                   if n ** 2 < self.current_total]):
             return self.LOSE
 
@@ -0,0 +1,131 @@
+"""
+A timeline tracer for searches that run across several workers.
+
+Spans (such as a root move being searched) and instant events (such as a
+transposition table being resized) are recorded with timestamps and the id of
+the worker that recorded them. Each worker keeps its events in an in-memory
+ring buffer, so a long search only keeps its latest events, and nothing is
+written to disk until write() is called once the move is decided. The file
+written uses the Chrome trace-event format, which chrome://tracing and
+https://ui.perfetto.dev can display with one row per worker.
+
+NOTE: You do not have to run python-ta on this file.
+"""
+import inspect
+import json
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List
+
+DEFAULT_CAPACITY = 100000
+
+
+def _now() -> float:
+    """
+    Return the current time in microseconds on a clock shared by all the
+    processes of this machine.
+    """
+    return time.monotonic_ns() / 1000
+
+
+class Tracer:
+    """
+    Records the events of one worker, and collects the events of others.
+
+    worker_id - the id events recorded by this tracer are shown under
+    capacity - the number of events kept per worker
+    """
+    worker_id: int
+    capacity: int
+
+    def __init__(self, worker_id: int = 0,
+                 capacity: int = DEFAULT_CAPACITY) -> None:
+        """
+        Initialize this tracer with an empty ring buffer for worker_id.
+        """
+        self.worker_id = worker_id
+        self.capacity = capacity
+        self._buffers = {worker_id: deque(maxlen=capacity)}
+        self._names = {}
+
+    @contextmanager
+    def span(self, name: str, **args: Any) -> Iterator[None]:
+        """
+        Record the code run inside this context as a span called name, with
+        args shown as its details.
+        """
+        start = _now()
+        try:
+            yield
+        finally:
+            self._buffers[self.worker_id].append(
+                {'name': name, 'ph': 'X', 'ts': start, 'dur': _now() - start,
+                 'pid': 0, 'tid': self.worker_id, 'args': args})
+
+    def instant(self, name: str, **args: Any) -> None:
+        """
+        Record an event called name that happens now.
+        """
+        self._buffers[self.worker_id].append(
+            {'name': name, 'ph': 'i', 's': 't', 'ts': _now(), 'pid': 0,
+             'tid': self.worker_id, 'args': args})
+
+    def name_worker(self, worker_id: int, name: str) -> None:
+        """
+        Show the events of worker_id under name.
+        """
+        self._names[worker_id] = name
+
+    def drain(self) -> List[Dict[str, Any]]:
+        """
+        Remove and return the events recorded by this tracer's own worker,
+        so that they can be sent to the tracer collecting all the events.
+        """
+        events = list(self._buffers[self.worker_id])
+        self._buffers[self.worker_id].clear()
+        return events
+
+    def extend(self, events: List[Dict[str, Any]]) -> None:
+        """
+        Add events recorded by another worker to this tracer.
+        """
+        for event in events:
+            self._buffers.setdefault(
+                event['tid'], deque(maxlen=self.capacity)).append(event)
+
+    def events(self) -> List[Dict[str, Any]]:
+        """
+        Return all the events collected, ordered by time, preceded by the
+        names of the workers.
+        """
+        events = [{'name': 'thread_name', 'ph': 'M', 'pid': 0,
+                   'tid': worker_id, 'args': {'name': name}}
+                  for worker_id, name in sorted(self._names.items())]
+        timed = [event for buffer in self._buffers.values()
+                 for event in buffer]
+        return events + sorted(timed, key=lambda event: event['ts'])
+
+    def write(self, path: str) -> None:
+        """
+        Write all the events collected to path as Chrome trace-event JSON.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': self.events(),
+                       'displayTimeUnit': 'ms'}, file)
+
+
+def accepts_tracer(strategy: Callable) -> bool:
+    """
+    Return whether strategy takes a tracer argument to record events in.
+
+    >>> accepts_tracer(lambda game, tracer=None: None)
+    True
+    >>> accepts_tracer(lambda game: None)
+    False
+    """
+    return 'tracer' in inspect.signature(strategy).parameters